@@ -0,0 +1,203 @@
+"""
+Scale benchmark for the data dictionary toolchain.
+
+Generates synthetic databases with create_synthetic_database() and runs the init, refresh and
+data quality check phases against them. For every phase it records the wall time, the number
+of SQL statements issued (through sqlite3 set_trace_callback) and the peak Python memory
+(tracemalloc), and writes the results to a JSON file.
+
+It also times the startup of the datadict.py command line (a fresh interpreter per run) for
+--help and the "refresh --check" schema probe, and records whether pandas got imported.
+
+Passing --baseline with an earlier results file compares the run against it and exits with
+status 1 when a phase got slower by more than --tolerance or issued more queries, or a
+startup command got slower or started importing pandas, so the benchmark can gate
+regressions in CI.
+
+Usage:
+    python benchmark.py --scale small
+    python benchmark.py --scale medium --output bench.json --baseline bench_main.json
+
+Dependencies:
+------------
+- sqlite3
+- tracemalloc
+- numpy (through create_sample_db)
+"""
+
+# Import Libraries
+import argparse
+import contextlib
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from create_sample_db import create_synthetic_database
+from db_conn import fetch_columns, fetch_tables
+from init_data_dictionary import (build_data_dictionary_from_schema, get_all_tables_and_columns,
+                                  save_data_dictionary, update_column_metadata)
+from refresh_data_dictionary import refresh_data_dictionary
+from data_quality_checks import compile_check_plan, run_checks
+
+# Database shapes and dirty-data rates for each benchmark scale
+SCALES = {
+    'small': {'tables': 5, 'columns': 10, 'rows': 10000},
+    'medium': {'tables': 20, 'columns': 50, 'rows': 100000},
+    'large': {'tables': 20, 'columns': 200, 'rows': 1000000},
+}
+DIRTY_DATA = {'null_rate': 0.01, 'duplicate_rate': 0.05, 'skew': 1.0, 'out_of_range_rate': 0.001,
+              'orphan_rate': 0.001}
+
+# datadict.py commands timed by the startup benchmark, each run starts a fresh interpreter
+STARTUP_COMMANDS = {
+    'help': ['--help'],
+    'schema_probe': ['refresh', '--check'],
+}
+STARTUP_RUNS = 5
+
+# Allowed slowdown against the baseline before a phase counts as a regression
+TOLERANCE = 0.2
+
+
+# Function to run one benchmark phase and measure it
+def measure(name, conn, func):
+    queries = [0]
+
+    def count_query(statement):
+        # Table-valued pragma functions trace their internal statements as "-- PRAGMA ..."
+        if not statement.startswith('--'):
+            queries[0] += 1
+
+    conn.set_trace_callback(count_query)
+    tracemalloc.start()
+    start = time.perf_counter()
+    # Profiling prints one line per column, keep the benchmark output readable
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        func()
+    wall_time = time.perf_counter() - start
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    conn.set_trace_callback(None)
+
+    result = {
+        'phase': name,
+        'wall_time': round(wall_time, 4),
+        'queries': queries[0],
+        'peak_memory_bytes': peak_memory,
+    }
+    print(f"{name:<8} {result['wall_time']:>10.3f}s {result['queries']:>8} queries "
+          f"{peak_memory / 1024 / 1024:>10.1f} MiB peak")
+    return result
+
+
+# Function to time the startup of the datadict.py commands, best of runs
+def measure_startup(db_name, json_file, runs=STARTUP_RUNS):
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'datadict.py')
+    workdir = os.path.dirname(json_file)
+    results = []
+    for name, command in STARTUP_COMMANDS.items():
+        argv = [script, '--db', db_name, '--dictionary', json_file, *command]
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            completed = subprocess.run([sys.executable, *argv], cwd=workdir, capture_output=True, text=True)
+            timings.append(time.perf_counter() - start)
+        # One more run with -X importtime to see which modules the command loads
+        traced = subprocess.run([sys.executable, '-X', 'importtime', *argv], cwd=workdir,
+                                capture_output=True, text=True)
+        imported = {line.rsplit('|', 1)[-1].strip() for line in traced.stderr.splitlines()
+                    if line.startswith('import time:')}
+        result = {
+            'command': name,
+            'wall_time': round(min(timings), 4),
+            'exit_status': completed.returncode,
+            'imports_pandas': 'pandas' in imported,
+        }
+        print(f"startup {name:<14} {result['wall_time']:>8.3f}s  exit {result['exit_status']}  "
+              f"pandas {'imported' if result['imports_pandas'] else 'not imported'}")
+        results.append(result)
+    return results
+
+
+# Function to run the benchmark phases against one synthetic database
+def run_benchmark(scale='small', workdir=None):
+    shape = SCALES[scale]
+    workdir = workdir or tempfile.mkdtemp(prefix='datadict_bench_')
+    db_name = os.path.join(workdir, f'bench_{scale}.db')
+    json_file = os.path.join(workdir, 'data_dictionary.json')
+    log_file = os.path.join(workdir, 'data_dictionary_changes.log')
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        create_synthetic_database(db_name, **shape, **DIRTY_DATA)
+    conn = sqlite3.connect(db_name)
+    state = {}
+
+    def init():
+        dd = build_data_dictionary_from_schema(fetch_tables(conn), fetch_columns(conn))
+        update_column_metadata(dd, get_all_tables_and_columns(dd), conn)
+        save_data_dictionary(dd, json_file)
+        state['dd'] = dd
+
+    def refresh():
+        refresh_data_dictionary(conn, json_file=json_file, log_file=log_file)
+
+    def check():
+        plan = compile_check_plan(state['dd'])
+        run_checks(conn, state['dd'], plan=plan)
+
+    print(f"Benchmark '{scale}': {shape['tables']} tables x {shape['columns']} columns x {shape['rows']} rows")
+    results = [measure('init', conn, init), measure('refresh', conn, refresh), measure('check', conn, check)]
+    conn.close()
+    startup = measure_startup(db_name, json_file)
+    return {'scale': scale, **shape, 'phases': results, 'startup': startup}
+
+
+# Function to compare a run against a baseline, returns the list of regressions
+def compare_to_baseline(run, baseline, tolerance=TOLERANCE):
+    regressions = []
+    baseline_phases = {phase['phase']: phase for phase in baseline.get('phases', [])}
+    for phase in run['phases']:
+        previous = baseline_phases.get(phase['phase'])
+        if previous is None:
+            continue
+        if phase['wall_time'] > previous['wall_time'] * (1 + tolerance):
+            regressions.append(f"{phase['phase']}: wall time {previous['wall_time']}s -> {phase['wall_time']}s")
+        if phase['queries'] > previous['queries']:
+            regressions.append(f"{phase['phase']}: queries {previous['queries']} -> {phase['queries']}")
+    baseline_startup = {command['command']: command for command in baseline.get('startup', [])}
+    for command in run.get('startup', []):
+        previous = baseline_startup.get(command['command'])
+        if previous is None:
+            continue
+        if command['wall_time'] > previous['wall_time'] * (1 + tolerance):
+            regressions.append(f"startup {command['command']}: wall time {previous['wall_time']}s -> {command['wall_time']}s")
+        if command['imports_pandas'] and not previous['imports_pandas']:
+            regressions.append(f"startup {command['command']}: now imports pandas")
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark init, refresh and data quality checks at scale.')
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--baseline', help='earlier results file to compare against')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    args = parser.parse_args()
+
+    run = run_benchmark(args.scale)
+    with open(args.output, 'w') as f:
+        json.dump(run, f, indent=4)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(run, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
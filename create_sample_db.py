@@ -37,8 +37,25 @@ Example:
 
     >>> create_sample_database('custom.db')
     Sample database 'custom.db' created successfully.
+
+Synthetic databases:
+    create_synthetic_database() generates databases of any size for scale testing. Table t000
+    is the parent table, every other table references it through parent_id. Each table has an
+    INTEGER PRIMARY KEY id plus columns cycling through INTEGER, REAL, TEXT and DATE, and the
+    generator can inject nulls, duplicates, skew, out-of-range values and foreign-key orphans.
+    Rows are generated column-wise with NumPy and streamed into executemany in chunks
+    inside a single transaction, so memory stays flat for any number of rows.
+
+    >>> create_synthetic_database('synthetic.db', tables=20, columns=50, rows=1000000,
+    ...                           null_rate=0.01, orphan_rate=0.001)
+
+    From the command line:
+        python create_sample_db.py --synthetic synthetic.db --tables 20 --columns 50 --rows 1000000
 """
 #Import Libraries
+import argparse
+import datetime
+import os
 import sqlite3
 
 # Function to create a sample SQLite database
@@ -201,5 +218,118 @@ def create_sample_database(db_name='sample_database.db'):
     conn.close()
     print(f"Sample database '{db_name}' created successfully.")
 
+SYNTHETIC_TYPES = ['INTEGER', 'REAL', 'TEXT', 'DATE']
+
+# Values of generated numeric columns fall in [0, SYNTHETIC_DOMAIN) unless they are out of range
+SYNTHETIC_DOMAIN = 1000
+
+SYNTHETIC_START_DATE = datetime.date(2020, 1, 1)
+SYNTHETIC_DATES = [
+    (SYNTHETIC_START_DATE + datetime.timedelta(days=i)).isoformat() for i in range(SYNTHETIC_DOMAIN)
+]
+
+# Number of rows handed to executemany at a time
+INSERT_CHUNK_SIZE = 10000
+
+
+# Function to generate one synthetic column for a chunk of rows
+def generate_synthetic_column(rng, data_type, row_ids, null_rate, duplicate_rate, skew, out_of_range_rate):
+    # NumPy is only needed for synthetic data, the sample database builds without it
+    import numpy as np
+    n = len(row_ids)
+    # Skew > 0 pushes values towards the start of the domain
+    position = rng.random(n) ** (1 + skew)
+    if data_type == 'TEXT':
+        # Duplicates repeat the value of a random earlier row
+        source_ids = np.where(rng.random(n) < duplicate_rate, rng.integers(1, row_ids + 1), row_ids)
+        values = np.char.add('value_', source_ids.astype(str)).astype(object)
+    elif data_type == 'DATE':
+        values = np.array(SYNTHETIC_DATES, dtype=object)[(position * SYNTHETIC_DOMAIN).astype(np.int64)]
+    else:
+        if data_type == 'INTEGER':
+            values = (position * SYNTHETIC_DOMAIN).astype(np.int64)
+        else:
+            values = np.round(position * SYNTHETIC_DOMAIN, 2)
+        out_of_range = rng.random(n) < out_of_range_rate
+        values[out_of_range] = rng.choice([-1, 10], out_of_range.sum()) * SYNTHETIC_DOMAIN
+        values = values.astype(object)
+    values[rng.random(n) < null_rate] = None
+    return values.tolist()
+
+
+# Function to generate the rows of one synthetic table in chunks
+def generate_synthetic_rows(rng, column_types, rows, parent_rows, null_rate, duplicate_rate, skew,
+                            out_of_range_rate, orphan_rate):
+    import numpy as np
+    for start in range(1, rows + 1, INSERT_CHUNK_SIZE):
+        row_ids = np.arange(start, min(start + INSERT_CHUNK_SIZE, rows + 1))
+        columns = [row_ids.tolist()]
+        if parent_rows is not None:
+            parent_ids = rng.integers(1, parent_rows + 1, len(row_ids))
+            # Orphans point past the last row of the parent table
+            orphans = rng.random(len(row_ids)) < orphan_rate
+            parent_ids[orphans] = parent_rows + rng.integers(1, parent_rows + 1, orphans.sum())
+            columns.append(parent_ids.tolist())
+        for data_type in column_types:
+            columns.append(generate_synthetic_column(rng, data_type, row_ids, null_rate, duplicate_rate, skew,
+                                                     out_of_range_rate))
+        yield list(zip(*columns))
+
+
+# Function to create a synthetic SQLite database for scale testing
+def create_synthetic_database(db_name='synthetic_database.db', tables=10, columns=20, rows=100000,
+                              null_rate=0.0, duplicate_rate=0.0, skew=0.0, out_of_range_rate=0.0,
+                              orphan_rate=0.0, seed=0):
+    import numpy as np
+    if os.path.exists(db_name):
+        os.remove(db_name)
+    rng = np.random.default_rng(seed)
+    conn = sqlite3.connect(db_name)
+    # The file is throwaway test data, so skip the journal while loading it
+    conn.execute('PRAGMA journal_mode = OFF')
+    conn.execute('PRAGMA synchronous = OFF')
+    cursor = conn.cursor()
+
+    column_types = [SYNTHETIC_TYPES[i % len(SYNTHETIC_TYPES)] for i in range(columns)]
+    column_defs = ', '.join(f"c{i:03d} {data_type}" for i, data_type in enumerate(column_types))
+    for t in range(tables):
+        table_name = f"t{t:03d}"
+        if t == 0:
+            cursor.execute(f"CREATE TABLE {table_name} (id INTEGER PRIMARY KEY, {column_defs})")
+            parent_rows = None
+        else:
+            cursor.execute(
+                f"CREATE TABLE {table_name} (id INTEGER PRIMARY KEY, parent_id INTEGER, {column_defs}, "
+                f"FOREIGN KEY(parent_id) REFERENCES t000(id))"
+            )
+            parent_rows = rows
+        placeholders = ', '.join('?' for _ in range(columns + (1 if parent_rows is None else 2)))
+        for chunk in generate_synthetic_rows(rng, column_types, rows, parent_rows, null_rate, duplicate_rate,
+                                             skew, out_of_range_rate, orphan_rate):
+            cursor.executemany(f"INSERT INTO {table_name} VALUES ({placeholders})", chunk)
+    conn.commit()
+    conn.close()
+    print(f"Synthetic database '{db_name}' created with {tables} tables, {columns} columns and {rows} rows per table.")
+
+
 # Create the sample database
-create_sample_database()
\ No newline at end of file
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Create the sample database or a synthetic one for scale testing.')
+    parser.add_argument('--synthetic', metavar='DB_NAME', help='create a synthetic database with this name')
+    parser.add_argument('--tables', type=int, default=10)
+    parser.add_argument('--columns', type=int, default=20)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--null-rate', type=float, default=0.0)
+    parser.add_argument('--duplicate-rate', type=float, default=0.0)
+    parser.add_argument('--skew', type=float, default=0.0)
+    parser.add_argument('--out-of-range-rate', type=float, default=0.0)
+    parser.add_argument('--orphan-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.synthetic:
+        create_synthetic_database(args.synthetic, args.tables, args.columns, args.rows, args.null_rate,
+                                  args.duplicate_rate, args.skew, args.out_of_range_rate, args.orphan_rate,
+                                  args.seed)
+    else:
+        create_sample_database()
\ No newline at end of file
@@ -1,187 +1,1400 @@
 """
-This script performs data quality checks on a SQLite database using a data dictionary.
-The script connects to a SQLite database and performs the following operations:
-1. Fetches table and column metadata
-2. Reads constraints from a data dictionary JSON file
-3. Performs various data quality checks including:
+This module performs data quality checks on a SQLite database using a data dictionary.
+It can be imported and embedded (nothing runs at import time) or run as a script:
+1. Compiles the data dictionary constraints into a reusable check plan
+2. Scans each table once with a fused aggregate query
+3. Evaluates the constraints against the aggregated results, including:
     - Null value validation
     - Zero value validation
     - Duplicate value checks
-    - Allowable value range checks
+    - Allowable value checks (anti-join against indexed temp tables)
     - Min/max value boundary checks
+    - Distribution drift against the histogram stored in the column profile
+    - Foreign key (orphan) checks, batched per parent table; composite keys match on all their columns
 Functions:
-     fetch_tables():
-          Retrieves all table names from the database.
+     compile_check_plan(data_dictionary, columns_df=None, indexes_df=None):
+          Compiles the data dictionary into a check plan that can be run many times.
+          With the catalog (fetch_columns/fetch_indexes) checks the schema guarantees are
+          pruned and MIN/MAX of indexed columns come from index seeks.
           Returns:
-                pandas.DataFrame: DataFrame containing table names and owners.
-     fetch_columns():
-          Retrieves column information for all tables.
+                dict: table -> {'columns', 'query', 'aliases', 'checks', 'pruned', 'seek_queries',
+                                'allowed_sets', 'incremental'}
+     run_checks(conn, data_dictionary, tables=None, plan=None, state=None, full_rescan=False,
+                sample_size=SAMPLE_SIZE, budget=None, sinks=None, keep_results=True):
+          Runs the checks on an open connection. With a state dict from load_check_state
+          only rows past each table's watermark are scanned and merged into the state.
+          Sample records of failed checks are collected in one pass per table,
+          sample_size=0 skips them. A TimeBudget bounds the run and every query; tables are
+          then scanned cheapest first and checks that do not fit are skipped (passed=None).
+          Results are streamed to the sinks (result_sinks.py) table by table.
           Returns:
-                pandas.DataFrame: DataFrame containing column metadata including:
-                     - table_name
-                     - column_name
-                     - data_type
-                     - is_nullable
-Required files:
+                list: one result dict per check with the keys
+                     - table
+                     - column
+                     - rule
+                     - passed
+                     - observed
+                     - expected
+                     - message
+                     - samples
+Required files (when run as a script):
      - sample_database.db: SQLite database file
      - data_dictionary.json: JSON file containing data quality constraints
+       (or a SQLite dictionary store, see dictionary_store.py)
 Dependencies:
-     - pandas
      - sqlite3
      - json
+     - dd_model (DataDictionary, plain dicts are converted)
+     - query_metrics (per-table timings, written next to the report when run as a script)
+     - result_sinks (DQ_Results_<timestamp>.jsonl next to the report when run as a script)
 Author: Not specified
 Version: Not specified
 """
 import sqlite3
-import pandas as pd
+import hashlib
 import json
 import logging
-from datetime import datetime
-from db_conn import get_conn, fetch_tables, fetch_columns
-
-conn = get_conn()
-
-# Setup logging
-log_filename = f'DQ_Report_{datetime.now().strftime("%Y%m%d_%H%M%S")}.log'
-logging.basicConfig(
-    filename=log_filename,
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
-
-# Fetch tables and columns with constraints
-tables_df = fetch_tables(conn)
-columns_df = fetch_columns(conn)
-
-# Process each table
-for table in tables_df['table_name']:
-    logging.info(f"\nStarting checks for table: {table}")
-    print(f"Checking table: {table}")
-    
-    # Get columns and constraints for the table
-    table_columns = columns_df[columns_df['table_name'] == table]
-    
-    # Fetch aggregated data from the database
+import math
+import time
+import zlib
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from db_conn import DB_NAME, pooled_conn, fetch_columns, fetch_indexes, add_progress_callback, remove_progress_callback
+from dd_model import DataDictionary
+from dictionary_store import open_dictionary_store
+from query_metrics import measure, start_metrics
+from result_sinks import ResultSink, open_results_sink
+from sketches import HyperLogLog, register_sketch_functions
+
+logger = logging.getLogger(__name__)
+
+NUMERIC_TYPES = ['INTEGER', 'REAL', 'NUMERIC', 'DECIMAL', 'FLOAT', 'DOUBLE']
+RANGE_TYPES = NUMERIC_TYPES + ['DATE', 'DATETIME', 'TIMESTAMP']
+# Sample records collected per failed check, 0 skips sample collection
+SAMPLE_SIZE = 5
+
+# Skip sample collection entirely when the script is run, failed checks only report counts
+FAST_MODE = False
+
+# Data dictionary read when the script is run, a .db/.sqlite path reads the SQLite dictionary store
+DICTIONARY_FILE = 'data_dictionary.json'
+
+# Incremental checks keep their per-table watermark and column state in this file
+STATE_FILE = 'dq_state.json'
+
+# Only scan rows added since the previous run when the script is run
+INCREMENTAL = False
+
+# Tables in incremental mode are fully rescanned when their last full scan is older than this
+FULL_RESCAN_DAYS = 7
+
+
+# Allowed value sets are loaded into indexed temp tables named with this prefix
+ALLOWED_VALUES_TABLE_PREFIX = 'dq_allowed_'
+
+# Population stability index above which a column's distribution counts as drifted from the
+# histogram stored in its profile, a column can override it with 'drift_threshold'
+DRIFT_PSI_THRESHOLD = 0.2
+
+# Messages list the allowed values only up to this many
+MESSAGE_VALUES_LIMIT = 20
+
+# Structured results written when the script is run, one record per check ({timestamp} is the
+# report's); a .parquet path writes Parquet (needs pyarrow), None only writes the text report
+RESULTS_FILE = 'DQ_Results_{timestamp}.jsonl'
+
+# Time budgets in seconds for the whole run and for any single query when the script is run,
+# None disables them. Queries past their budget are interrupted and their checks reported as skipped
+RUN_TIME_BUDGET = None
+QUERY_TIME_BUDGET = None
+
+# Relative cost per row of the expensive checks, on top of one unit per column scanned. Tables
+# are scanned cheapest first and these checks are the ones dropped when a table does not fit
+EXPENSIVE_CHECK_COSTS = {'duplicates': 8, 'allowable_values': 2, 'distribution_drift': 2, 'foreign_key': 2}
+
+
+# Function to get the constraints of one column from the data dictionary
+def get_column_constraints(data_dictionary, table, column):
+    if isinstance(data_dictionary, DataDictionary):
+        return data_dictionary.column(table, column) or {}
+    return data_dictionary.get(table, {}).get('columns', {}).get(column, {})
+
+
+# Function to get the SQLite type affinity of a declared column type, '' is BLOB (no affinity)
+def get_type_affinity(data_type):
+    # Same rules, in the same order, as SQLite applies to the declared type of a column
+    data_type = (data_type or '').upper()
+    if 'INT' in data_type:
+        return 'INTEGER'
+    if 'CHAR' in data_type or 'CLOB' in data_type or 'TEXT' in data_type:
+        return 'TEXT'
+    if 'BLOB' in data_type or not data_type:
+        return ''
+    if 'REAL' in data_type or 'FLOA' in data_type or 'DOUB' in data_type:
+        return 'REAL'
+    return 'NUMERIC'
+
+
+# Function to get the temp table holding an allowed value set, columns with equal sets and affinity share one table
+def get_allowed_values_table(allowable_values, data_type=''):
+    key = [get_type_affinity(data_type), allowable_values]
+    digest = hashlib.sha1(json.dumps(key, default=str).encode('utf-8')).hexdigest()[:16]
+    return f"{ALLOWED_VALUES_TABLE_PREFIX}{digest}"
+
+
+# Function to build the expression that flags a value outside the allowed value set
+def build_allowable_violation(column, allowable_values, data_type=''):
+    # The temp table is indexed on value, so each row costs one index probe instead of
+    # a comparison against every literal of a NOT IN (...) list
+    return (f"{column} IS NOT NULL AND {column} NOT IN "
+            f"(SELECT value FROM temp.{get_allowed_values_table(allowable_values, data_type)})")
+
+
+# Function to load allowed value sets into indexed temp tables on a connection
+def load_allowed_value_sets(conn, allowed_sets):
+    """
+    Creates one temp table per allowed value set (name -> {'affinity', 'values'}, see
+    compile_check_plan). The value column is declared with the affinity of the checked
+    column, so the anti-join converts values like the NOT IN (...) literal list it replaces
+    (the text column value '1' is allowed by the value 1).
+    Tables already on the connection are reused, so pooled connections load each set once.
+    Nulls are left out, null values are covered by the null_values check.
+    """
+    missing = {
+        name: allowed_set for name, allowed_set in allowed_sets.items()
+        if conn.execute("SELECT 1 FROM temp.sqlite_master WHERE name = ?;", (name,)).fetchone() is None
+    }
+    if not missing:
+        return
+    # query_only also blocks temp tables, the database file itself stays read-only (mode=ro)
+    query_only = conn.execute("PRAGMA query_only;").fetchone()[0]
+    if query_only:
+        conn.execute("PRAGMA query_only = OFF;")
+    try:
+        with conn:
+            for name, allowed_set in missing.items():
+                conn.execute(f"CREATE TEMP TABLE {name} (value {allowed_set['affinity']} PRIMARY KEY) WITHOUT ROWID;")
+                conn.executemany(f"INSERT OR IGNORE INTO temp.{name} VALUES (?);",
+                                 ((value,) for value in allowed_set['values'] if value is not None))
+    finally:
+        if query_only:
+            conn.execute("PRAGMA query_only = ON;")
+
+
+# Function to build the catalog facts of every column that the planner prunes checks with
+def build_column_catalog(columns_df, indexes_df=None):
+    """
+    Reads the output of fetch_columns/fetch_indexes into table -> column ->
+    {'data_type', 'not_null', 'rowid', 'unique', 'indexed', 'primary_key'}. 'unique' and 'indexed' hold the
+    name of a single-column unique index / an index led by the column (None otherwise).
+    Partial indexes and indexes with a non-BINARY collation are ignored. 'primary_key' is the
+    column's position in the primary key, 0 when it is not part of it.
+    """
+    catalog = {}
+    primary_keys = {}
+    for table, column, data_type, is_nullable, primary_key in zip(
+            columns_df['table_name'], columns_df['column_name'], columns_df['data_type'],
+            columns_df['is_nullable'], columns_df['primary_key']):
+        catalog.setdefault(table, {})[column] = {
+            'data_type': (data_type or '').upper(), 'not_null': is_nullable == 'NO',
+            'rowid': False, 'unique': None, 'indexed': None, 'primary_key': primary_key,
+        }
+        if primary_key:
+            primary_keys.setdefault(table, []).append(column)
+
+    index_columns = {}
+    pk_index_tables = set()
+    if indexes_df is not None:
+        for table, index, is_unique, origin, partial, position, column, collation in zip(
+                indexes_df['table_name'], indexes_df['index_name'], indexes_df['is_unique'],
+                indexes_df['origin'], indexes_df['partial'], indexes_df['position'],
+                indexes_df['column_name'], indexes_df['collation']):
+            if origin == 'pk':
+                pk_index_tables.add(table)
+            if partial or column is None:
+                continue
+            index_columns.setdefault((table, index), {'unique': bool(is_unique), 'columns': []})
+            index_columns[(table, index)]['columns'].append((position, column, collation))
+
+    for (table, index), index_data in index_columns.items():
+        columns = sorted(index_data['columns'])
+        _, leading_column, collation = columns[0]
+        column_catalog = catalog.get(table, {}).get(leading_column)
+        if column_catalog is None:
+            continue
+        if collation.upper() == 'BINARY' and column_catalog['indexed'] is None:
+            column_catalog['indexed'] = index
+        if index_data['unique'] and len(columns) == 1 and column_catalog['unique'] is None:
+            column_catalog['unique'] = index
+
+    # A single INTEGER PRIMARY KEY of a rowid table is the rowid itself: never null, unique and indexed
+    for table, columns in primary_keys.items():
+        if len(columns) == 1 and table not in pk_index_tables:
+            column_catalog = catalog[table][columns[0]]
+            if column_catalog['data_type'] == 'INTEGER':
+                column_catalog.update(rowid=True, not_null=True, unique='rowid', indexed='rowid')
+    return catalog
+
+
+# Function to get the checks of a column the schema already guarantees, rule -> reason
+def get_schema_guarantees(column_catalog):
+    guarantees = {}
+    if not column_catalog:
+        return guarantees
+    if column_catalog['rowid']:
+        guarantees['null_values'] = 'INTEGER PRIMARY KEY (rowid) is never null'
+        guarantees['duplicates'] = 'INTEGER PRIMARY KEY (rowid) is unique'
+        guarantees['distribution_drift'] = 'INTEGER PRIMARY KEY (rowid) grows with every insert'
+        return guarantees
+    if column_catalog['primary_key']:
+        # Keys identify rows, new rows bring new key values that drift by construction
+        guarantees['distribution_drift'] = 'primary key column'
+    if column_catalog['not_null']:
+        guarantees['null_values'] = 'NOT NULL constraint'
+        if column_catalog['unique']:
+            guarantees['duplicates'] = f"unique index {column_catalog['unique']} on a NOT NULL column"
+    return guarantees
+
+
+# Function to check whether a key column can be probed through an index, a composite key by its leading column
+def is_key_indexed(catalog, table, column):
+    if isinstance(column, tuple):
+        column = column[0]
+    if column == 'rowid':
+        return True
+    column_catalog = catalog.get(table, {}).get(column)
+    if column_catalog is None:
+        return None
+    return bool(column_catalog['indexed'] or column_catalog['unique'])
+
+
+# Function to build the MIN/MAX queries that an index answers with a single seek
+def build_index_seek_queries(table, table_columns, column_catalogs=None):
+    # SQLite only turns MIN()/MAX() into an index seek when it is the only aggregate of
+    # the query, so each bound gets its own query
+    seek_queries = {}
+    for column, data_type in table_columns:
+        column_catalog = (column_catalogs or {}).get(column)
+        if column_catalog and column_catalog['indexed'] and (data_type or '').upper() in RANGE_TYPES:
+            seek_queries[column] = {
+                'min_value': f"SELECT MIN({column}) FROM {table};",
+                'max_value': f"SELECT MAX({column}) FROM {table};",
+            }
+    return seek_queries
+
+
+# Function to build the expressions counting a column's values against the bins of its stored histogram
+def build_histogram_bins(column, histogram):
+    # Expression 0 counts the values, expression b the values below the lower edge of bin b
+    # (one comparison per edge instead of a range per bin); histogram_counts turns them into
+    # bin counts. Same equi-width bins as the profile, values outside its range count in the end bins
+    low, high = histogram['range']
+    bins = len(histogram['counts'])
+    width = (high - low) / bins
+    expressions = [f"COUNT({column})"]
+    for b in range(1, bins):
+        expressions.append(f"SUM({column} < {float(low + b * width)!r})")
+    return expressions
+
+
+# Function to turn the aggregates of build_histogram_bins into bin counts
+def histogram_counts(column_agg, bins):
+    below = [0] + [column_agg.get(f'histogram_{b}') or 0 for b in range(1, bins)]
+    below.append(column_agg.get('histogram_0') or 0)
+    return [below[b + 1] - below[b] for b in range(bins)]
+
+
+# Function to check whether a column has a stored histogram to compare against
+def has_drift_check(constraints, data_type):
+    histogram = constraints.get('histogram')
+    return (
+        bool(histogram and histogram.get('counts')) and constraints.get('drift_check', True)
+        and (data_type or '').upper() in NUMERIC_TYPES
+    )
+
+
+# Function to compute the population stability index of observed against expected bin counts
+def population_stability_index(expected_counts, observed_counts, epsilon=1e-4):
+    expected_total = sum(expected_counts)
+    observed_total = sum(observed_counts)
+    if not expected_total or not observed_total:
+        return 0.0
+    psi = 0.0
+    for expected, observed in zip(expected_counts, observed_counts):
+        # Empty bins get a small share so the logarithm stays finite
+        expected_share = max(expected / expected_total, epsilon)
+        observed_share = max(observed / observed_total, epsilon)
+        psi += (observed_share - expected_share) * math.log(observed_share / expected_share)
+    return psi
+
+
+# Function to get the child and parent key of a column's foreign key, None when it has none
+def get_foreign_key(column, foreign_key):
+    # A composite key is declared on its leading column as {'table', 'columns': {child: parent}},
+    # its child and parent keys are then tuples of columns
+    if not foreign_key or not foreign_key.get('table'):
+        return None
+    if foreign_key.get('columns'):
+        return tuple(foreign_key['columns']), tuple(foreign_key['columns'].values())
+    if foreign_key.get('column'):
+        return column, foreign_key['column']
+    return None
+
+
+# Function to write the columns of a key as a select list
+def key_select_list(key):
+    return ', '.join(key) if isinstance(key, tuple) else key
+
+
+# Function to write a key as SQL, a composite key as a row value
+def format_key(key):
+    return f"({key_select_list(key)})" if isinstance(key, tuple) else key
+
+
+# Function to build the condition that every column of a key is set
+def build_key_not_null(key):
+    return ' AND '.join(f"{column} IS NOT NULL" for column in (key if isinstance(key, tuple) else (key,)))
+
+
+# Function to get the column names of a parent keys CTE (see build_orphan_count_queries)
+def parent_key_names(parent_column):
+    if isinstance(parent_column, tuple):
+        return tuple(f"key_{i}" for i in range(len(parent_column)))
+    return 'key'
+
+
+# Function to build the expression that flags a value missing from the parent key
+def build_orphan_violation(column, parent_table, parent_column, parent_keys=None):
+    # parent_keys replaces the parent table with a CTE of its keys when the key has no index.
+    # A single NULL parent key would make NOT IN unknown for every row, so NULL keys are left out.
+    # Composite keys are matched on the whole row value; like SQLite's own foreign key
+    # enforcement, a child row with a NULL in any of the key columns is not checked
+    source = (f"SELECT {key_select_list(parent_key_names(parent_column))} FROM {parent_keys}" if parent_keys
+              else f"SELECT {key_select_list(parent_column)} FROM {parent_table} "
+                   f"WHERE {build_key_not_null(parent_column)}")
+    return f"{build_key_not_null(column)} AND {format_key(column)} NOT IN ({source})"
+
+
+# Function to build the select list of a parent keys CTE, the key columns renamed to parent_key_names
+def build_parent_key_columns(parent_column):
+    names = parent_key_names(parent_column)
+    if isinstance(parent_column, tuple):
+        return ', '.join(f"{column} AS {name}" for column, name in zip(parent_column, names))
+    return f"{parent_column} AS {names}"
+
+
+# Function to build one query per parent table counting the orphans of every child referencing it
+def build_orphan_count_queries(plan, tables=None):
+    """
+    Groups the foreign_key checks of the plan by parent table. Each group becomes a single
+    statement with one anti-join per child column; with an indexed parent key (primary key,
+    unique or plain index) every child value costs one index probe. Unindexed parent keys
+    are read once into a CTE shared by all children of that key.
+    Returns a list of (parent table, query, [(child table, column), ...]).
+    """
+    parents = {}
+    for table, table_plan in plan.items():
+        if tables is not None and table not in tables:
+            continue
+        for check in table_plan['checks']:
+            if check['rule'] == 'foreign_key':
+                parents.setdefault(check['parent_table'], []).append((table, check))
+
+    queries = []
+    for parent_table, references in parents.items():
+        key_sources = {}
+        for _, check in references:
+            parent_column = check['parent_column']
+            if check.get('parent_indexed') is False and parent_column not in key_sources:
+                key_sources[parent_column] = f"dq_parent_keys_{len(key_sources)}"
+        with_clause = ''
+        if key_sources:
+            with_clause = 'WITH ' + ', '.join(
+                f"{name} AS (SELECT {build_parent_key_columns(parent_column)} FROM {parent_table} "
+                f"WHERE {build_key_not_null(parent_column)})"
+                for parent_column, name in key_sources.items()
+            ) + ' '
+        counts = []
+        for i, (table, check) in enumerate(references):
+            violation = build_orphan_violation(
+                check['child_key'], parent_table, check['parent_column'], key_sources.get(check['parent_column'])
+            )
+            counts.append(f"(SELECT COUNT(*) FROM {table} WHERE {violation}) AS orphan_count_{i}")
+        query = f"{with_clause}SELECT {', '.join(counts)};"
+        queries.append((parent_table, query, [(table, check['column']) for table, check in references]))
+    return queries
+
+
+# Function to count the orphaned values of every foreign key in the plan, one query per parent table
+def fetch_orphan_counts(conn, plan, tables=None, budget=None):
+    orphan_counts = {}
+    for parent_table, query, references in build_orphan_count_queries(plan, tables):
+        # Keys the time budget already gave up on are not counted
+        if budget is not None and all((table, column, 'foreign_key') in budget.skipped for table, column in references):
+            continue
+        try:
+            with measure('orphans', table=parent_table, check='foreign_key'):
+                if budget is None:
+                    row = conn.execute(query).fetchone()
+                else:
+                    with budget.guard(conn):
+                        row = conn.execute(query).fetchone()
+        except sqlite3.Error as e:
+            if budget is not None and budget.interrupted:
+                # Left out of the counts, run_checks reports these checks as skipped
+                for table, column in references:
+                    budget.skipped[(table, column, 'foreign_key')] = budget.interrupted
+                continue
+            # The checks of this parent fall back to their own count query and report the error there
+            logger.error(f"Error counting orphans for {references}: {e}")
+            continue
+        orphan_counts.update(zip(references, row))
+    return orphan_counts
+
+
+# Function to build one fused aggregate query covering every column of a table
+def build_fused_aggregate_query(table, table_columns, data_dictionary, column_catalogs=None, expensive=True):
+    """
+    Plans a single SELECT that computes the null/zero/min/max/total counts for every
+    column of the table, plus COUNT(DISTINCT) for columns that disallow duplicates and the
+    allowable value violations (against the temp tables of load_allowed_value_sets).
+    With column_catalogs (one table of build_column_catalog) aggregates the schema already
+    answers are left out: NOT NULL columns get a constant null count, unique columns count
+    their values instead of their distinct values, and MIN/MAX of indexed columns are left
+    to build_index_seek_queries. expensive=False leaves out the aggregates of the
+    EXPENSIVE_CHECK_COSTS checks, the fallback when a table does not fit the time budget.
+    Returns the query and a mapping of column -> {metric: result alias}.
+    """
+    seek_queries = build_index_seek_queries(table, table_columns, column_catalogs)
+    query_parts = ["COUNT(*) AS total_count"]
+    aliases = {}
+    for i, (column, data_type) in enumerate(table_columns):
+        constraints = get_column_constraints(data_dictionary, table, column)
+        column_catalog = (column_catalogs or {}).get(column) or {}
+        guarantees = get_schema_guarantees(column_catalog)
+        data_type = (data_type or '').upper()
+        column_aliases = {'total_count': 'total_count'}
+
+        # COUNT(col) skips nulls, so the null count needs no CASE expression
+        if column_catalog.get('not_null'):
+            query_parts.append(f"0 AS c{i}_null_count")
+        else:
+            query_parts.append(f"COUNT(*) - COUNT({column}) AS c{i}_null_count")
+        column_aliases['null_count'] = f"c{i}_null_count"
+
+        if data_type in NUMERIC_TYPES:
+            query_parts.append(f"SUM(CASE WHEN {column} = 0 THEN 1 ELSE 0 END) AS c{i}_zero_count")
+            column_aliases['zero_count'] = f"c{i}_zero_count"
+
+        # Min and Max values for numeric and date columns
+        if data_type in RANGE_TYPES and column not in seek_queries:
+            query_parts.append(f"MIN({column}) AS c{i}_min_value")
+            query_parts.append(f"MAX({column}) AS c{i}_max_value")
+            column_aliases['min_value'] = f"c{i}_min_value"
+            column_aliases['max_value'] = f"c{i}_max_value"
+
+        if not expensive:
+            aliases[column] = column_aliases
+            continue
+
+        # Distinct counts are the expensive part of the scan, only compute them when needed
+        if not constraints.get('duplicates_allowed', True) and 'duplicates' not in guarantees:
+            if column_catalog.get('unique'):
+                # Non-null values of a unique column are distinct, no temp b-tree needed
+                query_parts.append(f"COUNT({column}) AS c{i}_distinct_count")
+            else:
+                query_parts.append(f"COUNT(DISTINCT {column}) AS c{i}_distinct_count")
+            column_aliases['distinct_count'] = f"c{i}_distinct_count"
+
+        if 'allowable_values' in constraints:
+            violation = build_allowable_violation(column, constraints['allowable_values'], data_type)
+            query_parts.append(f"SUM(CASE WHEN {violation} THEN 1 ELSE 0 END) AS c{i}_allowable_violations")
+            column_aliases['allowable_violations'] = f"c{i}_allowable_violations"
+
+        # Bin counts against the stored histogram, no second pass over the data
+        if has_drift_check(constraints, data_type) and 'distribution_drift' not in guarantees:
+            for b, expression in enumerate(build_histogram_bins(column, constraints['histogram'])):
+                query_parts.append(f"{expression} AS c{i}_histogram_{b}")
+                column_aliases[f'histogram_{b}'] = f"c{i}_histogram_{b}"
+
+        aliases[column] = column_aliases
+
+    query = f"SELECT {', '.join(query_parts)} FROM {table};"
+    return query, aliases
+
+
+# Function to fetch the aggregates for every column of a table in one scan
+def fetch_table_aggregates(conn, table, table_columns, data_dictionary, query=None, aliases=None,
+                           seek_queries=None):
+    if query is None:
+        query, aliases = build_fused_aggregate_query(table, table_columns, data_dictionary)
+    cursor = conn.execute(query)
+    names = [d[0] for d in cursor.description]
+    result = dict(zip(names, cursor.fetchone()))
+    data_aggregates = {
+        column: {metric: result[alias] for metric, alias in column_aliases.items()}
+        for column, column_aliases in aliases.items()
+    }
+    for column, column_queries in (seek_queries or {}).items():
+        for metric, seek_query in column_queries.items():
+            data_aggregates[column][metric] = conn.execute(seek_query).fetchone()[0]
+    return data_aggregates
+
+
+# Function to build the aggregate queries used by incremental checks
+def build_incremental_aggregate_query(table, table_columns, data_dictionary, watermark_column='rowid',
+                                      column_catalogs=None):
+    """
+    Plans the mergeable variant of the fused aggregate: counts, min/max, a HyperLogLog sketch
+    instead of COUNT(DISTINCT), the allowable value violations and the foreign key orphans,
+    plus the new watermark.
+    Returns the full-scan query, the query for rows past the watermark (its only parameter is
+    the stored watermark) and the column -> {metric: alias} mapping.
+    Rows past the watermark are rows with watermark_column > the stored watermark, so the column
+    must be unique and only grow (rowid, an INTEGER PRIMARY KEY): rows inserted later with the
+    same value as the stored watermark, e.g. a timestamp shared by several rows, are never scanned.
+    column_catalogs prunes null counts and sketches like in build_fused_aggregate_query.
+    """
+    query_parts = ["COUNT(*) AS total_count", f"MAX({watermark_column}) AS watermark"]
+    aliases = {}
+    for i, (column, data_type) in enumerate(table_columns):
+        constraints = get_column_constraints(data_dictionary, table, column)
+        column_catalog = (column_catalogs or {}).get(column) or {}
+        guarantees = get_schema_guarantees(column_catalog)
+        data_type = (data_type or '').upper()
+        column_aliases = {}
+
+        if column_catalog.get('not_null'):
+            query_parts.append(f"0 AS c{i}_null_count")
+        else:
+            query_parts.append(f"COUNT(*) - COUNT({column}) AS c{i}_null_count")
+        column_aliases['null_count'] = f"c{i}_null_count"
+
+        if data_type in NUMERIC_TYPES:
+            query_parts.append(f"SUM(CASE WHEN {column} = 0 THEN 1 ELSE 0 END) AS c{i}_zero_count")
+            column_aliases['zero_count'] = f"c{i}_zero_count"
+
+        if data_type in RANGE_TYPES:
+            query_parts.append(f"MIN({column}) AS c{i}_min_value")
+            query_parts.append(f"MAX({column}) AS c{i}_max_value")
+            column_aliases['min_value'] = f"c{i}_min_value"
+            column_aliases['max_value'] = f"c{i}_max_value"
+
+        # Exact distinct counts cannot be merged across runs, so a sketch is kept instead
+        if not constraints.get('duplicates_allowed', True) and 'duplicates' not in guarantees:
+            query_parts.append(f"HLL_SKETCH({column}) AS c{i}_distinct_sketch")
+            column_aliases['distinct_sketch'] = f"c{i}_distinct_sketch"
+
+        if 'allowable_values' in constraints:
+            violation = build_allowable_violation(column, constraints['allowable_values'], data_type)
+            query_parts.append(f"SUM(CASE WHEN {violation} THEN 1 ELSE 0 END) AS c{i}_allowable_violations")
+            column_aliases['allowable_violations'] = f"c{i}_allowable_violations"
+
+        # Orphans of the scanned rows only, against the parent keys at the time of the scan; like the
+        # other counts, orphans made by later parent deletes are picked up by the next full scan
+        foreign_key = get_foreign_key(column, constraints.get('foreign_key'))
+        if foreign_key is not None:
+            violation = build_orphan_violation(foreign_key[0], constraints['foreign_key']['table'], foreign_key[1])
+            query_parts.append(f"SUM(CASE WHEN {violation} THEN 1 ELSE 0 END) AS c{i}_orphan_count")
+            column_aliases['orphan_count'] = f"c{i}_orphan_count"
+
+        # Bin counts add up across runs like the other counts
+        if has_drift_check(constraints, data_type) and 'distribution_drift' not in guarantees:
+            for b, expression in enumerate(build_histogram_bins(column, constraints['histogram'])):
+                query_parts.append(f"{expression} AS c{i}_histogram_{b}")
+                column_aliases[f'histogram_{b}'] = f"c{i}_histogram_{b}"
+
+        aliases[column] = column_aliases
+
+    full_query = f"SELECT {', '.join(query_parts)} FROM {table};"
+    delta_query = f"SELECT {', '.join(query_parts)} FROM {table} WHERE {watermark_column} > ?;"
+    return full_query, delta_query, aliases
+
+
+# Function to merge the aggregates of newly scanned rows into the stored column state
+def merge_column_state(column_state, delta):
+    for key in delta:
+        if key in ('null_count', 'zero_count', 'allowable_violations', 'orphan_count') or key.startswith('histogram_'):
+            column_state[key] = column_state.get(key, 0) + (delta[key] or 0)
+    for key, pick in (('min_value', min), ('max_value', max)):
+        if delta.get(key) is not None:
+            current = column_state.get(key)
+            column_state[key] = delta[key] if current is None else pick(current, delta[key])
+    if delta.get('distinct_sketch') is not None:
+        sketch = HyperLogLog.from_bytes(delta['distinct_sketch'])
+        if column_state.get('distinct_sketch'):
+            sketch.merge(HyperLogLog.from_bytes(bytes.fromhex(column_state['distinct_sketch'])))
+        column_state['distinct_sketch'] = sketch.to_bytes().hex()
+    return column_state
+
+
+# Function to scan the rows past the watermark of a table and merge them into its state
+def update_table_state(conn, table, table_plan, table_state, full_rescan=False, full_rescan_days=FULL_RESCAN_DAYS):
+    incremental = table_plan['incremental']
+    last_full_scan = table_state.get('last_full_scan')
+    needs_full_scan = (
+        full_rescan
+        or table_state.get('watermark') is None
+        # A changed plan (new columns, constraints or watermark column) invalidates the stored state
+        or table_state.get('plan_id') != incremental['plan_id']
+        or last_full_scan is None
+        or datetime.fromisoformat(last_full_scan) < datetime.now() - timedelta(days=full_rescan_days)
+    )
+
+    if needs_full_scan:
+        cursor = conn.execute(incremental['full_query'])
+    else:
+        cursor = conn.execute(incremental['delta_query'], (table_state['watermark'],))
+    names = [d[0] for d in cursor.description]
+    result = dict(zip(names, cursor.fetchone()))
+
+    # The stored state is only replaced once the scan finished, an interrupted scan leaves it as it was
+    if needs_full_scan:
+        table_state.clear()
+        table_state['plan_id'] = incremental['plan_id']
+        table_state['watermark_column'] = incremental['watermark_column']
+        table_state['last_full_scan'] = datetime.now().isoformat(timespec='seconds')
+
+    if result['watermark'] is not None:
+        table_state['watermark'] = result['watermark']
+    table_state['total_count'] = table_state.get('total_count', 0) + result['total_count']
+    table_state['rows_scanned'] = result['total_count']
+    table_state['full_scan'] = needs_full_scan
+    columns_state = table_state.setdefault('columns', {})
+    for column, column_aliases in incremental['aliases'].items():
+        delta = {metric: result[alias] for metric, alias in column_aliases.items()}
+        merge_column_state(columns_state.setdefault(column, {}), delta)
+    return table_state
+
+
+# Function to turn the stored table state into the aggregates the checks are evaluated against
+def state_to_aggregates(table_state):
     data_aggregates = {}
-    
-    # Load constraints from data dictionary
-    with open('data_dictionary.json', 'r') as f:
-        data_dictionary = json.load(f)
-    
-    for _, row in table_columns.iterrows():
-        column = row['column_name']
-        data_type = row['data_type']
-        nullable = row['is_nullable']
-        
-        # Prepare aggregation queries
-        query_parts = [
-        f"SUM(CASE WHEN {column} IS NULL THEN 1 ELSE 0 END) AS null_count",
-        f"COUNT(DISTINCT {column}) AS distinct_count",
-        f"COUNT(*) AS total_count"
+    for column, column_state in table_state.get('columns', {}).items():
+        column_agg = {
+            'total_count': table_state.get('total_count', 0),
+            'null_count': column_state.get('null_count', 0),
+        }
+        for key in column_state:
+            if key in ('zero_count', 'allowable_violations', 'orphan_count', 'min_value', 'max_value') or \
+                    key.startswith('histogram_'):
+                column_agg[key] = column_state[key]
+        if column_state.get('distinct_sketch'):
+            sketch = HyperLogLog.from_bytes(bytes.fromhex(column_state['distinct_sketch']))
+            column_agg['distinct_count'] = sketch.count()
+            column_agg['distinct_error'] = sketch.error
+        data_aggregates[column] = column_agg
+    return data_aggregates
+
+
+# Function to load the incremental check state
+def load_check_state(state_file=STATE_FILE):
+    try:
+        with open(state_file, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+# Function to save the incremental check state
+def save_check_state(state, state_file=STATE_FILE):
+    with open(state_file, 'w') as f:
+        json.dump(state, f, indent=4)
+
+
+# Function to compile the checks declared for a single column
+def compile_column_checks(table, column, data_type, constraints):
+    data_type = (data_type or '').upper()
+    checks = []
+
+    if not constraints.get('null_values_allowed', True):
+        checks.append({
+            'column': column, 'rule': 'null_values', 'expected': 0,
+            'sample_condition': f"{column} IS NULL",
+            'sample_params': (),
+        })
+
+    if not constraints.get('zeros_allowed', True) and data_type in NUMERIC_TYPES:
+        checks.append({
+            'column': column, 'rule': 'zero_values', 'expected': 0,
+            'sample_condition': f"{column} = 0",
+            'sample_params': (),
+        })
+
+    if not constraints.get('duplicates_allowed', True):
+        checks.append({
+            'column': column, 'rule': 'duplicates', 'expected': 0,
+            # The duplicated values are computed once per query, not per row
+            'sample_condition': f"{column} IN (SELECT {column} FROM {table} GROUP BY {column} HAVING COUNT(*) > 1)",
+            'sample_params': (),
+            'sample_distinct': True,
+        })
+
+    if 'allowable_values' in constraints:
+        allowable_values = constraints['allowable_values']
+        violation = build_allowable_violation(column, allowable_values, data_type)
+        checks.append({
+            'column': column, 'rule': 'allowable_values', 'expected': allowable_values,
+            'count_query': f"SELECT COUNT(*) FROM {table} WHERE {violation};",
+            'sample_condition': violation,
+            'sample_params': (),
+            'sample_distinct': True,
+        })
+
+    foreign_key = get_foreign_key(column, constraints.get('foreign_key'))
+    if foreign_key is not None:
+        child_key, parent_key = foreign_key
+        parent_table = constraints['foreign_key']['table']
+        violation = build_orphan_violation(child_key, parent_table, parent_key)
+        checks.append({
+            'column': column, 'rule': 'foreign_key', 'expected': 0,
+            # Tuples of columns for a composite key
+            'child_key': child_key, 'parent_table': parent_table, 'parent_column': parent_key,
+            'count_query': f"SELECT COUNT(*) FROM {table} WHERE {violation};",
+            'sample_condition': violation,
+            'sample_params': (),
+            'sample_distinct': True,
+        })
+
+    if has_drift_check(constraints, data_type):
+        # Drift has no offending rows, so there is no sample condition
+        checks.append({
+            'column': column, 'rule': 'distribution_drift',
+            'expected': constraints.get('drift_threshold', DRIFT_PSI_THRESHOLD),
+            'histogram': constraints['histogram'],
+            'sample_condition': None,
+            'sample_params': (),
+        })
+
+    if 'min_value' in constraints:
+        checks.append({
+            'column': column, 'rule': 'min_value', 'expected': constraints['min_value'],
+            'sample_condition': f"{column} < ?",
+            'sample_params': (constraints['min_value'],),
+        })
+
+    if 'max_value' in constraints:
+        checks.append({
+            'column': column, 'rule': 'max_value', 'expected': constraints['max_value'],
+            'sample_condition': f"{column} > ?",
+            'sample_params': (constraints['max_value'],),
+        })
+
+    return checks
+
+
+# Function to compile the data dictionary into a reusable check plan
+def compile_check_plan(data_dictionary, columns_df=None, indexes_df=None):
+    """
+    Compiles every table in the data dictionary into its fused aggregate query and the
+    list of checks to evaluate against it. When columns_df (from fetch_columns) is given,
+    columns that no longer exist in the database are left out of the plan, and checks the
+    schema guarantees (NOT NULL, INTEGER PRIMARY KEY, unique indexes from indexes_df) are
+    pruned and listed under 'pruned' with the reason. Indexed columns get their MIN/MAX
+    from index seeks ('seek_queries') instead of the scan.
+    Each table also gets the mergeable queries used by incremental runs; the watermark is
+    the table's 'watermark_column' in the data dictionary or rowid. The watermark column must be
+    unique and increasing (rowid or an INTEGER PRIMARY KEY); with a non-unique column such as a
+    timestamp, rows added later that share the last seen value are missed until the next full scan.
+    Allowed value sets are kept as 'allowed_sets' (temp table name -> affinity and values), run_checks
+    loads them into the connection before the table is scanned.
+    'row_cost' is the relative cost of scanning one row, 'cheap_query' the scan without the
+    expensive checks; both are used to schedule runs with a time budget.
+    'key_columns' lists the primary key columns that identify sample records in the result
+    sinks (empty without the catalog).
+    """
+    catalog = None
+    if columns_df is not None:
+        catalog = build_column_catalog(columns_df, indexes_df)
+
+    data_dictionary = DataDictionary.from_dict(data_dictionary)
+    plan = {}
+    for table, table_data in data_dictionary.items():
+        table_columns = [
+            (column, column_data.get('data_type', ''))
+            for column, column_data in table_data.get('columns', {}).items()
+            if catalog is None or column in catalog.get(table, ())
+        ]
+        if not table_columns:
+            continue
+        column_catalogs = None if catalog is None else catalog.get(table, {})
+        query, aliases = build_fused_aggregate_query(table, table_columns, data_dictionary, column_catalogs)
+        cheap_query, cheap_aliases = build_fused_aggregate_query(
+            table, table_columns, data_dictionary, column_catalogs, expensive=False
+        )
+        checks = []
+        pruned = []
+        allowed_sets = {}
+        for column, data_type in table_columns:
+            constraints = table_data['columns'][column]
+            guarantees = get_schema_guarantees((column_catalogs or {}).get(column))
+            for check in compile_column_checks(table, column, data_type, constraints):
+                if check['rule'] == 'foreign_key' and catalog is not None:
+                    check['parent_indexed'] = is_key_indexed(catalog, check['parent_table'], check['parent_column'])
+                if check['rule'] in guarantees:
+                    pruned.append({'column': column, 'rule': check['rule'], 'reason': guarantees[check['rule']]})
+                else:
+                    checks.append(check)
+            if 'allowable_values' in constraints:
+                allowed_sets[get_allowed_values_table(constraints['allowable_values'], data_type)] = {
+                    'affinity': get_type_affinity(data_type), 'values': constraints['allowable_values'],
+                }
+        key_columns = [
+            column for column, column_catalog in sorted(
+                (column_catalogs or {}).items(), key=lambda item: item[1]['primary_key'])
+            if column_catalog['primary_key']
         ]
-        
-        # Min and Max values for numeric columns
-        if data_type.upper() in ['INTEGER', 'REAL', 'NUMERIC', 'DECIMAL', 'FLOAT', 'DOUBLE','DATE', 'DATETIME', 'TIMESTAMP']:
-            query_parts.append(f"MIN({column}) AS min_value")
-            query_parts.append(f"MAX({column}) AS max_value")
-        
-        # Construct the query
-        query = f"SELECT {', '.join(query_parts)} FROM {table};"
-        agg_df = pd.read_sql_query(query, conn)
-        
-        # Store aggregated results
-        data_aggregates[column] = agg_df.iloc[0].to_dict()
-    
-    # Validate data using aggregated results
-    for _, row in table_columns.iterrows():
-        column = row['column_name']
-        column_agg = data_aggregates[column]
-        table_constraints = data_dictionary.get(table, {}).get('columns', {}).get(column, {})
-        
-        # Check for null values if not allowed
-        if not table_constraints.get('null_values_allowed', True):
-            if column_agg['null_count'] > 0:
-                error_msg = f"Column '{column}' has {column_agg['null_count']} null values"
-                print(f"- {error_msg}")
-                logging.error(error_msg)
-                # Get sample of records with null values
-                query = f"SELECT * FROM {table} WHERE {column} IS NULL LIMIT 5;"
-                sample_records = pd.read_sql_query(query, conn)
-                logging.error(f"Sample records with null values:\n{sample_records.to_string()}")
-
-        # Check for zero values if not allowed
-        if not table_constraints.get('zeros_allowed', True):
-            if data_type.upper() in ['INTEGER', 'REAL', 'NUMERIC', 'DECIMAL', 'FLOAT', 'DOUBLE']:
-                query = f"SELECT COUNT(*) as zero_count FROM {table} WHERE {column} = 0;"
-                zero_count = pd.read_sql_query(query, conn).iloc[0]['zero_count']
-                if zero_count > 0:
-                    error_msg = f"Column '{column}' has {zero_count} zero values"
-                    print(f"- {error_msg}")
-                    logging.error(error_msg)
-                    # Get sample of records with zero values
-                    query = f"SELECT * FROM {table} WHERE {column} = 0 LIMIT 5;"
-                    sample_records = pd.read_sql_query(query, conn)
-                    logging.error(f"Sample records with zero values:\n{sample_records.to_string()}")
-
-        # Check for duplicates if not allowed
-        if not table_constraints.get('duplicates_allowed', True):
-            if column_agg['distinct_count'] < column_agg['total_count']:
-                error_msg = f"Column '{column}' has {column_agg['total_count'] - column_agg['distinct_count']} duplicate values"
-                print(f"- {error_msg}")
-                logging.error(error_msg)
-                # Get sample of duplicate records
-                query = f"""
-                    SELECT *, COUNT(*) as count 
-                    FROM {table} 
-                    GROUP BY {column} 
-                    HAVING COUNT(*) > 1 
-                    LIMIT 5;
-                """
-                sample_records = pd.read_sql_query(query, conn)
-                logging.error(f"Sample duplicate records:\n{sample_records.to_string()}")
-
-        # Check for allowable values
-        if 'allowable_values' in table_constraints:
-            allowable_values = table_constraints['allowable_values']
-            allowable_values_list = ', '.join([f"'{v}'" if isinstance(v, str) else str(v) for v in allowable_values])
-            query = f"""
-                SELECT *, COUNT(*) as invalid_count 
-                FROM {table} 
-                WHERE {column} NOT IN ({allowable_values_list})
-                GROUP BY {column}
-                LIMIT 5;
-            """
-            invalid_records = pd.read_sql_query(query, conn)
-            if len(invalid_records) > 0:
-                error_msg = f"Column '{column}' has values outside allowable range: {allowable_values}"
-                print(f"- {error_msg}")
-                logging.error(error_msg)
-                logging.error(f"Sample invalid records:\n{invalid_records.to_string()}")
-
-        # Check for minimum value
-        if 'min_value' in table_constraints and 'min_value' in column_agg:
-            if column_agg['min_value'] < table_constraints['min_value']:
-                error_msg = f"Column '{column}' has values below minimum value of {table_constraints['min_value']}"
-                print(f"- {error_msg}")
-                logging.error(error_msg)
-                query = f"SELECT * FROM {table} WHERE {column} < {table_constraints['min_value']} LIMIT 5;"
-                sample_records = pd.read_sql_query(query, conn)
-                logging.error(f"Sample records below minimum value:\n{sample_records.to_string()}")
-
-        # Check for maximum value
-        if 'max_value' in table_constraints and 'max_value' in column_agg:
-            if column_agg['max_value'] > table_constraints['max_value']:
-                error_msg = f"Column '{column}' has values above maximum value of {table_constraints['max_value']}"
-                print(f"- {error_msg}")
-                logging.error(error_msg)
-                query = f"SELECT * FROM {table} WHERE {column} > {table_constraints['max_value']} LIMIT 5;"
-                sample_records = pd.read_sql_query(query, conn)
-                logging.error(f"Sample records above maximum value:\n{sample_records.to_string()}")
-        
-        # Log successful checks
-        if not logging.getLogger().hasHandlers():
-            logging.info(f"All checks passed for column '{column}' in table '{table}'")
-
-conn.close()
-logging.info("Data quality check completed")
+        watermark_column = table_data.get('watermark_column', 'rowid')
+        full_query, delta_query, incremental_aliases = build_incremental_aggregate_query(
+            table, table_columns, data_dictionary, watermark_column, column_catalogs
+        )
+        plan[table] = {
+            'columns': table_columns,
+            'query': query,
+            'aliases': aliases,
+            'cheap_query': cheap_query,
+            'cheap_aliases': cheap_aliases,
+            'row_cost': len(table_columns) + sum(EXPENSIVE_CHECK_COSTS.get(check['rule'], 0) for check in checks),
+            'checks': checks,
+            'pruned': pruned,
+            'seek_queries': build_index_seek_queries(table, table_columns, column_catalogs),
+            'allowed_sets': allowed_sets,
+            'key_columns': key_columns,
+            'incremental': {
+                'watermark_column': watermark_column,
+                'full_query': full_query,
+                'delta_query': delta_query,
+                'aliases': incremental_aliases,
+                'plan_id': zlib.crc32(full_query.encode('utf-8')),
+            },
+        }
+    return plan
+
+
+# Function to fetch the sample records of the failed checks of a table in one pass
+def fetch_table_samples(conn, table, checks, sample_size=SAMPLE_SIZE):
+    """
+    Collects the sample records of every failed check of a table in one pass. The rows are
+    tagged with the checks they violate and the scan stops as soon as every check has
+    sample_size records. Checks with 'sample_distinct' keep one record per column value.
+    Returns a list of sample record lists, in the order of checks.
+    """
+    samples = [[] for _ in checks]
+    if not checks or sample_size <= 0:
+        return samples
+    tags = [f"__dq_check_{i}" for i in range(len(checks))]
+    query = (
+        f"SELECT * FROM (SELECT *, "
+        + ', '.join(f"({check['sample_condition']}) AS {tag}" for check, tag in zip(checks, tags))
+        + f" FROM {table}) WHERE " + ' OR '.join(tags) + ";"
+    )
+    params = [param for check in checks for param in check['sample_params']]
+    cursor = conn.execute(query, params)
+    names = [d[0] for d in cursor.description]
+    record_width = len(names) - len(tags)
+    names = names[:record_width]
+    seen = [set() for _ in checks]
+    pending = len(checks)
+    for row in cursor:
+        for i, check in enumerate(checks):
+            if not row[record_width + i] or len(samples[i]) >= sample_size:
+                continue
+            record = dict(zip(names, row[:record_width]))
+            if check.get('sample_distinct'):
+                # One record per key value for composite foreign keys
+                key = check.get('child_key', check['column'])
+                value = tuple(record.get(column) for column in key) if isinstance(key, tuple) else record.get(key)
+                if value in seen[i]:
+                    continue
+                seen[i].add(value)
+            samples[i].append(record)
+            if len(samples[i]) == sample_size:
+                pending -= 1
+        if pending == 0:
+            break
+    cursor.close()
+    return samples
+
+
+# Function to evaluate a single compiled check against the table aggregates
+def evaluate_check(conn, table, check, column_agg):
+    column = check['column']
+    rule = check['rule']
+    expected = check['expected']
+    observed = None
+    passed = True
+    message = ''
+
+    if rule == 'null_values':
+        observed = column_agg['null_count']
+        passed = observed == 0
+        message = f"Column '{column}' has {observed} null values"
+    elif rule == 'zero_values':
+        observed = column_agg['zero_count'] or 0
+        passed = observed == 0
+        message = f"Column '{column}' has {observed} zero values"
+    elif rule == 'duplicates':
+        observed = max(column_agg['total_count'] - column_agg['distinct_count'], 0)
+        passed = observed == 0
+        message = f"Column '{column}' has {observed} duplicate values"
+        if 'distinct_error' in column_agg:
+            # Sketch based distinct counts only flag duplicates beyond three standard errors
+            passed = observed <= 3 * column_agg['distinct_error'] * column_agg['distinct_count']
+            message = f"Column '{column}' has approximately {observed} duplicate values"
+    elif rule == 'allowable_values':
+        if 'allowable_violations' in column_agg:
+            observed = column_agg['allowable_violations']
+        else:
+            observed = conn.execute(check['count_query'], check['sample_params']).fetchone()[0]
+        passed = observed == 0
+        if len(expected) > MESSAGE_VALUES_LIMIT:
+            message = f"Column '{column}' has {observed} values outside its {len(expected)} allowable values"
+        else:
+            message = f"Column '{column}' has values outside allowable range: {expected}"
+    elif rule == 'foreign_key':
+        observed = column_agg.get('orphan_count')
+        if observed is None:
+            observed = conn.execute(check['count_query']).fetchone()[0]
+        passed = observed == 0
+        if isinstance(check['child_key'], tuple):
+            message = (f"Key {format_key(check['child_key'])} has {observed} values missing from "
+                       f"{check['parent_table']} {format_key(check['parent_column'])}")
+        else:
+            message = (f"Column '{column}' has {observed} values missing from "
+                       f"{check['parent_table']}.{check['parent_column']}")
+    elif rule == 'distribution_drift':
+        expected_counts = check['histogram']['counts']
+        observed_counts = histogram_counts(column_agg, len(expected_counts))
+        observed = round(population_stability_index(expected_counts, observed_counts), 4)
+        passed = observed <= expected
+        message = (f"Column '{column}' distribution drifted from its profile "
+                   f"(PSI {observed} > {expected}, bins {observed_counts} vs {expected_counts})")
+    elif rule == 'min_value':
+        observed = column_agg.get('min_value')
+        passed = observed is None or not observed < expected
+        message = f"Column '{column}' has values below minimum value of {expected}"
+    elif rule == 'max_value':
+        observed = column_agg.get('max_value')
+        passed = observed is None or not observed > expected
+        message = f"Column '{column}' has values above maximum value of {expected}"
+
+    return {
+        'table': table,
+        'column': column,
+        'rule': rule,
+        'passed': passed,
+        'observed': observed,
+        'expected': expected,
+        'message': '' if passed else message,
+        # Filled in per table by fetch_table_samples
+        'samples': [],
+    }
+
+
+class TimeBudget:
+    """
+    Time budgets of a check run: run_seconds for the whole run and query_seconds for any
+    single query, either can be None. guard(conn) installs a progress handler that
+    interrupts the running query once its deadline passes; cancel() stops the run from
+    another thread. Checks that were given up are kept in 'skipped' as
+    (table, column, rule) -> reason.
+    """
+
+    def __init__(self, run_seconds=None, query_seconds=None):
+        self.run_seconds = run_seconds
+        self.query_seconds = query_seconds
+        self.started = time.monotonic()
+        self.cancelled = False
+        # Reason the last guarded query was interrupted, None when it finished
+        self.interrupted = None
+        self.skipped = {}
+        self._cost_done = 0
+        self._seconds_done = 0.0
+
+    def remaining(self):
+        if self.cancelled:
+            return 0.0
+        if self.run_seconds is None:
+            return None
+        return max(self.run_seconds - (time.monotonic() - self.started), 0.0)
+
+    def expired(self):
+        return self.remaining() == 0.0
+
+    def cancel(self):
+        self.cancelled = True
+
+    # Function to calibrate the cost estimates with a finished scan
+    def record(self, cost, seconds):
+        self._cost_done += cost
+        self._seconds_done += seconds
+
+    def estimate(self, cost):
+        # Seconds per cost unit measured on the tables scanned so far, None before the first scan
+        if not self._cost_done:
+            return None
+        return cost * self._seconds_done / self._cost_done
+
+    def fits(self, cost):
+        remaining = self.remaining()
+        estimate = self.estimate(cost)
+        if remaining is None or estimate is None:
+            return not self.expired()
+        return estimate <= remaining
+
+    @contextmanager
+    def guard(self, conn):
+        self.interrupted = None
+        deadlines = []
+        if self.query_seconds is not None:
+            deadlines.append((time.monotonic() + self.query_seconds, f"query exceeded its {self.query_seconds}s budget"))
+        if self.run_seconds is not None:
+            deadlines.append((self.started + self.run_seconds, f"run exceeded its {self.run_seconds}s budget"))
+        deadline, reason = min(deadlines) if deadlines else (None, None)
+
+        def progress():
+            if self.cancelled:
+                self.interrupted = 'run cancelled'
+                return 1
+            if deadline is not None and time.monotonic() > deadline:
+                self.interrupted = reason
+                return 1
+            return 0
+
+        # A non-zero return from the handler makes SQLite abort the query with 'interrupted'
+        add_progress_callback(conn, progress)
+        try:
+            yield self
+        finally:
+            remove_progress_callback(conn, progress)
+
+
+# Function to estimate the row count of tables from sqlite_stat1 (ANALYZE), or their largest rowid
+def estimate_table_rows(conn, tables):
+    estimates = {}
+    try:
+        for table, stat in conn.execute("SELECT tbl, stat FROM sqlite_stat1;"):
+            try:
+                estimates[table] = max(estimates.get(table, 0), int(str(stat).split()[0]))
+            except ValueError:
+                continue
+    except sqlite3.OperationalError:
+        # ANALYZE never ran on this database
+        pass
+    for table in tables:
+        if table in estimates:
+            continue
+        try:
+            # A seek on the rowid b-tree, not a count
+            estimates[table] = conn.execute(f"SELECT MAX(rowid) FROM {table};").fetchone()[0] or 0
+        except sqlite3.Error:
+            # WITHOUT ROWID tables have no rowid to seek
+            estimates[table] = None
+    return estimates
+
+
+# Function to order the tables of a plan by estimated scan cost, tables of unknown size last
+def schedule_tables(plan, row_estimates):
+    def table_cost(table):
+        rows = row_estimates.get(table)
+        return (rows is None, (rows or 0) * plan[table]['row_cost'])
+    return sorted(plan, key=table_cost)
+
+
+# Function to scan a table within the time budget, dropping its expensive checks when they do not fit
+def scan_table_within_budget(conn, table, table_plan, data_dictionary, budget, estimated_rows=None):
+    cost = (estimated_rows or 0) * table_plan['row_cost']
+    if budget.fits(cost):
+        started = time.monotonic()
+        try:
+            with budget.guard(conn):
+                data_aggregates = fetch_table_aggregates(
+                    conn, table, table_plan['columns'], data_dictionary,
+                    query=table_plan['query'], aliases=table_plan['aliases'],
+                    seek_queries=table_plan.get('seek_queries')
+                )
+            budget.record(cost, time.monotonic() - started)
+            return data_aggregates
+        except sqlite3.OperationalError:
+            if budget.interrupted is None or table_plan['cheap_query'] == table_plan['query']:
+                raise
+            reason = budget.interrupted
+    elif budget.estimate(cost) is None:
+        # No table calibrated the estimates yet, the run was cancelled or its budget ran out
+        reason = 'run cancelled' if budget.cancelled else 'run time budget exhausted'
+    else:
+        reason = (f"estimated {budget.estimate(cost):.1f}s does not fit the remaining "
+                  f"{budget.remaining():.1f}s of the run budget")
+
+    for check in table_plan['checks']:
+        if check['rule'] in EXPENSIVE_CHECK_COSTS:
+            budget.skipped[(table, check['column'], check['rule'])] = reason
+    with budget.guard(conn):
+        return fetch_table_aggregates(
+            conn, table, table_plan['columns'], data_dictionary,
+            query=table_plan['cheap_query'], aliases=table_plan['cheap_aliases'],
+            seek_queries=table_plan.get('seek_queries')
+        )
+
+
+# Function to build the result of a check that was given up to stay within the time budget
+def skipped_result(table, check, reason):
+    return {
+        'table': table,
+        'column': check['column'],
+        'rule': check['rule'],
+        'passed': None,
+        'observed': None,
+        'expected': check['expected'],
+        'message': f"Skipped {check['rule']} check on column '{check['column']}': {reason}",
+        'samples': [],
+    }
+
+
+# Function to run the data quality checks
+def run_checks(conn, data_dictionary, tables=None, plan=None, state=None, full_rescan=False,
+               full_rescan_days=FULL_RESCAN_DAYS, sample_size=SAMPLE_SIZE, budget=None, sinks=None,
+               keep_results=True):
+    """
+    Runs the data quality checks on an open connection and returns one result dict per
+    check. Pass a plan from compile_check_plan to reuse it across runs; tables limits the
+    run to a subset of the tables in the plan.
+    Passing a state dict (see load_check_state) switches to incremental mode: only rows past
+    each table's watermark are scanned and merged into the state, which the caller saves.
+    Tables are fully rescanned when full_rescan is set, their plan changed or their last
+    full scan is older than full_rescan_days, since updates and deletes of old rows are
+    only picked up by a full scan.
+    Sample records of the failed checks are collected with one query per table, up to
+    sample_size per check; sample_size=0 skips them (fast mode).
+    With a TimeBudget, tables are scanned cheapest first (row estimates times the plan's
+    row_cost) and every query runs under the budget's progress handler; orphan counts are
+    then run per child table after its scan instead of up front (incremental runs count
+    them in the table scan itself). A table whose
+    scan does not fit, or gets interrupted, is scanned again without its expensive checks;
+    checks that could not be run come back with passed=None and the reason as message.
+    The results of each table are handed to every sink in sinks (see result_sinks.py) as
+    soon as the table is done; keep_results=False streams them to the sinks only and
+    returns an empty list, so memory does not grow with the number of tables checked.
+    """
+    if plan is None:
+        plan = compile_check_plan(data_dictionary)
+    if state is not None:
+        register_sketch_functions(conn)
+
+    table_order = [table for table in plan if tables is None or table in tables]
+    row_estimates = {}
+    if budget is not None:
+        row_estimates = estimate_table_rows(conn, table_order)
+        table_order = schedule_tables({table: plan[table] for table in table_order}, row_estimates)
+
+    # Orphan counts are batched per parent table before the tables are checked one by one. With
+    # a time budget they are counted per child table in its turn, so they follow the cost order.
+    # Incremental runs count the orphans of the rows past the watermark in the table's own scan
+    orphan_counts = {} if budget is not None or state is not None else fetch_orphan_counts(conn, plan, tables)
+
+    results = []
+    for table in table_order:
+        table_plan = plan[table]
+        started = time.perf_counter()
+        logger.info(f"Starting checks for table: {table}")
+        for pruned in table_plan.get('pruned', []):
+            logger.info(f"Pruned {pruned['rule']} check on {table}.{pruned['column']}: {pruned['reason']}")
+        if budget is not None and budget.expired():
+            reason = 'run cancelled' if budget.cancelled else 'run time budget exhausted'
+            table_results = [skipped_result(table, check, reason) for check in table_plan['checks']]
+        else:
+            try:
+                with measure('scan', table=table) as block:
+                    load_allowed_value_sets(conn, table_plan.get('allowed_sets', {}))
+                    if state is not None:
+                        if budget is None:
+                            table_state = update_table_state(
+                                conn, table, table_plan, state.setdefault(table, {}), full_rescan, full_rescan_days
+                            )
+                        else:
+                            with budget.guard(conn):
+                                table_state = update_table_state(
+                                    conn, table, table_plan, state.setdefault(table, {}), full_rescan, full_rescan_days
+                                )
+                        data_aggregates = state_to_aggregates(table_state)
+                        block['rows'] = table_state['rows_scanned']
+                    else:
+                        if budget is not None:
+                            data_aggregates = scan_table_within_budget(
+                                conn, table, table_plan, data_dictionary, budget, row_estimates.get(table)
+                            )
+                        else:
+                            data_aggregates = fetch_table_aggregates(
+                                conn, table, table_plan['columns'], data_dictionary,
+                                query=table_plan['query'], aliases=table_plan['aliases'],
+                                seek_queries=table_plan.get('seek_queries')
+                            )
+                        block['rows'] = next(iter(data_aggregates.values()), {}).get('total_count') or 0
+                if budget is not None and state is None:
+                    orphan_counts.update(fetch_orphan_counts(conn, plan, [table], budget))
+                for column, column_agg in data_aggregates.items():
+                    if (table, column) in orphan_counts:
+                        column_agg['orphan_count'] = orphan_counts[(table, column)]
+                skipped = budget.skipped if budget is not None else {}
+                with measure('evaluate', table=table):
+                    table_results = [
+                        skipped_result(table, check, skipped[(table, check['column'], check['rule'])])
+                        if (table, check['column'], check['rule']) in skipped
+                        else evaluate_check(conn, table, check, data_aggregates[check['column']])
+                        for check in table_plan['checks']
+                    ]
+                failed = [
+                    i for i, result in enumerate(table_results)
+                    if result['passed'] is False and table_plan['checks'][i]['sample_condition'] is not None
+                ]
+                if failed and sample_size > 0 and (budget is None or not budget.expired()):
+                    failed_checks = [table_plan['checks'][i] for i in failed]
+                    try:
+                        with measure('samples', table=table):
+                            if budget is None:
+                                samples = fetch_table_samples(conn, table, failed_checks, sample_size)
+                            else:
+                                with budget.guard(conn):
+                                    samples = fetch_table_samples(conn, table, failed_checks, sample_size)
+                    except sqlite3.OperationalError:
+                        if budget is None or budget.interrupted is None:
+                            raise
+                        logger.warning(f"Sample records for {table} skipped: {budget.interrupted}")
+                        samples = []
+                    for i, check_samples in zip(failed, samples):
+                        table_results[i]['samples'] = check_samples
+            except sqlite3.Error as e:
+                if budget is not None and budget.interrupted is not None:
+                    logger.warning(f"Checks for table {table} skipped: {budget.interrupted}")
+                    table_results = [skipped_result(table, check, budget.interrupted) for check in table_plan['checks']]
+                else:
+                    logger.error(f"Error checking table {table}: {e}")
+                    table_results = [{
+                        'table': table, 'column': None, 'rule': 'error', 'passed': False,
+                        'observed': None, 'expected': None, 'message': str(e), 'samples': [],
+                    }]
+
+        # Results go to the sinks as soon as their table is done
+        duration = time.perf_counter() - started
+        for sink in sinks or ():
+            for result in table_results:
+                sink.write_result(result, duration, table_plan.get('key_columns'))
+            sink.flush()
+        if keep_results:
+            results.extend(table_results)
+    return results
+
+
+# Function to format sample records for the text report
+def format_samples(samples):
+    if not samples:
+        return ''
+    names = list(samples[0].keys())
+    lines = ['  '.join(names)]
+    lines.extend('  '.join(str(record[name]) for name in names) for record in samples)
+    return '\n'.join(lines)
+
+
+class ReportLogSink(ResultSink):
+    """Result sink writing the text report to the log and console, counting failed and skipped checks."""
+
+    def __init__(self):
+        super().__init__()
+        self.current_shard = None
+        self.current_table = None
+        self.failed = 0
+        self.skipped = 0
+
+    def write_result(self, result, duration_seconds=None, key_columns=None):
+        # Fleet runs (see fleet.py) tag every result with its shard
+        if result.get('shard') != self.current_shard:
+            self.current_shard = result.get('shard')
+            self.current_table = None
+            print(f"Checking shard: {self.current_shard}")
+            logger.info(f"Results for shard: {self.current_shard}")
+        if result['table'] != self.current_table:
+            self.current_table = result['table']
+            print(f"Checking table: {self.current_table}")
+        if result['passed']:
+            return
+        print(f"- {result['message']}")
+        if result['passed'] is None:
+            self.skipped += 1
+            logger.warning(result['message'])
+            return
+        self.failed += 1
+        logger.error(result['message'])
+        if result['samples']:
+            logger.error(f"Sample records for {result['rule']}:\n{format_samples(result['samples'])}")
+
+
+# Function to write the results to the log and console
+def log_results(results):
+    report = ReportLogSink()
+    for result in results:
+        report.write_result(result)
+    return report
+
+
+# %%
+# Run the data quality checks
+# Function to run the checks as a script: sets up the report log, runs every check and logs the results
+def main(db_name=DB_NAME, dictionary_file=DICTIONARY_FILE, incremental=INCREMENTAL, fast=FAST_MODE,
+         run_budget=RUN_TIME_BUDGET, query_budget=QUERY_TIME_BUDGET, results_file=RESULTS_FILE):
+    # Setup logging
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    log_filename = f'DQ_Report_{timestamp}.log'
+    logging.basicConfig(
+        filename=log_filename,
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+
+    # Load constraints from data dictionary
+    data_dictionary = DataDictionary.from_dict(open_dictionary_store(dictionary_file).load())
+
+    sample_size = 0 if fast else SAMPLE_SIZE
+    budget = None
+    if run_budget is not None or query_budget is not None:
+        budget = TimeBudget(run_budget, query_budget)
+    # Results are streamed to the report and the results file table by table, none are kept in memory
+    report = ReportLogSink()
+    sinks = [report]
+    if results_file:
+        results_file = results_file.format(timestamp=timestamp)
+        sinks.append(open_results_sink(results_file, run_id=timestamp))
+    metrics = start_metrics('check')
+    try:
+        with pooled_conn(db_name) as conn:
+            if metrics is not None:
+                metrics.instrument(conn)
+            with measure('plan'):
+                plan = compile_check_plan(data_dictionary, fetch_columns(conn), fetch_indexes(conn))
+            state = load_check_state() if incremental else None
+            run_checks(conn, data_dictionary, plan=plan, state=state, sample_size=sample_size, budget=budget,
+                       sinks=sinks, keep_results=False)
+            if incremental:
+                save_check_state(state)
+    finally:
+        for sink in sinks:
+            sink.close()
+    if results_file:
+        logger.info(f"Check results written to {results_file}")
+    pruned_count = sum(len(table_plan['pruned']) for table_plan in plan.values())
+    if pruned_count:
+        print(f"{pruned_count} checks pruned, the schema already guarantees them (see {log_filename})")
+    if report.skipped:
+        print(f"{report.skipped} checks skipped to stay within the time budget, the report is partial")
+    if metrics is not None:
+        written = metrics.finish()
+        logger.info(f"Query metrics:\n{metrics.format_summary()}")
+        if written is not None:
+            summary_file, metrics_file = written
+            logger.info(f"Run summary written to {summary_file}, Prometheus metrics to {metrics_file}")
+
+    logger.info("Data quality check completed")
+    return report
+
 
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+"""
+Single command-line entry point for the data dictionary toolchain.
+
+Subcommands:
+    init      Build the data dictionary from the database schema and profile every column
+    refresh   Apply schema changes to the data dictionary (--check only probes for them)
+    check     Run the data quality checks and write the DQ_Report log
+    profile   Re-profile some columns of one table in an existing data dictionary
+    fleet     Profile (fleet init) or check (fleet check) many database shards concurrently
+
+Only argparse is imported up front. Each subcommand imports its module when it runs, and
+tqdm is only loaded when columns are profiled, so a cron probe like "datadict.py refresh --check" starts in a fraction of
+the time the full toolchain takes to import. Nothing connects to the database at import time.
+
+Usage:
+    python datadict.py init --workers 4
+    python datadict.py refresh --yes
+    python datadict.py refresh --check            # exit status 1 when the schema changed
+    python datadict.py check --incremental --run-budget 3600
+    python datadict.py check --results dq_results.parquet
+    python datadict.py profile orders quantity order_date
+    python datadict.py --db other.db --dictionary other_dictionary.json check
+    python datadict.py fleet init 'shards/*.db' --workers 8
+    python datadict.py fleet check 'shards/*.db' --results fleet_results.jsonl
+
+Dependencies:
+------------
+- argparse
+"""
+
+# Import Libraries
+import argparse
+import sys
+
+# Same defaults as db_conn.DB_NAME and the scripts, kept here so --help needs no other import
+DEFAULT_DB = 'sample_database.db'
+DEFAULT_DICTIONARY = 'data_dictionary.json'
+
+
+# Function to drop the options that were not given, so the module defaults apply
+def given_options(args, names):
+    return {name: getattr(args, name) for name in names if getattr(args, name) is not None}
+
+
+# Function to run the init subcommand
+def run_init(args):
+    from init_data_dictionary import main
+    main(args.db, args.dictionary,
+         **given_options(args, ('workers', 'approximate', 'sample_rows', 'sample_fraction')))
+    return 0
+
+
+# Function to run the refresh subcommand
+def run_refresh(args):
+    from refresh_data_dictionary import main
+    return main(args, args.db, args.dictionary)
+
+
+# Function to run the check subcommand
+def run_check(args):
+    from data_quality_checks import main
+    try:
+        main(args.db, args.dictionary,
+             **given_options(args, ('incremental', 'fast', 'run_budget', 'query_budget', 'results_file')))
+    except ImportError as e:
+        # A .parquet results file without pyarrow
+        print(e, file=sys.stderr)
+        return 2
+    return 0
+
+
+# Function to run the profile subcommand
+def run_profile(args):
+    from init_data_dictionary import profile_columns
+    try:
+        profile_columns(args.table, args.columns, args.db, args.dictionary, approximate=args.approximate)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    return 0
+
+
+# Function to run the fleet subcommand
+def run_fleet(args):
+    from fleet import fleet_check, fleet_init
+    try:
+        if args.action == 'init':
+            fleet_init(args.shards, args.dictionary, **given_options(args, ('workers',)))
+            return 0
+        fleet_check(args.shards, args.dictionary, **given_options(
+            args, ('workers', 'fast', 'run_budget', 'query_budget', 'results_file')))
+    except (ValueError, ImportError) as e:
+        print(e, file=sys.stderr)
+        return 2
+    return 0
+
+
+# Function to add the refresh options to a command line parser, shared with refresh_data_dictionary.py
+def add_refresh_arguments(parser):
+    parser.add_argument('--policy', help='JSON file with the refresh policy (see REFRESH_POLICY)')
+    parser.add_argument('--yes', action='store_true',
+                        help='run without prompts: add new tables/columns, keep removed ones')
+    parser.add_argument('--update-all', action='store_true', help='re-profile every column')
+    parser.add_argument('--check', action='store_true',
+                        help='only report whether the schema changed since the last refresh '
+                             '(exit status 1 when it did), nothing is written')
+    return parser
+
+
+# Function to build the command line parser
+def build_parser():
+    parser = argparse.ArgumentParser(prog='datadict', description='Data dictionary and data quality toolchain.')
+    parser.add_argument('--db', default=DEFAULT_DB, help=f'SQLite database (default: {DEFAULT_DB})')
+    parser.add_argument('--dictionary', default=DEFAULT_DICTIONARY,
+                        help=f'data dictionary, a .db/.sqlite path uses the SQLite store (default: {DEFAULT_DICTIONARY})')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    init_parser = subparsers.add_parser('init', help='build the data dictionary from the schema and profile it')
+    init_parser.add_argument('--workers', type=int, help='tables profiled in parallel')
+    init_parser.add_argument('--approximate', action='store_true', default=None,
+                             help='estimate distinct counts and top values with sketches')
+    init_parser.add_argument('--sample-rows', type=int, help='profile large tables from a sample of this many rows')
+    init_parser.add_argument('--sample-fraction', type=float, help='profile large tables from this fraction of rows')
+    init_parser.set_defaults(func=run_init)
+
+    refresh_parser = subparsers.add_parser('refresh', help='apply schema changes to the data dictionary')
+    add_refresh_arguments(refresh_parser)
+    refresh_parser.set_defaults(func=run_refresh)
+
+    check_parser = subparsers.add_parser('check', help='run the data quality checks')
+    check_parser.add_argument('--incremental', action='store_true', default=None,
+                              help='only scan rows added since the previous run')
+    check_parser.add_argument('--fast', action='store_true', default=None, help='skip sample records')
+    check_parser.add_argument('--run-budget', type=float, help='time budget of the whole run in seconds')
+    check_parser.add_argument('--query-budget', type=float, help='time budget of any single query in seconds')
+    check_parser.add_argument('--results', dest='results_file',
+                              help='structured results file, .parquet writes Parquet (needs pyarrow), '
+                                   'anything else JSON Lines (default: DQ_Results_<timestamp>.jsonl)')
+    check_parser.set_defaults(func=run_check)
+
+    profile_parser = subparsers.add_parser('profile', help='re-profile columns of one table')
+    profile_parser.add_argument('table')
+    profile_parser.add_argument('columns', nargs='*', help='columns to profile, all columns of the table by default')
+    profile_parser.add_argument('--approximate', action='store_true',
+                                help='estimate distinct counts and top values with sketches')
+    profile_parser.set_defaults(func=run_profile)
+
+    fleet_parser = subparsers.add_parser('fleet', help='profile or check many database shards concurrently')
+    fleet_parser.add_argument('action', choices=['init', 'check'],
+                              help='init merges the shard profiles into --dictionary, check checks every shard')
+    fleet_parser.add_argument('shards', nargs='+', help='shard databases, paths or quoted glob patterns')
+    fleet_parser.add_argument('--workers', type=int, help='shards processed in parallel (default: one per core)')
+    fleet_parser.add_argument('--fast', action='store_true', default=None, help='skip sample records')
+    fleet_parser.add_argument('--run-budget', type=float, help='time budget of each shard in seconds')
+    fleet_parser.add_argument('--query-budget', type=float, help='time budget of any single query in seconds')
+    fleet_parser.add_argument('--results', dest='results_file',
+                              help='structured results file with one record per check and shard '
+                                   '(default: DQ_Results_<timestamp>.jsonl)')
+    fleet_parser.set_defaults(func=run_fleet)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
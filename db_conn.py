@@ -1,17 +1,231 @@
 import sqlite3
-import pandas as pd
+import hashlib
+import os
+import queue
+import threading
+from contextlib import contextmanager
+from pathlib import Path
 import json
 #import env
 
 
+DB_NAME = 'sample_database.db'
+
+# Connection tuning, every setting can be overridden with an environment variable
+CONN_CONFIG = {
+    # Bytes of the database file that are memory-mapped, 0 disables mmap
+    'mmap_size': int(os.environ.get('DD_MMAP_SIZE', 256 * 1024 * 1024)),
+    # Page cache size, negative values are in KiB
+    'cache_size': int(os.environ.get('DD_CACHE_SIZE', -64 * 1024)),
+    # Keep temporary b-trees (DISTINCT, GROUP BY, ORDER BY) in memory
+    'temp_store': os.environ.get('DD_TEMP_STORE', 'MEMORY'),
+    # Number of read-only connections kept by a shared pool
+    'pool_size': int(os.environ.get('DD_POOL_SIZE', 4)),
+}
+
+# SQLite virtual machine instructions between two calls of the progress callbacks
+PROGRESS_HANDLER_STEPS = 10000
+
+# Functions called with every new connection from get_conn, e.g. to instrument it (see query_metrics.py)
+CONNECTION_HOOKS = []
+
+
+class Connection(sqlite3.Connection):
+    """
+    sqlite3 connection that shares its single progress handler between several callbacks,
+    so time budgets and instrumentation can watch the same query. The query is aborted
+    when any callback returns a true value.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.progress_callbacks = []
+
+    def add_progress_callback(self, callback):
+        self.progress_callbacks.append(callback)
+        if len(self.progress_callbacks) == 1:
+            # The handler holds the list, not the connection, so it does not keep the connection alive
+            callbacks = self.progress_callbacks
+
+            def progress():
+                abort = 0
+                for registered in tuple(callbacks):
+                    if registered():
+                        abort = 1
+                return abort
+            self.set_progress_handler(progress, PROGRESS_HANDLER_STEPS)
+
+    def remove_progress_callback(self, callback):
+        if callback in self.progress_callbacks:
+            self.progress_callbacks.remove(callback)
+        if not self.progress_callbacks:
+            self.set_progress_handler(None, PROGRESS_HANDLER_STEPS)
+
+
+# Function to add a progress callback to any connection, plain sqlite3 connections only keep one
+def add_progress_callback(conn, callback):
+    if isinstance(conn, Connection):
+        conn.add_progress_callback(callback)
+    else:
+        conn.set_progress_handler(callback, PROGRESS_HANDLER_STEPS)
+
+
+# Function to remove a progress callback added with add_progress_callback
+def remove_progress_callback(conn, callback):
+    if isinstance(conn, Connection):
+        conn.remove_progress_callback(callback)
+    else:
+        conn.set_progress_handler(None, PROGRESS_HANDLER_STEPS)
+
+
 # Connect to SQLite database, you will need to change this depending on what database you are connecting to
-def get_conn():
-    db_name = 'sample_database.db'
-    conn = sqlite3.connect(db_name)
+def get_conn(db_name=DB_NAME, read_only=False):
+    if read_only:
+        # Read-only connections are used by profiling and check workers and can be shared across threads
+        uri = Path(db_name).resolve().as_uri() + '?mode=ro'
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False, factory=Connection)
+    else:
+        conn = sqlite3.connect(db_name, factory=Connection)
+    conn.execute(f"PRAGMA mmap_size = {int(CONN_CONFIG['mmap_size'])};")
+    conn.execute(f"PRAGMA cache_size = {int(CONN_CONFIG['cache_size'])};")
+    conn.execute(f"PRAGMA temp_store = {CONN_CONFIG['temp_store']};")
+    if read_only:
+        conn.execute("PRAGMA query_only = ON;")
+    for hook in CONNECTION_HOOKS:
+        hook(conn)
     return conn
 
 
-# Function to fetch tables
+class ConnectionPool:
+    """Small pool of tuned read-only connections to one database, safe to share between threads."""
+
+    def __init__(self, db_name=DB_NAME, size=None):
+        self.db_name = db_name
+        self.size = size or CONN_CONFIG['pool_size']
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._opened < self.size:
+                self._opened += 1
+                return get_conn(self.db_name, read_only=True)
+        return self._idle.get()
+
+    def release(self, conn):
+        # Do not hand a connection with an open read transaction to the next user
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        with self._lock:
+            while True:
+                try:
+                    self._idle.get_nowait().close()
+                except queue.Empty:
+                    break
+            self._opened = 0
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+# Function to get the file of a connection's main database, None for in-memory and temporary databases
+def get_database_file(conn):
+    for _, name, file in conn.execute("PRAGMA database_list;"):
+        if name == 'main':
+            return file or None
+    return None
+
+
+# Function to get the shared connection pool of a database, grown to at least size connections
+def get_pool(db_name=DB_NAME, size=None):
+    key = str(Path(db_name).resolve())
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(db_name, size)
+        elif size and size > pool.size:
+            pool.size = size
+    return pool
+
+
+# Function to borrow a read-only connection from the shared pool
+@contextmanager
+def pooled_conn(db_name=DB_NAME):
+    with get_pool(db_name).connection() as conn:
+        yield conn
+
+
+# Function to close every shared pool
+def close_pools():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
+
+
+# Rows fetched per round trip by fetch_rows and fetch_columnar
+FETCH_CHUNK_ROWS = 1024
+
+
+# Function to stream the rows of a query in fetchmany chunks, memory stays bounded by the chunk size
+def fetch_rows(conn, query, params=(), chunk_size=FETCH_CHUNK_ROWS):
+    cursor = conn.execute(query, params)
+    try:
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        cursor.close()
+
+
+# Function to fetch a query result column by column, {column name: [values]} in result order
+def fetch_columnar(conn, query, params=(), chunk_size=FETCH_CHUNK_ROWS):
+    # Catalog and PRAGMA results are a few hundred rows, building a DataFrame costs more than the query
+    cursor = conn.execute(query, params)
+    columns = {description[0]: [] for description in cursor.description}
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        for column, values in zip(columns.values(), zip(*rows)):
+            column.extend(values)
+    cursor.close()
+    return columns
+
+
+# Function to keep the rows of a columnar result whose column value is in keep
+def filter_columnar(columns, column, keep):
+    keep = set(keep)
+    rows = [i for i, value in enumerate(columns[column]) if value in keep]
+    return {name: [values[i] for i in rows] for name, values in columns.items()}
+
+
+# Function to turn a columnar result into a pandas DataFrame, for callers that want one
+def to_dataframe(columns):
+    import pandas as pd
+    return pd.DataFrame(columns)
+
+
+# Function to fetch tables, returns {'table_name': [...], 'table_owner': [...]}
 def fetch_tables(conn):
     query = """
     SELECT
@@ -19,31 +233,91 @@ def fetch_tables(conn):
     FROM sqlite_master
     WHERE type = 'table' AND name NOT LIKE 'sqlite_%';
     """
-    tables_df = pd.read_sql_query(query, conn)
+    tables = fetch_columnar(conn, query)
     # Add a placeholder for table_owner
-    tables_df['table_owner'] = 'N/A'
-    return tables_df
+    tables['table_owner'] = ['N/A'] * len(tables['table_name'])
+    return tables
 
 
-# Function to fetch columns
+# Function to fetch columns, one entry per column of every table (see fetch_columnar)
 def fetch_columns(conn):
-    # Retrieve all table names
-    tables_df = fetch_tables(conn)
-    columns_list = []
-
-    for table_name in tables_df['table_name']:
-        # PRAGMA table_info returns information about each column in the table
-        pragma_query = f"PRAGMA table_info('{table_name}');"
-        pragma_df = pd.read_sql_query(pragma_query, conn)
-        for index, row in pragma_df.iterrows():
-            column_info = {
-                'table_name': table_name,
-                'column_name': row['name'],
-                'data_type': row['type'],
-                'is_nullable': 'NO' if row['notnull'] else 'YES',
-            }
-            columns_list.append(column_info)
-    columns_df = pd.DataFrame(columns_list)
-    return columns_df
-
-print(fetch_tables(get_conn()))
\ No newline at end of file
+    # Reads the columns of every table in one pass by joining sqlite_master with the
+    # pragma_table_info table-valued function instead of running PRAGMA table_info per table
+    query = """
+    SELECT
+        m.name AS table_name,
+        p.name AS column_name,
+        p.type AS data_type,
+        CASE WHEN p."notnull" THEN 'NO' ELSE 'YES' END AS is_nullable,
+        p.pk AS primary_key,
+        p.dflt_value AS default_value,
+        (SELECT fk."table" FROM pragma_foreign_key_list(m.name) AS fk
+         WHERE fk."from" = p.name ORDER BY fk.id, fk.seq LIMIT 1) AS foreign_table,
+        (SELECT fk."to" FROM pragma_foreign_key_list(m.name) AS fk
+         WHERE fk."from" = p.name ORDER BY fk.id, fk.seq LIMIT 1) AS foreign_column,
+        (SELECT fk.id FROM pragma_foreign_key_list(m.name) AS fk
+         WHERE fk."from" = p.name ORDER BY fk.id, fk.seq LIMIT 1) AS foreign_key_id
+    FROM sqlite_master AS m
+    JOIN pragma_table_info(m.name) AS p
+    WHERE m.type = 'table' AND m.name NOT LIKE 'sqlite_%'
+    ORDER BY m.rowid, p.cid;
+    """
+    columns = fetch_columnar(conn, query)
+    # A composite foreign key is matched on all of its columns, every column of one gets the child and
+    # parent column lists of the whole key (None for single-column keys)
+    keys = {}
+    for table, key_id, child_column, parent_column in conn.execute("""
+        SELECT m.name, fk.id, fk."from", fk."to"
+        FROM sqlite_master AS m
+        JOIN pragma_foreign_key_list(m.name) AS fk
+        WHERE m.type = 'table' AND m.name NOT LIKE 'sqlite_%'
+        ORDER BY m.name, fk.id, fk.seq;
+    """):
+        keys.setdefault((table, key_id), []).append((child_column, parent_column))
+    composite_keys = [
+        keys.get((table, key_id)) if key_id is not None and len(keys.get((table, key_id), ())) > 1 else None
+        for table, key_id in zip(columns['table_name'], columns.pop('foreign_key_id'))
+    ]
+    columns['foreign_key_columns'] = [key and [child for child, _ in key] for key in composite_keys]
+    columns['foreign_key_parent_columns'] = [key and [parent for _, parent in key] for key in composite_keys]
+    return columns
+
+
+# Function to fetch indexes, one entry per key column of every index (see fetch_columnar)
+def fetch_indexes(conn):
+    # One row per key column of every index, read through the pragma_index_list and
+    # pragma_index_xinfo table-valued functions; origin is 'c' (CREATE INDEX), 'u' (UNIQUE)
+    # or 'pk' (PRIMARY KEY), position 0 is the leading column
+    query = """
+    SELECT
+        m.name AS table_name,
+        il.name AS index_name,
+        il."unique" AS is_unique,
+        il.origin AS origin,
+        il.partial AS partial,
+        ix.seqno AS position,
+        ix.name AS column_name,
+        ix.coll AS collation
+    FROM sqlite_master AS m
+    JOIN pragma_index_list(m.name) AS il
+    JOIN pragma_index_xinfo(il.name) AS ix
+    WHERE m.type = 'table' AND m.name NOT LIKE 'sqlite_%' AND ix.key = 1
+    ORDER BY m.rowid, il.seq, ix.seqno;
+    """
+    return fetch_columnar(conn, query)
+
+
+# Function to fetch a fingerprint of the schema, one hash per table from its CREATE statement
+def fetch_schema_fingerprint(conn):
+    # sqlite_master keeps the current CREATE statement, ALTER TABLE rewrites it as well
+    rows = conn.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%';"
+    ).fetchall()
+    return {
+        'schema_version': conn.execute('PRAGMA schema_version;').fetchone()[0],
+        'tables': {name: hashlib.sha1((sql or '').encode('utf-8')).hexdigest() for name, sql in rows},
+    }
+
+
+if __name__ == '__main__':
+    print(to_dataframe(fetch_tables(get_conn())))
@@ -0,0 +1,279 @@
+"""
+Compact typed in-memory model of the data dictionary.
+
+DataDictionary -> Table -> Column replaces the nested dicts-of-dicts the scripts used to pass
+around. Every class uses __slots__, table/column names and data types are interned, and the
+DataDictionary keeps a table -> columns index so dd.column(table, column) is a direct lookup
+instead of dd.get(table, {}).get('columns', {}).get(column, {}).
+
+The JSON layout stays the source of truth:
+    DataDictionary.from_dict(json.load(f)).to_dict() == original dict
+
+Metadata keys the model has no attribute for (user-added rules, profiling estimates) are kept
+in a per-object 'extra' dict, so conversion is lossless. Known keys are written in a fixed
+order, followed by the extra keys in the order they were added.
+
+Table and Column also behave like the dicts they replace (get, [], in, update, pop, items), so
+code written against the JSON layout keeps working while it moves to attribute access.
+
+Dependencies:
+------------
+- sys
+"""
+
+# Import Libraries
+import sys
+
+_MISSING = object()
+
+COLUMN_FIELDS = ('description', 'data_type', 'type', 'duplicates_allowed', 'null_values_allowed',
+                 'min_value', 'max_value', 'allowable_values', 'unique_count', 'zero_allowed', 'foreign_key')
+_COLUMN_FIELD_SET = frozenset(COLUMN_FIELDS)
+
+TABLE_FIELDS = ('description', 'table_owner')
+_TABLE_FIELD_SET = frozenset(TABLE_FIELDS)
+
+
+# Function to intern strings that repeat across the dictionary (names, data types)
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+class _Metadata:
+    """Dict-like access over the __slots__ fields and the extra dict of a model object."""
+
+    __slots__ = ()
+    _fields = ()
+    _field_set = frozenset()
+
+    def get(self, key, default=None):
+        if key in self._field_set:
+            value = getattr(self, key)
+            return default if value is _MISSING else value
+        if self.extra is not None:
+            return self.extra.get(key, default)
+        return default
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        if key in self._field_set:
+            setattr(self, key, value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self.pop(key)
+
+    def pop(self, key, default=_MISSING):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            if default is _MISSING:
+                raise KeyError(key)
+            return default
+        if key in self._field_set:
+            setattr(self, key, _MISSING)
+        else:
+            del self.extra[key]
+        return value
+
+    def update(self, other=(), **kwargs):
+        items = other.items() if hasattr(other, 'items') else other
+        for key, value in items:
+            self[key] = value
+        for key, value in kwargs.items():
+            self[key] = value
+
+    def keys(self):
+        return [key for key, _ in self.items()]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __eq__(self, other):
+        if isinstance(other, (_Metadata, dict)):
+            return self.to_dict() == (other.to_dict() if isinstance(other, _Metadata) else other)
+        return NotImplemented
+
+
+class Column(_Metadata):
+    """Metadata and rules of one column."""
+
+    __slots__ = ('name',) + COLUMN_FIELDS + ('extra',)
+    _fields = COLUMN_FIELDS
+    _field_set = _COLUMN_FIELD_SET
+
+    def __init__(self, name, **metadata):
+        self.name = _intern(name)
+        for field in COLUMN_FIELDS:
+            setattr(self, field, _MISSING)
+        self.extra = None
+        self.update(metadata)
+
+    def __setitem__(self, key, value):
+        if key == 'data_type':
+            value = _intern(value)
+        _Metadata.__setitem__(self, key, value)
+
+    def items(self):
+        items = [(field, getattr(self, field)) for field in COLUMN_FIELDS if getattr(self, field) is not _MISSING]
+        if self.extra:
+            items.extend(self.extra.items())
+        return items
+
+    def to_dict(self):
+        return dict(self.items())
+
+    @classmethod
+    def from_dict(cls, name, metadata):
+        if isinstance(metadata, Column):
+            return metadata
+        return cls(name, **metadata)
+
+    def __repr__(self):
+        return f"Column({self.name!r}, data_type={self.get('data_type')!r})"
+
+
+class Table(_Metadata):
+    """Metadata of one table and the index of its columns."""
+
+    __slots__ = ('name',) + TABLE_FIELDS + ('columns', 'extra')
+    _fields = TABLE_FIELDS
+    _field_set = _TABLE_FIELD_SET
+
+    def __init__(self, name, columns=None, **metadata):
+        self.name = _intern(name)
+        for field in TABLE_FIELDS:
+            setattr(self, field, _MISSING)
+        self.extra = None
+        self.columns = {}
+        self.update(metadata)
+        if columns:
+            self.set_columns(columns)
+
+    def set_columns(self, columns):
+        self.columns = {_intern(name): Column.from_dict(name, metadata) for name, metadata in columns.items()}
+
+    def column(self, name):
+        return self.columns.get(name)
+
+    def get(self, key, default=None):
+        if key == 'columns':
+            return self.columns
+        return _Metadata.get(self, key, default)
+
+    def __setitem__(self, key, value):
+        if key == 'columns':
+            self.set_columns(value)
+        else:
+            _Metadata.__setitem__(self, key, value)
+
+    def items(self):
+        items = [(field, getattr(self, field)) for field in TABLE_FIELDS if getattr(self, field) is not _MISSING]
+        if self.extra:
+            items.extend(self.extra.items())
+        items.append(('columns', self.columns))
+        return items
+
+    def to_dict(self):
+        table_dict = {key: value for key, value in self.items() if key != 'columns'}
+        table_dict['columns'] = {name: column.to_dict() for name, column in self.columns.items()}
+        return table_dict
+
+    @classmethod
+    def from_dict(cls, name, metadata):
+        if isinstance(metadata, Table):
+            return metadata
+        metadata = dict(metadata)
+        columns = metadata.pop('columns', {})
+        return cls(name, columns, **metadata)
+
+    def __repr__(self):
+        return f"Table({self.name!r}, {len(self.columns)} columns)"
+
+
+class DataDictionary:
+    """The whole data dictionary, indexed by table and column name."""
+
+    __slots__ = ('tables',)
+
+    def __init__(self, tables=None):
+        self.tables = {}
+        for name, table in (tables or {}).items():
+            self[name] = table
+
+    @classmethod
+    def from_dict(cls, dd):
+        if isinstance(dd, DataDictionary):
+            return dd
+        return cls(dd)
+
+    def to_dict(self):
+        return {name: table.to_dict() for name, table in self.tables.items()}
+
+    def table(self, name):
+        return self.tables.get(name)
+
+    def column(self, table, column):
+        table_data = self.tables.get(table)
+        if table_data is None:
+            return None
+        return table_data.columns.get(column)
+
+    # Function to get the table -> column names index used to drive profiling
+    def columns_by_table(self):
+        return {name: list(table.columns) for name, table in self.tables.items()}
+
+    def __getitem__(self, name):
+        return self.tables[name]
+
+    def __setitem__(self, name, table):
+        self.tables[_intern(name)] = Table.from_dict(name, table)
+
+    def __delitem__(self, name):
+        del self.tables[name]
+
+    def __contains__(self, name):
+        return name in self.tables
+
+    def __iter__(self):
+        return iter(self.tables)
+
+    def __len__(self):
+        return len(self.tables)
+
+    def get(self, name, default=None):
+        return self.tables.get(name, default)
+
+    def keys(self):
+        return self.tables.keys()
+
+    def items(self):
+        return self.tables.items()
+
+    def values(self):
+        return self.tables.values()
+
+    def __eq__(self, other):
+        if isinstance(other, DataDictionary):
+            return self.to_dict() == other.to_dict()
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    def __repr__(self):
+        return f"DataDictionary({len(self.tables)} tables)"
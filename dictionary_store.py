@@ -0,0 +1,270 @@
+"""
+Pluggable storage backends for the data dictionary.
+
+The data dictionary layout is the same for every backend:
+    {table: {'description', 'table_owner', ..., 'columns': {column: {metadata}}}}
+
+JSONDictionaryStore
+    The original single data_dictionary.json file. Partial reads and saves are supported
+    but still parse/rewrite the whole file; writes go through a temp file and os.replace
+    so a crash never leaves a truncated dictionary behind. A store instance keeps the
+    parsed file until it changes on disk, so table_names/load/save parse it only once.
+
+SQLiteDictionaryStore
+    A SQLite sidecar database with one row per table and one row per column. Loading a
+    few tables only reads their rows, per-column upserts touch a single row and every save
+    is one atomic transaction.
+
+open_dictionary_store(path)
+    Picks the backend from the file extension (.db/.sqlite/.sqlite3 -> SQLite, else JSON).
+
+copy_dictionary(source_path, target_path)
+    Imports/exports between backends, e.g. data_dictionary.json <-> data_dictionary.db.
+
+Usage:
+    python dictionary_store.py data_dictionary.json data_dictionary.db   # import JSON
+    python dictionary_store.py data_dictionary.db data_dictionary.json   # export JSON
+
+Dependencies:
+------------
+- sqlite3
+- json
+"""
+
+# Import Libraries
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+
+SQLITE_EXTENSIONS = ('.db', '.sqlite', '.sqlite3')
+
+
+# JSON encoder for dates and timestamps in the data dictionary
+class DictionaryJSONEncoder(json.JSONEncoder):
+    def default(self, obj):
+        if hasattr(obj, 'isoformat'):
+            return obj.isoformat()
+        return super().default(obj)
+
+
+class JSONDictionaryStore:
+    """Data dictionary stored as one JSON file."""
+
+    def __init__(self, path, encoder=DictionaryJSONEncoder):
+        self.path = path
+        self.encoder = encoder
+        self._document = None
+        self._signature = None
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def _file_signature(self):
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def _read(self):
+        # Reuse the last parsed file while it is unchanged on disk
+        signature = self._file_signature()
+        if self._document is None or signature != self._signature:
+            with open(self.path, 'r') as f:
+                self._document = json.load(f)
+            self._signature = signature
+        return self._document
+
+    def table_names(self):
+        if not self.exists():
+            return []
+        return list(self._read().keys())
+
+    def load(self, tables=None):
+        if not self.exists():
+            return {}
+        dd = self._read()
+        if tables is None:
+            return dict(dd)
+        return {table: dd[table] for table in dd if table in tables}
+
+    def save(self, dd, tables=None):
+        if tables is not None and self.exists():
+            # Only the given tables change, tables missing from dd are removed
+            saved = self._read()
+            for table in tables:
+                if table in dd:
+                    saved[table] = dd[table]
+                else:
+                    saved.pop(table, None)
+            dd = saved
+        # The next read parses what was written, dd may still hold unencoded values
+        self._document = None
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(dd, f, cls=self.encoder, indent=4)
+            if self.exists():
+                shutil.copymode(self.path, tmp_path)
+            else:
+                os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def upsert_column(self, table, column, metadata):
+        self.save({table: self._with_column(table, column, metadata)}, tables=[table])
+
+    def _with_column(self, table, column, metadata):
+        table_data = self.load(tables=[table]).get(table, {'description': '', 'table_owner': 'N/A', 'columns': {}})
+        table_data['columns'][column] = metadata
+        return table_data
+
+
+class SQLiteDictionaryStore:
+    """Data dictionary stored in a SQLite sidecar database, one row per table and per column."""
+
+    def __init__(self, path, encoder=DictionaryJSONEncoder):
+        self.path = path
+        self.encoder = encoder
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS dd_tables (
+                table_name TEXT PRIMARY KEY,
+                position INTEGER NOT NULL,
+                metadata TEXT NOT NULL
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS dd_columns (
+                table_name TEXT NOT NULL,
+                column_name TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                metadata TEXT NOT NULL,
+                PRIMARY KEY (table_name, column_name)
+            ) WITHOUT ROWID
+        """)
+        return conn
+
+    def _dumps(self, metadata):
+        return json.dumps(metadata, cls=self.encoder)
+
+    def table_names(self):
+        if not self.exists():
+            return []
+        conn = self._connect()
+        try:
+            return [row[0] for row in conn.execute("SELECT table_name FROM dd_tables ORDER BY position")]
+        finally:
+            conn.close()
+
+    def load(self, tables=None):
+        # Like the JSON store a missing dictionary is empty, connecting would create the file
+        if not self.exists():
+            return {}
+        conn = self._connect()
+        try:
+            table_filter, params = '', []
+            if tables is not None:
+                tables = list(tables)
+                table_filter = f"WHERE table_name IN ({', '.join('?' for _ in tables)})"
+                params = tables
+            dd = {}
+            for table, metadata in conn.execute(
+                    f"SELECT table_name, metadata FROM dd_tables {table_filter} ORDER BY position", params):
+                dd[table] = json.loads(metadata)
+                dd[table]['columns'] = {}
+            for table, column, metadata in conn.execute(
+                    f"SELECT table_name, column_name, metadata FROM dd_columns {table_filter} "
+                    f"ORDER BY table_name, position", params):
+                if table in dd:
+                    dd[table]['columns'][column] = json.loads(metadata)
+            return dd
+        finally:
+            conn.close()
+
+    def _write_table(self, conn, table, table_data, position):
+        table_metadata = {key: value for key, value in table_data.items() if key != 'columns'}
+        conn.execute("INSERT OR REPLACE INTO dd_tables VALUES (?, ?, ?)",
+                     (table, position, self._dumps(table_metadata)))
+        conn.execute("DELETE FROM dd_columns WHERE table_name = ?", (table,))
+        conn.executemany("INSERT INTO dd_columns VALUES (?, ?, ?, ?)", [
+            (table, column, i, self._dumps(metadata))
+            for i, (column, metadata) in enumerate(table_data.get('columns', {}).items())
+        ])
+
+    def _table_position(self, conn, table):
+        row = conn.execute("SELECT position FROM dd_tables WHERE table_name = ?", (table,)).fetchone()
+        if row is not None:
+            return row[0]
+        return conn.execute("SELECT COALESCE(MAX(position) + 1, 0) FROM dd_tables").fetchone()[0]
+
+    def save(self, dd, tables=None):
+        conn = self._connect()
+        try:
+            # One transaction per save, readers see the old or the new dictionary, never a mix
+            with conn:
+                if tables is None:
+                    conn.execute("DELETE FROM dd_tables")
+                    conn.execute("DELETE FROM dd_columns")
+                    for position, (table, table_data) in enumerate(dd.items()):
+                        self._write_table(conn, table, table_data, position)
+                else:
+                    for table in tables:
+                        if table in dd:
+                            self._write_table(conn, table, dd[table], self._table_position(conn, table))
+                        else:
+                            conn.execute("DELETE FROM dd_tables WHERE table_name = ?", (table,))
+                            conn.execute("DELETE FROM dd_columns WHERE table_name = ?", (table,))
+        finally:
+            conn.close()
+
+    def upsert_column(self, table, column, metadata):
+        conn = self._connect()
+        try:
+            with conn:
+                if conn.execute("SELECT 1 FROM dd_tables WHERE table_name = ?", (table,)).fetchone() is None:
+                    conn.execute("INSERT INTO dd_tables VALUES (?, ?, ?)", (
+                        table, self._table_position(conn, table),
+                        self._dumps({'description': '', 'table_owner': 'N/A'})))
+                position = conn.execute(
+                    "SELECT position FROM dd_columns WHERE table_name = ? AND column_name = ?", (table, column)
+                ).fetchone()
+                if position is None:
+                    position = conn.execute(
+                        "SELECT COALESCE(MAX(position) + 1, 0) FROM dd_columns WHERE table_name = ?", (table,)
+                    ).fetchone()
+                conn.execute("INSERT OR REPLACE INTO dd_columns VALUES (?, ?, ?, ?)",
+                             (table, column, position[0], self._dumps(metadata)))
+        finally:
+            conn.close()
+
+
+# Function to open the dictionary store matching the file extension
+def open_dictionary_store(path, encoder=DictionaryJSONEncoder):
+    if os.path.splitext(path)[1].lower() in SQLITE_EXTENSIONS:
+        return SQLiteDictionaryStore(path, encoder)
+    return JSONDictionaryStore(path, encoder)
+
+
+# Function to copy a data dictionary between stores, used for JSON import/export
+def copy_dictionary(source_path, target_path):
+    dd = open_dictionary_store(source_path).load()
+    open_dictionary_store(target_path).save(dd)
+    return dd
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Copy a data dictionary between the JSON and SQLite stores.')
+    parser.add_argument('source')
+    parser.add_argument('target')
+    args = parser.parse_args()
+    dd = copy_dictionary(args.source, args.target)
+    print(f"Copied {len(dd)} tables from {args.source} to {args.target}.")
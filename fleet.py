@@ -0,0 +1,353 @@
+"""
+Fleet mode: profile and check many SQLite shards that share one schema.
+
+Every shard is handled by its own worker process (one read-only connection each), so the
+work spreads over the available cores instead of the scripts being looped once per shard.
+
+resolve_shards(patterns)
+    Expands a list of paths and glob patterns into the sorted list of shard files.
+
+profile_shard(db_name, columns)
+    Profiles the columns of one shard into mergeable partial profiles: MIN/MAX, null and
+    row counts, a HyperLogLog of the distinct values, a KLL sketch (numeric columns) or a
+    Misra-Gries top values sketch (categorical columns) and the distinct values of small
+    categorical columns. Sketches are returned serialized so they cross the process boundary.
+
+merge_column_profiles(partials, data_type)
+    Combines the partial profiles of one column across shards: min/max combined, null and
+    row counts summed, distinct sketches unioned, quantile and top values sketches merged.
+    Returns the same metadata keys a single database profile has (unique_count is the
+    estimate of the unioned sketch, with unique_count_error), plus null_count, row_count and
+    shards.
+
+fleet_init(shards, json_file, workers)
+    Builds the data dictionary from the schema of the first shard and profiles every shard,
+    merging the per-shard profiles into one dictionary (datadict.py fleet init).
+
+fleet_check(shards, dictionary_file, workers, ...)
+    Runs the data quality checks of one dictionary on every shard. Each result carries its
+    shard, so the report and the results file (see result_sinks.py) list the violations per
+    shard (datadict.py fleet check).
+
+Shards are merged and reported in the order of resolve_shards, so the dictionary and the
+report do not depend on which worker finished first. Query metrics are not collected in
+fleet mode, the workers run in separate processes.
+
+Dependencies:
+------------
+- concurrent.futures
+- glob
+- db_conn
+- init_data_dictionary
+- data_quality_checks
+- sketches
+"""
+
+# Import Libraries
+import glob
+import logging
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from db_conn import get_conn, fetch_columns, fetch_indexes, fetch_schema_fingerprint, fetch_tables
+from data_quality_checks import RESULTS_FILE, SAMPLE_SIZE, ReportLogSink, TimeBudget, compile_check_plan, run_checks
+from dd_model import DataDictionary
+from dictionary_store import open_dictionary_store
+from init_data_dictionary import (ALLOWABLE_VALUES_MAX, ALLOWABLE_VALUES_RATIO, CONTINUOUS_TYPES,
+                                  DISTRIBUTION_TYPES, PROFILE_DISTRIBUTIONS, PROFILE_ESTIMATE_KEYS, TOP_VALUES_K,
+                                  build_data_dictionary_from_schema, get_all_tables_and_columns,
+                                  save_data_dictionary, summarize_distribution, to_json_value)
+from result_sinks import ResultSink, open_results_sink
+from sketches import HyperLogLog, KLLSketch, MisraGries, register_sketch_functions
+
+logger = logging.getLogger(__name__)
+
+# Shards processed at the same time, None uses one worker per core
+FLEET_WORKERS = None
+
+# Table of the error result of a shard that could not be checked at all
+SHARD_ERROR_TABLE = '<shard>'
+
+
+# Function to expand paths and glob patterns into the sorted list of shard files
+def resolve_shards(patterns):
+    shards = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        for path in matches:
+            if path not in shards:
+                shards.append(path)
+    missing = [path for path in shards if not os.path.isfile(path)]
+    if missing:
+        raise ValueError(f"Shards not found: {missing}")
+    if not shards:
+        raise ValueError(f"No shards match {list(patterns)}")
+    return shards
+
+
+# Function to get the number of worker processes for a number of shards
+def get_fleet_workers(shard_count, workers=FLEET_WORKERS):
+    return max(1, min(shard_count, workers or os.cpu_count() or 1))
+
+
+# Function to order values the way SQLite does across storage classes: NULL, numbers, text, blobs
+def sqlite_sort_key(value):
+    if isinstance(value, (int, float)):
+        return (1, value)
+    if isinstance(value, str):
+        return (2, value)
+    return (3, value)
+
+
+# Function to profile one column of a shard into a partial profile that can be merged with other shards
+def profile_shard_column(table, column_name, data_type, conn, key_column=False):
+    # Primary key columns get no distribution, like profile_column
+    data_type = data_type.lower()
+    partial = {'type': 'continuous' if data_type in CONTINUOUS_TYPES else 'categorical'}
+    if partial['type'] == 'continuous':
+        distribution = PROFILE_DISTRIBUTIONS and data_type in DISTRIBUTION_TYPES and not key_column
+        quantile_sketch = f", KLL_SKETCH({column_name}) AS quantile_sketch" if distribution else ''
+        query = f"""
+        SELECT
+            COUNT(*) - COUNT({column_name}) AS null_count,
+            COUNT({column_name}) AS row_count,
+            HLL_SKETCH({column_name}) AS unique_sketch,
+            MIN({column_name}) AS min_val,
+            MAX({column_name}) AS max_val{quantile_sketch}
+        FROM {table}
+        """
+        result = conn.execute(query).fetchone()
+        partial.update(min_value=result[3], max_value=result[4])
+        if distribution:
+            partial['quantile_sketch'] = result[5]
+    else:
+        query = f"""
+        SELECT
+            COUNT(*) - COUNT({column_name}) AS null_count,
+            COUNT({column_name}) AS row_count,
+            HLL_SKETCH({column_name}) AS unique_sketch,
+            TOPK_SKETCH({column_name}) AS top_sketch
+        FROM {table}
+        """
+        result = conn.execute(query).fetchone()
+        partial['top_sketch'] = result[3]
+        # The fleet-wide set is only known after the merge, every shard sends up to the limit
+        values = conn.execute(
+            f"SELECT DISTINCT {column_name} FROM {table} LIMIT {ALLOWABLE_VALUES_MAX + 1}"
+        ).fetchall()
+        partial['values'] = [to_json_value(row[0]) for row in values] if len(values) <= ALLOWABLE_VALUES_MAX else None
+    partial.update(null_count=result[0], row_count=result[1], unique_sketch=result[2])
+    return partial
+
+
+# Function to profile the columns of one shard, {table: [(column, data_type)]} -> partial profiles
+def profile_shard(db_name, columns):
+    """
+    Runs in a worker process. Returns {'shard', 'schema', 'tables': {table: {column: partial}},
+    'errors'}; columns the shard does not have are left out and reported in errors.
+    """
+    conn = get_conn(db_name, read_only=True)
+    try:
+        register_sketch_functions(conn)
+        shard_columns = fetch_columns(conn)
+        present = set(zip(shard_columns['table_name'], shard_columns['column_name']))
+        key_columns = {(table, column) for table, column, primary_key in zip(
+            shard_columns['table_name'], shard_columns['column_name'], shard_columns['primary_key']) if primary_key}
+        profiles = {}
+        errors = []
+        for table, table_columns in columns.items():
+            for column_name, data_type in table_columns:
+                if (table, column_name) not in present:
+                    errors.append(f"{table}.{column_name} is missing")
+                    continue
+                try:
+                    partial = profile_shard_column(table, column_name, data_type, conn,
+                                                   key_column=(table, column_name) in key_columns)
+                except sqlite3.Error as e:
+                    errors.append(f"Error processing {table}.{column_name}: {e}")
+                    continue
+                profiles.setdefault(table, {})[column_name] = partial
+        return {'shard': db_name, 'schema': fetch_schema_fingerprint(conn)['tables'],
+                'tables': profiles, 'errors': errors}
+    finally:
+        conn.close()
+
+
+# Function to merge the partial profiles of one column across shards into its data dictionary metadata
+def merge_column_profiles(partials, data_type):
+    data_type = data_type.lower()
+    updates = {'type': partials[0]['type']}
+    unique_sketch = HyperLogLog()
+    for partial in partials:
+        unique_sketch.merge(HyperLogLog.from_bytes(partial['unique_sketch']))
+    row_count = sum(partial['row_count'] for partial in partials)
+    if updates['type'] == 'continuous':
+        values = [partial[key] for partial in partials for key in ('min_value', 'max_value')
+                  if partial[key] is not None]
+        min_val = min(values, key=sqlite_sort_key) if values else None
+        max_val = max(values, key=sqlite_sort_key) if values else None
+        updates['min_value'] = min_val
+        updates['max_value'] = max_val
+        updates['unique_count'] = unique_sketch.count()
+        updates['unique_count_error'] = round(unique_sketch.error, 4)
+        updates['zero_allowed'] = (min_val == 0 or max_val == 0)
+        quantile_sketches = [partial['quantile_sketch'] for partial in partials if partial.get('quantile_sketch')]
+        if quantile_sketches:
+            sketch = KLLSketch.from_bytes(quantile_sketches[0])
+            for data in quantile_sketches[1:]:
+                sketch.merge(KLLSketch.from_bytes(data))
+            if sketch.count():
+                updates.update(summarize_distribution(sketch, min_val, max_val))
+    else:
+        unique_count = unique_sketch.count()
+        # Same rule as a single database profile, applied to the fleet-wide counts
+        value_sets = [partial['values'] for partial in partials]
+        if None not in value_sets and unique_count <= ALLOWABLE_VALUES_MAX and (
+                unique_count < 20 or unique_count <= ALLOWABLE_VALUES_RATIO * row_count):
+            # Union in shard order, values keep the order they were first seen in
+            updates['allowable_values'] = list(dict.fromkeys(value for values in value_sets for value in values))
+        updates['unique_count'] = unique_count
+        updates['unique_count_error'] = round(unique_sketch.error, 4)
+        top_sketch = MisraGries.from_bytes(partials[0]['top_sketch'])
+        for partial in partials[1:]:
+            top_sketch.merge(MisraGries.from_bytes(partial['top_sketch']))
+        updates['top_values'] = [[value, count] for value, count in top_sketch.top(TOP_VALUES_K)]
+        updates['top_values_rows'] = row_count
+        updates['top_values_error'] = top_sketch.error
+    updates['null_count'] = sum(partial['null_count'] for partial in partials)
+    updates['row_count'] = row_count
+    updates['shards'] = len(partials)
+    return updates
+
+
+# Function to build and profile one data dictionary for a fleet of shards
+def fleet_init(shards, json_file='data_dictionary.json', workers=FLEET_WORKERS):
+    shards = resolve_shards(shards)
+    # The dictionary follows the schema of the first shard, the others are expected to share it
+    conn = get_conn(shards[0], read_only=True)
+    try:
+        data_dictionary = build_data_dictionary_from_schema(fetch_tables(conn), fetch_columns(conn))
+    finally:
+        conn.close()
+    columns = {
+        table: [(column, data_dictionary[table]['columns'][column]['data_type']) for column in table_columns]
+        for table, table_columns in get_all_tables_and_columns(data_dictionary).items()
+    }
+
+    workers = get_fleet_workers(len(shards), workers)
+    print(f"Profiling {len(shards)} shards with {workers} workers")
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        shard_profiles = list(executor.map(profile_shard, shards, [columns] * len(shards)))
+
+    reference_schema = shard_profiles[0]['schema']
+    for shard_profile in shard_profiles:
+        if shard_profile['schema'] != reference_schema:
+            print(f"Shard {shard_profile['shard']} has a different schema than {shards[0]}")
+        for error in shard_profile['errors']:
+            print(f"Shard {shard_profile['shard']}: {error}")
+
+    # Merged in shard order, so the dictionary does not depend on which worker finished first
+    for table, table_columns in columns.items():
+        for column_name, data_type in table_columns:
+            partials = [shard_profile['tables'][table][column_name] for shard_profile in shard_profiles
+                        if column_name in shard_profile['tables'].get(table, {})]
+            if not partials:
+                continue
+            column_data = data_dictionary[table]['columns'][column_name]
+            for key in PROFILE_ESTIMATE_KEYS:
+                column_data.pop(key, None)
+            column_data.update(merge_column_profiles(partials, data_type))
+    save_data_dictionary(data_dictionary, json_file)
+    return data_dictionary
+
+
+class ShardResultsSink(ResultSink):
+    """Keeps the results of a worker's shard with their durations and key columns for the parent process."""
+
+    def __init__(self, shard):
+        super().__init__()
+        self.shard = shard
+        self.entries = []
+
+    def write_result(self, result, duration_seconds=None, key_columns=None):
+        result['shard'] = self.shard
+        self.entries.append((result, duration_seconds, key_columns))
+
+
+# Function to run the checks of a data dictionary on one shard, returns (result, duration, key columns) entries
+def check_shard(db_name, data_dictionary, sample_size=SAMPLE_SIZE, run_budget=None, query_budget=None):
+    # Runs in a worker process, the plan is compiled against the shard's own catalog
+    budget = None
+    if run_budget is not None or query_budget is not None:
+        budget = TimeBudget(run_budget, query_budget)
+    shard_results = ShardResultsSink(db_name)
+    conn = None
+    try:
+        # Opening is inside the try, a file that is not a database is reported like any other shard error
+        conn = get_conn(db_name, read_only=True)
+        plan = compile_check_plan(data_dictionary, fetch_columns(conn), fetch_indexes(conn))
+        run_checks(conn, data_dictionary, plan=plan, sample_size=sample_size, budget=budget,
+                   sinks=[shard_results], keep_results=False)
+    except sqlite3.Error as e:
+        shard_results.write_result({
+            'table': SHARD_ERROR_TABLE, 'column': None, 'rule': 'error', 'passed': False,
+            'observed': None, 'expected': None, 'message': f"Shard {db_name} could not be checked: {e}",
+            'samples': [],
+        })
+    finally:
+        if conn is not None:
+            conn.close()
+    return shard_results.entries
+
+
+# Function to check every shard of a fleet against one data dictionary
+def fleet_check(shards, dictionary_file='data_dictionary.json', workers=FLEET_WORKERS, fast=False,
+                run_budget=None, query_budget=None, results_file=RESULTS_FILE):
+    """
+    Checks the shards on a pool of worker processes and streams their results, shard by
+    shard in the order of resolve_shards, to the DQ_Report log and the results file.
+    run_budget/query_budget apply to every shard. Returns {shard: {'failed', 'skipped'}}.
+    """
+    shards = resolve_shards(shards)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    log_filename = f'DQ_Report_{timestamp}.log'
+    logging.basicConfig(
+        filename=log_filename,
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+    data_dictionary = DataDictionary.from_dict(open_dictionary_store(dictionary_file).load()).to_dict()
+    sample_size = 0 if fast else SAMPLE_SIZE
+
+    report = ReportLogSink()
+    sinks = [report]
+    if results_file:
+        results_file = results_file.format(timestamp=timestamp)
+        sinks.append(open_results_sink(results_file, run_id=timestamp))
+    workers = get_fleet_workers(len(shards), workers)
+    print(f"Checking {len(shards)} shards with {workers} workers")
+    summary = {}
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            shard_runs = executor.map(check_shard, shards, [data_dictionary] * len(shards),
+                                      [sample_size] * len(shards), [run_budget] * len(shards),
+                                      [query_budget] * len(shards))
+            for shard, entries in zip(shards, shard_runs):
+                failed, skipped = report.failed, report.skipped
+                for sink in sinks:
+                    for result, duration, key_columns in entries:
+                        sink.write_result(result, duration, key_columns)
+                    sink.flush()
+                summary[shard] = {'failed': report.failed - failed, 'skipped': report.skipped - skipped}
+    finally:
+        for sink in sinks:
+            sink.close()
+
+    for shard, counts in summary.items():
+        print(f"{shard}: {counts['failed']} failed, {counts['skipped']} skipped checks")
+        logger.info(f"Shard {shard}: {counts['failed']} failed, {counts['skipped']} skipped checks")
+    if results_file:
+        logger.info(f"Check results written to {results_file}")
+    logger.info("Fleet data quality check completed")
+    return summary
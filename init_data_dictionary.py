@@ -9,34 +9,64 @@ Main Functions:
 --------------
 fetch_tables()
     Retrieves all table names from the SQLite database, excluding system tables.
-    Returns: DataFrame with table names and placeholder owners.
+    Returns: Columnar dict (column name -> list of values, see db_conn.fetch_columnar) with
+    table names and placeholder owners. db_conn.to_dataframe turns it into a DataFrame.
 
 fetch_columns()
-    Retrieves column information for all tables in the database.
-    Returns: DataFrame with column details including name, type, and nullable status.
+    Retrieves column information for all tables in the database in a single catalog query.
+    Returns: Columnar dict with column details including name, type, nullable status, primary key,
+    default value and foreign key (all columns of a composite key).
 
-get_column_stats(table_name: str, column_name: str)
+get_column_stats(table_name: str, column_name: str, conn, approximate: bool=False, distribution: bool=False)
     Calculates basic statistics for a specific column.
-    Returns: Tuple of (min_value, max_value, unique_count).
+    With approximate=True the unique count is a HyperLogLog estimate.
+    Returns: Tuple of (min_value, max_value, unique_count), plus a KLLSketch of the column
+    when distribution=True (built in the same scan).
 
-save_data_dictionary(dd: dict, json_file: str='data_dictionary.json')
-    Saves the data dictionary to a JSON file with custom datetime handling.
+save_data_dictionary(dd: dict, json_file: str='data_dictionary.json', tables: list=None, store=None)
+    Saves the data dictionary to a JSON file with custom datetime handling, or to the SQLite
+    dictionary store when the path ends in .db/.sqlite. With tables only those tables are written.
 
-load_data_dictionary(file_path: str='data_dictionary.json')
-    Loads an existing data dictionary from a JSON file.
-    Returns: Dictionary containing the data dictionary structure.
+load_data_dictionary(file_path: str='data_dictionary.json', tables: list=None, store=None)
+    Loads an existing data dictionary from a JSON file or the SQLite dictionary store.
+    With tables only those tables are read.
+    Returns: DataDictionary (see dd_model.py) containing the data dictionary structure.
 
-build_data_dictionary_from_schema(tables_df: DataFrame, columns_df: DataFrame)
+open_data_dictionary_store(file_path: str='data_dictionary.json')
+    Opens the dictionary store once, pass it as store to several loads and saves so the
+    JSON file is only parsed once.
+
+build_data_dictionary_from_schema(tables_df: dict, columns_df: dict)
     Creates a new data dictionary structure from database schema information.
-    Returns: Dictionary with table and column metadata.
+    Declared foreign keys are recorded as 'foreign_key': {'table', 'column'}; a composite key
+    is recorded once, on its leading column, as 'foreign_key': {'table', 'columns': {child: parent}}.
+    Returns: DataDictionary with table and column metadata.
 
-update_column_metadata(dd: dict, cols: dict)
+update_column_metadata(dd: DataDictionary, cols: dict, conn, workers: int=1, db_name: str=None, approximate: bool=False)
     Updates metadata for specified columns, including statistics and value ranges.
+    With workers > 1 tables are profiled in parallel, one read-only connection per worker to
+    db_name, or to the database file of conn when db_name is not given.
+    With approximate=True unique_count is a HyperLogLog estimate and unique_count_error
+    records its relative standard error.
+    With sample_rows/sample_fraction large tables are profiled from a random rowid sample.
+    Numeric columns other than primary keys get 'quantiles' and a 'histogram'
+    (PROFILE_DISTRIBUTIONS), categorical columns their 'top_values' with counts: exact for
+    moderate cardinality, from a sketch for high-cardinality columns (TOP_VALUES_EXACT_MAX_DISTINCT).
+
+plan_table_sample(table_name: str, conn, sample_rows: int=None, sample_fraction: float=None)
+    Picks random rowid ranges covering the sample budget of a table.
+    Returns: Dict with the sample WHERE clause and sizes, or None when the table should be fully scanned.
 
-get_all_tables_and_columns(dd: dict)
+get_all_tables_and_columns(dd: DataDictionary)
     Extracts all table and column names from the data dictionary.
     Returns: Dictionary mapping table names to lists of column names.
 
+main(db_name: str=DB_NAME, json_file: str='data_dictionary.json', ...)
+    Builds and profiles the whole data dictionary, what running the script does (datadict.py init).
+
+profile_columns(table: str, columns: list=None, db_name: str=DB_NAME, json_file: str='data_dictionary.json')
+    Re-profiles some columns of one table and saves only that table (datadict.py profile).
+
 Helper Classes:
 --------------
 CustomJSONEncoder
@@ -45,10 +75,10 @@ CustomJSONEncoder
 Dependencies:
 ------------
 - sqlite3
-- pandas
 - json
 - datetime
-- tqdm
+- tqdm (only when columns are profiled)
+- query_metrics (per-column timings and the Prometheus metrics file when run as a script)
 
 Note:
 -----
@@ -58,41 +88,184 @@ It maintains a JSON-based data dictionary that tracks schema changes and column
 
 # Import Libraries
 import sqlite3
-import pandas as pd
 import json
 import datetime
-from tqdm import tqdm
-from db_conn import get_conn, fetch_columns, fetch_tables
+import heapq
+import math
+import random
+import zlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from db_conn import DB_NAME, get_database_file, get_pool, pooled_conn, fetch_columns, fetch_rows, fetch_tables
+from dd_model import Column, DataDictionary, Table
+from dictionary_store import open_dictionary_store
+from query_metrics import measure, start_metrics
+from sketches import HyperLogLog, KLLSketch, MisraGries, hll_error, register_sketch_functions
+
+
+# Number of profiling workers used when the script is run, set to 1 to profile sequentially
+PROFILE_WORKERS = 4
+
+# Estimate distinct counts with HyperLogLog instead of COUNT(DISTINCT) when the script is run
+APPROXIMATE_DISTINCT = False
+
+# Sampling used when the script is run, leave both as None to profile every row
+SAMPLE_ROWS = None
+SAMPLE_FRACTION = None
+
+# Tables with fewer rows than this are always profiled with a full scan
+SAMPLE_MIN_TABLE_ROWS = 100000
+
+# Number of random rowid ranges a table sample is drawn from
+SAMPLE_RANGES = 32
+
+# Confidence used for the range_tail_fraction bound of sampled min/max values
+SAMPLE_CONFIDENCE = 0.95
+
+# Categorical columns get allowable_values for up to this many distinct values (checked
+# with a temp-table anti-join, see data_quality_checks.py); sets of 20 or more values are
+# only recorded when there are at most ALLOWABLE_VALUES_RATIO distinct values per row
+ALLOWABLE_VALUES_MAX = 10000
+ALLOWABLE_VALUES_RATIO = 0.5
+
+CONTINUOUS_TYPES = ['integer', 'real', 'numeric', 'decimal', 'float', 'double', 'date', 'datetime', 'timestamp']
+
+# Numeric columns also get quantiles and an equi-width histogram from a KLL sketch computed in
+# the same scan as MIN/MAX; data quality checks compare new data against them to flag drift
+PROFILE_DISTRIBUTIONS = True
+DISTRIBUTION_TYPES = ['integer', 'real', 'numeric', 'decimal', 'float', 'double']
+QUANTILE_POINTS = [0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99]
+HISTOGRAM_BINS = 10
+
+# Categorical columns record their TOP_VALUES_K most frequent values with their counts. Columns
+# with an estimated TOP_VALUES_EXACT_MAX_DISTINCT distinct values or fewer get exact counts from
+# one GROUP BY, higher-cardinality columns a Misra-Gries heavy-hitters sketch; the estimate
+# comes from the first CARDINALITY_PROBE_ROWS non-null values of the column
+TOP_VALUES_K = 10
+TOP_VALUES_EXACT_MAX_DISTINCT = ALLOWABLE_VALUES_MAX
+CARDINALITY_PROBE_ROWS = 10000
+
+# Metadata that only describes how a profile was estimated, cleared before every re-profile;
+# null_count, row_count and shards come from fleet profiles merged across shards (fleet.py)
+PROFILE_ESTIMATE_KEYS = ['unique_count_error', 'sample_size', 'table_rows_estimate',
+                         'unique_count_bounds', 'range_tail_fraction', 'quantiles', 'histogram',
+                         'top_values', 'top_values_rows', 'top_values_error',
+                         'null_count', 'row_count', 'shards']
 
 
 # Function to get column stats
-def get_column_stats(table_name, column_name, conn):
+def get_column_stats(table_name, column_name, conn, approximate=False, distribution=False):
+    # With distribution=True the same scan also builds a KLL sketch, returned as a fourth value
+    quantile_sketch = f", KLL_SKETCH({column_name}) AS quantile_sketch" if distribution else ''
+    if approximate or distribution:
+        register_sketch_functions(conn)
+    if approximate:
+        # HLL_SKETCH streams the column through a HyperLogLog instead of building a temp b-tree
+        query = f"""
+        SELECT
+            MIN({column_name}) AS min_val,
+            MAX({column_name}) AS max_val,
+            HLL_SKETCH({column_name}) AS unique_sketch{quantile_sketch}
+        FROM {table_name}
+        """
+        result = conn.execute(query).fetchone()
+        stats = (result[0], result[1], HyperLogLog.from_bytes(result[2]).count())
+    else:
+        query = f"""
+        SELECT
+            MIN({column_name}) AS min_val,
+            MAX({column_name}) AS max_val,
+            COUNT(DISTINCT {column_name}) AS unique_count{quantile_sketch}
+        FROM {table_name}
+        """
+        result = conn.execute(query).fetchone()
+        stats = (result[0], result[1], result[2])
+    if distribution:
+        return stats + (KLLSketch.from_bytes(result[3]),)
+    return stats
+
+
+# Function to get column stats from the rows of a table sample
+def get_column_sample_stats(table_name, column_name, conn, sample_where, distribution=False):
+    # Groups the sampled values once to get the range, distinct count and singleton count,
+    # with distribution=True a KLL sketch of the sampled values is returned as a fifth value
+    quantile_sketch = ", KLL_SKETCH(value, value_count) AS quantile_sketch" if distribution else ''
+    if distribution:
+        register_sketch_functions(conn)
     query = f"""
     SELECT
-        MIN({column_name}) AS min_val,
-        MAX({column_name}) AS max_val,
-        COUNT(DISTINCT {column_name}) AS unique_count
-    FROM {table_name}
+        MIN(value) AS min_val,
+        MAX(value) AS max_val,
+        COUNT(*) AS sample_unique_count,
+        SUM(CASE WHEN value_count = 1 THEN 1 ELSE 0 END) AS singleton_count{quantile_sketch}
+    FROM (
+        SELECT {column_name} AS value, COUNT(*) AS value_count
+        FROM {table_name}
+        WHERE ({sample_where}) AND {column_name} IS NOT NULL
+        GROUP BY {column_name}
+    )
     """
     result = conn.execute(query).fetchone()
-    min_val = result[0]
-    max_val = result[1]
-    unique_count = result[2]
-    return min_val, max_val, unique_count
+    stats = (result[0], result[1], result[2], result[3] or 0)
+    if distribution:
+        return stats + (KLLSketch.from_bytes(result[4]),)
+    return stats
+
+
+# Function to plan a random rowid-range sample of a table, returns None when the table should be fully scanned
+def plan_table_sample(table_name, conn, sample_rows=None, sample_fraction=None,
+                      min_table_rows=SAMPLE_MIN_TABLE_ROWS, ranges=SAMPLE_RANGES):
+    try:
+        # MIN/MAX(rowid) are answered from the b-tree without a scan
+        min_rowid, max_rowid = conn.execute(f"SELECT MIN(rowid), MAX(rowid) FROM {table_name}").fetchone()
+    except sqlite3.Error:
+        # WITHOUT ROWID tables and views are always scanned in full
+        return None
+    if min_rowid is None:
+        return None
+    table_rows = max_rowid - min_rowid + 1
+    if table_rows < min_table_rows:
+        return None
+
+    budget = table_rows
+    if sample_fraction:
+        budget = min(budget, int(table_rows * sample_fraction))
+    if sample_rows:
+        budget = min(budget, sample_rows)
+    if budget >= table_rows:
+        return None
+
+    # Seed from the table name so repeated runs profile the same sample
+    rng = random.Random(zlib.crc32(table_name.encode('utf-8')))
+    range_length = max(1, -(-budget // ranges))
+    starts = sorted(rng.randint(min_rowid, max_rowid - range_length + 1) for _ in range(ranges))
+    merged = []
+    for start in starts:
+        end = start + range_length - 1
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    sample_where = ' OR '.join(f"rowid BETWEEN {start} AND {end}" for start, end in merged)
+    sample_size = conn.execute(f"SELECT COUNT(*) FROM {table_name} WHERE {sample_where}").fetchone()[0]
+    return {'where': sample_where, 'sample_size': sample_size, 'table_rows': table_rows}
 
 
 # Custom JSON Encoder to handle datetime objects
 class CustomJSONEncoder(json.JSONEncoder):
     def default(self, obj):
-        if isinstance(obj, (pd.Timestamp, datetime.datetime, datetime.date)):
+        # pandas Timestamps are datetime subclasses, no pandas import needed to recognise them
+        if isinstance(obj, (datetime.datetime, datetime.date)):
             return obj.isoformat()
         return super().default(obj)
 
 
-# Function to save data dictionary
-def save_data_dictionary(dd, json_file='data_dictionary.json'):
-    with open(json_file, 'w') as f:
-        json.dump(dd, f, cls=CustomJSONEncoder, indent=4)
+# Function to save data dictionary, a .db/.sqlite path saves to the SQLite dictionary store
+def save_data_dictionary(dd, json_file='data_dictionary.json', tables=None, store=None):
+    # With tables only those tables are written (tables missing from dd are removed),
+    # an already open store (see open_data_dictionary_store) is reused instead of json_file
+    if isinstance(dd, DataDictionary):
+        dd = dd.to_dict()
+    (store or open_data_dictionary_store(json_file)).save(dd, tables)
     print("Data dictionary saved successfully.")
 
 
@@ -107,102 +280,450 @@ def load_data_dictionary(json_file='data_dictionary.json'):
         print("No existing data dictionary found. Starting fresh.")
     return dd
 
-# Function to load data dictionary
-def load_data_dictionary(file_path='data_dictionary.json'):
-    with open(file_path, 'r') as file:
-        return json.load(file)
+# Function to load data dictionary, a .db/.sqlite path loads from the SQLite dictionary store
+def load_data_dictionary(file_path='data_dictionary.json', tables=None, store=None):
+    # With tables only those tables are read
+    return DataDictionary.from_dict((store or open_data_dictionary_store(file_path)).load(tables))
+
+# Function to open the data dictionary store once for several loads and saves
+def open_data_dictionary_store(file_path='data_dictionary.json'):
+    return open_dictionary_store(file_path, CustomJSONEncoder)
 
 # Function to build data dictionary from schema
 def build_data_dictionary_from_schema(tables_df, columns_df):
-    dd = {}
+    dd = DataDictionary()
     # Initialize tables
-    for index, row in tables_df.iterrows():
-        table_name = row['table_name']
-        table_owner = row['table_owner']
-        dd[table_name] = {
-            'description': '',
-            'table_owner': table_owner,
-            'columns': {}
-        }
+    for table_name, table_owner in zip(tables_df['table_name'], tables_df['table_owner']):
+        dd[table_name] = Table(table_name, description='', table_owner=table_owner)
+    primary_keys = get_primary_key_columns(columns_df)
+    no_keys = [None] * len(columns_df['table_name'])
     # Populate columns
-    for index, row in columns_df.iterrows():
-        table_name = row['table_name']
-        column_name = row['column_name']
-        data_type = row['data_type']
-        is_nullable = row['is_nullable']
-        column_metadata = {
-            'description': '',
-            'data_type': data_type,
-            'type': '',
-            'duplicates_allowed': True,
-            'null_values_allowed': is_nullable == 'YES',
-        }
-        dd[table_name]['columns'][column_name] = column_metadata
+    for table_name, column_name, data_type, is_nullable, foreign_table, foreign_column, key_columns, parent_columns in zip(
+            columns_df['table_name'], columns_df['column_name'], columns_df['data_type'],
+            columns_df['is_nullable'], columns_df['foreign_table'], columns_df['foreign_column'],
+            columns_df.get('foreign_key_columns', no_keys), columns_df.get('foreign_key_parent_columns', no_keys)):
+        column = Column(
+            column_name,
+            description='',
+            data_type=data_type,
+            type='',
+            duplicates_allowed=True,
+            null_values_allowed=is_nullable == 'YES',
+        )
+        if isinstance(foreign_table, str) and key_columns:
+            # A composite key is declared once, on its leading column, with every child -> parent column pair
+            if column_name == key_columns[0]:
+                # REFERENCES parent without a column list points at the parent's primary key
+                if not all(isinstance(parent, str) for parent in parent_columns):
+                    parent_columns = primary_keys.get(foreign_table, [])
+                if len(parent_columns) == len(key_columns):
+                    column['foreign_key'] = {'table': foreign_table, 'columns': dict(zip(key_columns, parent_columns))}
+        elif isinstance(foreign_table, str):
+            # REFERENCES parent without a column list points at the parent's primary key
+            if not isinstance(foreign_column, str):
+                parent_key = primary_keys.get(foreign_table, [])
+                # Composite keys cannot be the target of a single-column reference
+                foreign_column = parent_key[0] if len(parent_key) == 1 else 'rowid'
+            column['foreign_key'] = {'table': foreign_table, 'column': foreign_column}
+        dd.tables[table_name].columns[column.name] = column
     return dd
 
 
-# Function to update column metadata
-def update_column_metadata(dd, cols, conn):
-    for table, column in tqdm(cols.items(), desc='Updating Metadata for Columns'):
-        table_data = dd[table]
-        for column_name in column:
-            column_data = table_data['columns'][column_name]
-            data_type = column_data['data_type'].lower()
-            print(f"Processing {table}.{column_name} with datatype: {data_type}")
-            column_data['type'] = 'categorical'  # Set a default type
-            if data_type in ['integer', 'real', 'numeric', 'decimal', 'float', 'double', 'date', 'datetime', 'timestamp']:
-                column_data['type'] = 'continuous'
-                try:
-                    min_val, max_val, unique_count = get_column_stats(table, column_name, conn)
-                    # Convert dates to strings if necessary
-                    if isinstance(min_val, (datetime.datetime, datetime.date)):
-                        min_val = min_val.isoformat()
-                    if isinstance(max_val, (datetime.datetime, datetime.date)):
-                        max_val = max_val.isoformat()
-                    column_data['min_value'] = min_val
-                    column_data['max_value'] = max_val
-                    column_data['unique_count'] = unique_count
-                    column_data['zero_allowed'] = (min_val == 0 or max_val == 0)
-                except Exception as e:
-                    print(f"Error processing {table}.{column_name}: {e}")
+# Function to get the primary key columns of every table, in key order
+def get_primary_key_columns(columns_df):
+    key_columns = {}
+    for table_name, column_name, primary_key in zip(
+            columns_df['table_name'], columns_df['column_name'], columns_df['primary_key']):
+        if primary_key:
+            key_columns.setdefault(table_name, []).append((primary_key, column_name))
+    return {table: [column for _, column in sorted(columns)] for table, columns in key_columns.items()}
+
+
+# Function to profile a single column, returns the metadata to merge into the data dictionary
+def profile_column(table, column_name, data_type, conn, approximate=False, sample=None, key_column=False):
+    # key_column marks primary key columns, they get no quantiles/histogram: ids grow with
+    # every insert, a stored distribution would only raise false drift failures
+    data_type = data_type.lower()
+    print(f"Processing {table}.{column_name} with datatype: {data_type}")
+    updates = {'type': 'categorical'}  # Set a default type
+    if data_type in CONTINUOUS_TYPES:
+        updates['type'] = 'continuous'
+        try:
+            sample_bounds = {}
+            distribution = PROFILE_DISTRIBUTIONS and data_type in DISTRIBUTION_TYPES and not key_column
+            sketch = None
+            if sample:
+                min_val, max_val, unique_count, sample_bounds, sketch = estimate_column_stats_from_sample(
+                    table, column_name, conn, sample, distribution)
+            elif distribution:
+                min_val, max_val, unique_count, sketch = get_column_stats(
+                    table, column_name, conn, approximate, distribution=True)
             else:
-                try:
-                    query = f"SELECT DISTINCT {column_name} FROM {table} LIMIT 100"
-                    values_df = pd.read_sql_query(query, conn)
-                    values = values_df[column_name].tolist()
-                    # Convert any dates to strings
-                    values = [
-                        v.isoformat() if isinstance(v, (datetime.datetime, datetime.date)) else v
-                        for v in values
-                    ]
-                    if len(values) < 20:
-                        column_data['allowable_values'] = values
-                    column_data['unique_count'] = len(values)
-                except Exception as e:
-                    print(f"Error processing {table}.{column_name}: {e}")
+                min_val, max_val, unique_count = get_column_stats(table, column_name, conn, approximate)
+            # Convert dates to strings if necessary
+            if isinstance(min_val, (datetime.datetime, datetime.date)):
+                min_val = min_val.isoformat()
+            if isinstance(max_val, (datetime.datetime, datetime.date)):
+                max_val = max_val.isoformat()
+            updates['min_value'] = min_val
+            updates['max_value'] = max_val
+            updates['unique_count'] = unique_count
+            updates.update(sample_bounds)
+            if approximate and not sample:
+                # Relative standard error of the HyperLogLog estimate
+                updates['unique_count_error'] = round(hll_error(), 4)
+            updates['zero_allowed'] = (min_val == 0 or max_val == 0)
+            if sketch is not None and sketch.count():
+                updates.update(summarize_distribution(sketch, min_val, max_val))
+        except Exception as e:
+            print(f"Error processing {table}.{column_name}: {e}")
+    else:
+        try:
+            updates.update(profile_categorical_column(table, column_name, conn, approximate, sample=sample))
+        except Exception as e:
+            print(f"Error processing {table}.{column_name}: {e}")
+    return updates
+
+
+# Function to profile a categorical column: distinct count, top values and allowable values
+def profile_categorical_column(table, column_name, conn, approximate=False, top_values=TOP_VALUES_K, sample=None):
+    """
+    Picks the cheapest path that keeps the profile exact where it matters:
+    - with a table sample (sampling mode) one GROUP BY over the sampled rows, the distinct
+      count is a GEE estimate with bounds like the continuous columns;
+    - columns with an estimated TOP_VALUES_EXACT_MAX_DISTINCT distinct values or fewer
+      (see estimate_column_cardinality) get one exact GROUP BY, which also gives the row
+      count and the allowable values;
+    - high-cardinality columns get their top values from a Misra-Gries sketch, with an
+      exact COUNT(DISTINCT) or, when approximate, a HyperLogLog estimate in the same pass.
+    """
+    if sample:
+        return profile_categorical_sample(table, column_name, conn, sample, top_values)
+    if estimate_column_cardinality(table, column_name, conn) <= TOP_VALUES_EXACT_MAX_DISTINCT:
+        query = f"""
+        SELECT {column_name} AS value, COUNT(*) AS value_count
+        FROM {table}
+        GROUP BY {column_name}
+        ORDER BY {column_name}
+        """
+        counts = summarize_value_counts(fetch_rows(conn, query), top_values)
+        updates = {}
+        if allowable_values_complete(counts['unique_count'], counts['row_count']) and counts['values'] is not None:
+            updates['allowable_values'] = [to_json_value(v) for v in counts['values']]
+        updates['unique_count'] = counts['unique_count']
+        updates['top_values'] = [[to_json_value(value), count] for value, count in counts['top']]
+        updates['top_values_rows'] = counts['row_count']
+        return updates
+
+    # High cardinality: one streaming pass, the top values come from a heavy-hitters sketch
+    # instead of sorting every group; too many values for allowable_values
+    register_sketch_functions(conn)
+    unique_expression = f"HLL_SKETCH({column_name})" if approximate else f"COUNT(DISTINCT {column_name})"
+    query = f"""
+    SELECT
+        {unique_expression} AS unique_count,
+        TOPK_SKETCH({column_name}) AS top_sketch,
+        COUNT({column_name}) AS row_count
+    FROM {table}
+    """
+    unique_count, top_sketch, row_count = conn.execute(query).fetchone()
+    updates = {}
+    if approximate:
+        unique_sketch = HyperLogLog.from_bytes(unique_count)
+        unique_count = unique_sketch.count()
+        updates['unique_count_error'] = round(unique_sketch.error, 4)
+    top_sketch = MisraGries.from_bytes(top_sketch)
+    updates['unique_count'] = unique_count
+    # Frequency baseline: the most frequent non-null values with their counts, out of top_values_rows
+    updates['top_values'] = [[to_json_value(value), count] for value, count in top_sketch.top(top_values)]
+    updates['top_values_rows'] = row_count
+    # Reported counts are at most this many rows short of the true counts
+    updates['top_values_error'] = top_sketch.error
+    return updates
+
+
+# Function to profile a categorical column from the rows of a table sample
+def profile_categorical_sample(table, column_name, conn, sample, top_values=TOP_VALUES_K):
+    query = f"""
+    SELECT {column_name} AS value, COUNT(*) AS value_count
+    FROM {table}
+    WHERE {sample['where']}
+    GROUP BY {column_name}
+    ORDER BY {column_name}
+    """
+    counts = summarize_value_counts(fetch_rows(conn, query), top_values)
+    unique_count, upper_bound = estimate_unique_count(
+        counts['unique_count'], counts['singletons'], sample['sample_size'], sample['table_rows'])
+    updates = {}
+    # Only a set without values seen once looks complete, a sample cannot rule out rarer values
+    if counts['singletons'] == 0 and counts['values'] is not None and \
+            allowable_values_complete(counts['unique_count'], counts['row_count']):
+        updates['allowable_values'] = [to_json_value(v) for v in counts['values']]
+    updates['unique_count'] = unique_count
+    updates['sample_size'] = sample['sample_size']
+    updates['table_rows_estimate'] = sample['table_rows']
+    updates['unique_count_bounds'] = [counts['unique_count'], upper_bound]
+    # Counts of the sampled rows, out of top_values_rows sampled non-null values
+    updates['top_values'] = [[to_json_value(value), count] for value, count in counts['top']]
+    updates['top_values_rows'] = counts['row_count']
+    return updates
+
+
+# Function to estimate the distinct count of a column from a bounded prefix of its non-null values
+def estimate_column_cardinality(table, column_name, conn, probe_rows=CARDINALITY_PROBE_ROWS):
+    # Reads at most probe_rows values; a column that fits in the probe is counted exactly
+    query = f"""
+    SELECT
+        COUNT(*) AS probe_unique,
+        SUM(CASE WHEN value_count = 1 THEN 1 ELSE 0 END) AS singleton_count,
+        SUM(value_count) AS probe_size
+    FROM (
+        SELECT value, COUNT(*) AS value_count
+        FROM (SELECT {column_name} AS value FROM {table} WHERE {column_name} IS NOT NULL LIMIT {probe_rows})
+        GROUP BY value
+    )
+    """
+    probe_unique, singletons, probe_size = conn.execute(query).fetchone()
+    if not probe_size or probe_size < probe_rows:
+        return probe_unique
+    try:
+        # MAX(rowid) is a seek on the rowid b-tree, not a count
+        table_rows = conn.execute(f"SELECT MAX(rowid) FROM {table}").fetchone()[0] or probe_size
+    except sqlite3.Error:
+        table_rows = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    return estimate_unique_count(probe_unique, singletons or 0, probe_size, max(table_rows, probe_size))[0]
+
+
+# Function to summarize (value, count) groups in value order: counts, top values and the value set
+def summarize_value_counts(rows, top_values=TOP_VALUES_K, values_limit=ALLOWABLE_VALUES_MAX):
+    # Memory stays bounded by top_values and values_limit however many groups there are;
+    # 'values' includes NULL like SELECT DISTINCT does and is None past values_limit
+    summary = {'unique_count': 0, 'row_count': 0, 'singletons': 0, 'values': [], 'top': []}
+    heap = []
+    for i, (value, count) in enumerate(rows):
+        if summary['values'] is not None:
+            summary['values'].append(value)
+            if len(summary['values']) > values_limit:
+                summary['values'] = None
+        if value is None:
+            continue
+        summary['unique_count'] += 1
+        summary['row_count'] += count
+        summary['singletons'] += count == 1
+        # Ties keep the first values in value order, like ORDER BY value_count DESC, value
+        entry = (count, -i, value)
+        if len(heap) < top_values:
+            heapq.heappush(heap, entry)
+        elif entry > heap[0]:
+            heapq.heapreplace(heap, entry)
+    summary['top'] = [(value, count) for count, _, value in sorted(heap, reverse=True)]
+    return summary
+
+
+# Function to check whether a value set is small or repetitive enough to record as allowable values
+def allowable_values_complete(unique_count, row_count):
+    # Small sets are always recorded, larger ones only when values repeat like a code list
+    return unique_count <= ALLOWABLE_VALUES_MAX and (
+        unique_count < 20 or unique_count <= ALLOWABLE_VALUES_RATIO * row_count)
+
+
+# Function to convert dates to strings so profile values can be stored as JSON
+def to_json_value(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return value
+
+
+# Function to summarize a KLL sketch into the compact quantiles and histogram stored in the dictionary
+def summarize_distribution(sketch, low=None, high=None, quantile_points=QUANTILE_POINTS, bins=HISTOGRAM_BINS):
+    # The exact MIN/MAX make better histogram bounds than the extremes the sketch kept
+    if not isinstance(low, (int, float)) or not isinstance(high, (int, float)):
+        low, high = sketch.quantiles([0, 1])
+    if high <= low:
+        bins = 1
+    return {
+        'quantiles': {f"p{round(point * 100):g}": value
+                      for point, value in zip(quantile_points, sketch.quantiles(quantile_points))},
+        # Equi-width bins between low and high, values outside the range count in the end bins
+        'histogram': {'range': [low, high], 'counts': sketch.histogram(low, high, bins)},
+    }
+
+
+# Function to estimate the distinct count of a table from a sample, returns (estimate, upper bound)
+def estimate_unique_count(sample_unique, singletons, sample_size, table_rows):
+    scale = table_rows / sample_size if sample_size else 1
+    # GEE estimator: values seen once in the sample stand for sqrt(N/n) values in the table,
+    # the bounds are the distinct values seen and the fully scaled up singletons
+    unique_count = int(round(math.sqrt(scale) * singletons + sample_unique - singletons))
+    upper_bound = min(table_rows, int(round(scale * singletons + sample_unique - singletons)))
+    return unique_count, upper_bound
+
+
+# Function to estimate column stats from a table sample, also returns the bounds to record with them
+def estimate_column_stats_from_sample(table, column_name, conn, sample, distribution=False):
+    stats = get_column_sample_stats(table, column_name, conn, sample['where'], distribution)
+    min_val, max_val, sample_unique, singletons = stats[:4]
+    sample_size = sample['sample_size']
+    table_rows = sample['table_rows']
+    unique_count, upper_bound = estimate_unique_count(sample_unique, singletons, sample_size, table_rows)
+    bounds = {
+        'sample_size': sample_size,
+        'table_rows_estimate': table_rows,
+        'unique_count_bounds': [sample_unique, upper_bound],
+    }
+    # With SAMPLE_CONFIDENCE at most this fraction of rows lies outside [min_value, max_value]
+    if sample_size:
+        bounds['range_tail_fraction'] = round(1 - (1 - SAMPLE_CONFIDENCE) ** (1 / sample_size), 6)
+    # The sketch (or None) of the sampled values, its histogram counts are sample counts
+    return min_val, max_val, unique_count, bounds, stats[4] if distribution else None
+
+
+# Function to profile all requested columns of one table
+def profile_table(table, columns, conn, sampling=None):
+    sample = None
+    if sampling:
+        with measure('sample', table=table):
+            sample = plan_table_sample(table, conn, **sampling)
+    key_columns = fetch_primary_key_columns(conn, table)
+    profiles = {}
+    for column_name, data_type, approximate in columns:
+        with measure('profile', table=table, column=column_name):
+            profiles[column_name] = profile_column(table, column_name, data_type, conn, approximate, sample,
+                                                   key_column=column_name in key_columns)
+    return profiles
+
+
+# Function to fetch the primary key columns of a table
+def fetch_primary_key_columns(conn, table):
+    return {row[0] for row in conn.execute("SELECT name FROM pragma_table_info(?) WHERE pk > 0;", (table,))}
+
+
+# Function to update column metadata
+def update_column_metadata(dd, cols, conn, workers=1, db_name=None, approximate=False,
+                           sample_rows=None, sample_fraction=None, sample_min_table_rows=SAMPLE_MIN_TABLE_ROWS):
+    """
+    Profiles the given {table: [columns]} and merges the results into dd.
+    With sample_rows and/or sample_fraction, continuous columns of tables with at least
+    sample_min_table_rows rows are profiled from random rowid ranges; smaller tables fall
+    back to a full scan. Sampled columns record sample_size, table_rows_estimate,
+    unique_count_bounds and range_tail_fraction next to their estimates.
+    With approximate=True distinct counts are estimated with a HyperLogLog sketch, except for
+    columns marked duplicates_allowed: false which keep the exact counts. Categorical columns
+    with an estimated TOP_VALUES_EXACT_MAX_DISTINCT distinct values or fewer are always
+    counted exactly, higher-cardinality ones get their top values from a Misra-Gries sketch.
+    Sampled tables profile their categorical columns from the sample as well.
+    With workers > 1 the tables are spread over a thread pool where every worker borrows
+    its own read-only connection from the shared db_conn pool; results are merged in the order of cols so the
+    resulting data dictionary does not depend on which worker finished first.
+    """
+    jobs = {}
+    for table, columns in cols.items():
+        jobs[table] = []
+        for column_name in columns:
+            column_data = dd[table]['columns'][column_name]
+            column_approximate = approximate and column_data.get('duplicates_allowed', True)
+            jobs[table].append((column_name, column_data['data_type'], column_approximate))
+
+    sampling = None
+    if sample_rows or sample_fraction:
+        sampling = {'sample_rows': sample_rows, 'sample_fraction': sample_fraction,
+                    'min_table_rows': sample_min_table_rows}
+
+    if workers <= 1:
+        from tqdm import tqdm
+        results = {}
+        for table, columns in tqdm(jobs.items(), desc='Updating Metadata for Columns'):
+            results[table] = profile_table(table, columns, conn, sampling)
+    else:
+        # The workers open their own connections, to the database conn is connected to unless db_name is given
+        db_name = db_name or get_database_file(conn)
+        if db_name is None:
+            raise ValueError("Profiling with workers > 1 needs a database file: pass db_name, "
+                             "or use workers=1 for in-memory databases")
+        results = profile_tables_parallel(jobs, workers, db_name, sampling)
+
+    # Merge deterministically in the order the tables were requested
+    for table, columns in jobs.items():
+        for column_name, _, _ in columns:
+            column_data = dd[table]['columns'][column_name]
+            # An exact re-profile must not keep the bounds of an earlier estimate
+            for key in PROFILE_ESTIMATE_KEYS:
+                column_data.pop(key, None)
+            column_data.update(results[table][column_name])
+
+
+# Function to profile tables on a pool of workers with one read-only connection each
+def profile_tables_parallel(jobs, workers, db_name, sampling=None):
+    from tqdm import tqdm
+    # One more than the workers, the caller may still hold a connection of the same pool
+    pool = get_pool(db_name, size=workers + 1)
+
+    def run(table, columns):
+        with pool.connection() as conn:
+            return table, profile_table(table, columns, conn, sampling)
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(run, table, columns) for table, columns in jobs.items()]
+        for future in tqdm(as_completed(futures), total=len(futures), desc='Updating Metadata for Columns'):
+            table, table_results = future.result()
+            results[table] = table_results
+    return results
 
 
 def get_all_tables_and_columns(dd):
+    if isinstance(dd, DataDictionary):
+        return dd.columns_by_table()
     all_cols = {}
     for table_name, table_data in dd.items():
         cols = list(table_data['columns'].keys())
         all_cols[table_name] = cols
     return all_cols
 
-# %%
-# Initiate the data dictionary
-if __name__ == '__main__':
+# Function to initiate the data dictionary from the database schema and profile every column
+def main(db_name=DB_NAME, json_file='data_dictionary.json', workers=PROFILE_WORKERS,
+         approximate=APPROXIMATE_DISTINCT, sample_rows=SAMPLE_ROWS, sample_fraction=SAMPLE_FRACTION):
+    metrics = start_metrics('init')
+    with pooled_conn(db_name) as conn:
+        if metrics is not None:
+            metrics.instrument(conn)
+        with measure('schema'):
+            tables = fetch_tables(conn)
+            columns = fetch_columns(conn)
+            data_dictionary = build_data_dictionary_from_schema(tables, columns)
 
-    conn = get_conn()
-    tables = fetch_tables(conn)
-    columns = fetch_columns(conn)
-    data_dictionary = build_data_dictionary_from_schema(tables, columns)
+        # %%
+        columns_to_update = get_all_tables_and_columns(data_dictionary)
+        update_column_metadata(data_dictionary, columns_to_update, conn, workers=workers, db_name=db_name,
+                               approximate=approximate, sample_rows=sample_rows,
+                               sample_fraction=sample_fraction)
+    save_data_dictionary(data_dictionary, json_file)
+    if metrics is not None:
+        metrics.finish()
+        print(metrics.format_summary())
 
-    # %%
-    columns_to_update = get_all_tables_and_columns(data_dictionary)
-    update_column_metadata(data_dictionary, columns_to_update, conn)
-    save_data_dictionary(data_dictionary)
 
-    #%%
-    # Close the database connection
-    conn.close()
\ No newline at end of file
+# Function to re-profile some columns of an existing data dictionary, all columns of the table when columns is empty
+def profile_columns(table, columns=None, db_name=DB_NAME, json_file='data_dictionary.json', approximate=False):
+    data_dictionary = load_data_dictionary(json_file, [table])
+    if table not in data_dictionary:
+        raise ValueError(f"Table '{table}' is not in the data dictionary {json_file}")
+    columns = list(columns or data_dictionary[table]['columns'])
+    missing = [column for column in columns if column not in data_dictionary[table]['columns']]
+    if missing:
+        raise ValueError(f"Columns {missing} of '{table}' are not in the data dictionary {json_file}")
+    metrics = start_metrics('profile')
+    with pooled_conn(db_name) as conn:
+        if metrics is not None:
+            metrics.instrument(conn)
+        update_column_metadata(data_dictionary, {table: columns}, conn, db_name=db_name, approximate=approximate)
+    save_data_dictionary(data_dictionary, json_file, [table])
+    if metrics is not None:
+        metrics.finish()
+        print(metrics.format_summary())
+
+
+# %%
+# Initiate the data dictionary
+if __name__ == '__main__':
+    main()
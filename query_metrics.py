@@ -0,0 +1,267 @@
+"""
+Per-query instrumentation for init, refresh and the data quality checks.
+
+QueryMetrics
+    Collector that hooks into every connection made by db_conn.get_conn once started. It
+    counts the statements sent (sqlite3 set_trace_callback) and the SQLite virtual machine
+    steps executed (progress callbacks every db_conn.PROGRESS_HANDLER_STEPS instructions),
+    and attributes them to the innermost measure() block of the thread that ran them.
+    Blocks are tagged with phase/table/column/check and are inclusive: a block also counts
+    the statements of the blocks nested in it. VM steps are the closest thing to "rows
+    visited" SQLite exposes; blocks that know how many rows they scanned record them in
+    'rows'.
+
+start_metrics(script)
+    Starts the process-wide collector of a script run (None when DD_METRICS=0).
+
+measure(phase, table='', column='', check='')
+    Context manager timing a block for the active collector, a no-op when there is none.
+    It yields a dict where the block can set 'rows'.
+
+QueryMetrics.finish()
+    Stops collecting and, when DD_METRICS_DIR is set, writes the run summary
+    (datadict_<script>_summary.json) and a Prometheus text-format file (datadict_<script>.prom)
+    there, ready for the node exporter textfile collector. Both are replaced atomically.
+
+Dependencies:
+------------
+- json
+- threading
+- time
+- weakref
+- db_conn
+"""
+
+# Import Libraries
+import json
+import os
+import threading
+import time
+import weakref
+from contextlib import contextmanager, nullcontext
+from db_conn import CONNECTION_HOOKS, PROGRESS_HANDLER_STEPS, add_progress_callback, remove_progress_callback
+
+# Set DD_METRICS=0 to run the scripts without instrumentation
+METRICS_ENABLED = os.environ.get('DD_METRICS', '1') != '0'
+
+# Directory the summary and the Prometheus file are written to, point it at the node exporter textfile directory;
+# unset, no files are written
+METRICS_DIR = os.environ.get('DD_METRICS_DIR') or None
+
+# Prefix of every exported metric name
+METRIC_PREFIX = 'datadict'
+
+# Slowest blocks listed in the run summary
+SUMMARY_TOP = 10
+
+LABELS = ('phase', 'table', 'column', 'check')
+
+_active = None
+
+
+class QueryMetrics:
+    """Statement counts, VM steps and wall time of tagged blocks, collected across threads."""
+
+    def __init__(self, script):
+        self.script = script
+        self.started = time.time()
+        self.finished = None
+        # (phase, table, column, check) -> {'seconds', 'queries', 'vm_steps', 'rows', 'blocks'}
+        self.blocks = {}
+        # phase -> totals of the outermost blocks, nested blocks are already included in them
+        self.phases = {}
+        self.queries = 0
+        self.vm_steps = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._connections = weakref.WeakSet()
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    # Function to start counting the statements and VM steps of a connection
+    def instrument(self, conn):
+        if conn in self._connections:
+            return conn
+        conn.set_trace_callback(self._on_statement)
+        add_progress_callback(conn, self._on_progress)
+        self._connections.add(conn)
+        return conn
+
+    def release(self, conn):
+        conn.set_trace_callback(None)
+        remove_progress_callback(conn, self._on_progress)
+        self._connections.discard(conn)
+
+    def _on_statement(self, statement):
+        # Table-valued pragma functions trace their internal statements as "-- PRAGMA ..."
+        if statement.startswith('--'):
+            return
+        stack = self._stack()
+        if stack:
+            stack[-1]['queries'] += 1
+        with self._lock:
+            self.queries += 1
+
+    def _on_progress(self):
+        stack = self._stack()
+        if stack:
+            stack[-1]['vm_steps'] += PROGRESS_HANDLER_STEPS
+        with self._lock:
+            self.vm_steps += PROGRESS_HANDLER_STEPS
+        # Never abort the query
+        return 0
+
+    @contextmanager
+    def measure(self, phase, table='', column='', check=''):
+        frame = {'queries': 0, 'vm_steps': 0, 'rows': 0}
+        stack = self._stack()
+        stack.append(frame)
+        started = time.perf_counter()
+        try:
+            yield frame
+        finally:
+            seconds = time.perf_counter() - started
+            stack.pop()
+            if stack:
+                for key in ('queries', 'vm_steps', 'rows'):
+                    stack[-1][key] += frame[key]
+            key = (phase, table or '', column or '', check or '')
+            with self._lock:
+                self._add(self.blocks.setdefault(key, {}), frame, seconds)
+                if not stack:
+                    self._add(self.phases.setdefault(phase, {}), frame, seconds)
+
+    @staticmethod
+    def _add(totals, frame, seconds):
+        totals['seconds'] = totals.get('seconds', 0.0) + seconds
+        totals['blocks'] = totals.get('blocks', 0) + 1
+        for key in ('queries', 'vm_steps', 'rows'):
+            totals[key] = totals.get(key, 0) + frame[key]
+
+    def summary(self, top=SUMMARY_TOP):
+        finished = self.finished or time.time()
+        slowest = sorted(self.blocks.items(), key=lambda item: item[1]['seconds'], reverse=True)[:top]
+        return {
+            'script': self.script,
+            'started': self.started,
+            'duration_seconds': round(finished - self.started, 4),
+            'queries': self.queries,
+            'vm_steps': self.vm_steps,
+            'phases': {phase: _rounded(totals) for phase, totals in self.phases.items()},
+            'slowest': [{**dict(zip(LABELS, key)), **_rounded(totals)} for key, totals in slowest],
+        }
+
+    def format_summary(self, top=5):
+        summary = self.summary(top)
+        lines = [f"{self.script}: {summary['duration_seconds']:.3f}s, {summary['queries']} queries, "
+                 f"{summary['vm_steps']} VM steps"]
+        for block in summary['slowest']:
+            name = '.'.join(part for part in (block['table'], block['column']) if part) or '-'
+            check = f" [{block['check']}]" if block['check'] else ''
+            lines.append(f"  {block['phase']:<10} {name}{check}: {block['seconds']:.3f}s, "
+                         f"{block['queries']} queries, {block['vm_steps']} VM steps")
+        return '\n'.join(lines)
+
+    def to_prometheus(self):
+        script = _escape_label(self.script)
+        finished = self.finished or time.time()
+        series = [
+            ('run_duration_seconds', 'Wall time of the last run.',
+             [(f'script="{script}"', round(finished - self.started, 6))]),
+            ('run_queries', 'Statements sent to SQLite in the last run.',
+             [(f'script="{script}"', self.queries)]),
+            ('run_vm_steps', 'SQLite virtual machine steps of the last run.',
+             [(f'script="{script}"', self.vm_steps)]),
+            ('last_run_timestamp_seconds', 'Unix time the last run finished.',
+             [(f'script="{script}"', round(finished, 3))]),
+        ]
+        block_labels = [
+            (f'script="{script}",' + ','.join(f'{label}="{_escape_label(value)}"' for label, value in zip(LABELS, key)),
+             totals)
+            for key, totals in self.blocks.items()
+        ]
+        for name, help_text, field in (
+            ('block_duration_seconds', 'Wall time of the instrumented blocks of the last run.', 'seconds'),
+            ('block_queries', 'Statements sent by the instrumented blocks of the last run.', 'queries'),
+            ('block_vm_steps', 'SQLite virtual machine steps of the instrumented blocks of the last run.', 'vm_steps'),
+            ('block_rows_scanned', 'Rows scanned by the instrumented blocks of the last run, where known.', 'rows'),
+        ):
+            values = [(labels, round(totals[field], 6)) for labels, totals in block_labels
+                      if field != 'rows' or totals['rows']]
+            series.append((name, help_text, values))
+
+        lines = []
+        for name, help_text, values in series:
+            if not values:
+                continue
+            lines.append(f"# HELP {METRIC_PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name} gauge")
+            lines.extend(f"{METRIC_PREFIX}_{name}{{{labels}}} {value}" for labels, value in values)
+        return '\n'.join(lines) + '\n'
+
+    def finish(self, directory=METRICS_DIR):
+        """
+        Stops collecting, releases the instrumented connections and writes the summary and
+        the Prometheus file to directory. Returns the paths written, None without a directory.
+        """
+        global _active
+        self.finished = time.time()
+        if self.instrument in CONNECTION_HOOKS:
+            CONNECTION_HOOKS.remove(self.instrument)
+        for conn in list(self._connections):
+            self.release(conn)
+        if _active is self:
+            _active = None
+
+        if directory is None:
+            return None
+        os.makedirs(directory, exist_ok=True)
+        summary_file = os.path.join(directory, f'{METRIC_PREFIX}_{self.script}_summary.json')
+        metrics_file = os.path.join(directory, f'{METRIC_PREFIX}_{self.script}.prom')
+        _write_atomic(summary_file, json.dumps(self.summary(), indent=4))
+        _write_atomic(metrics_file, self.to_prometheus())
+        return summary_file, metrics_file
+
+
+# Function to round the totals of a block for the summary
+def _rounded(totals):
+    return {key: round(value, 4) if isinstance(value, float) else value for key, value in totals.items()}
+
+
+# Function to escape a Prometheus label value
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+# Function to write a file through a temp file, so a scrape never reads half of it
+def _write_atomic(path, content):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w') as f:
+        f.write(content)
+    os.replace(temp_path, path)
+
+
+# Function to start the process-wide collector, every connection made by get_conn from now on is instrumented
+def start_metrics(script, enabled=METRICS_ENABLED):
+    global _active
+    if not enabled:
+        return None
+    _active = QueryMetrics(script)
+    CONNECTION_HOOKS.append(_active.instrument)
+    return _active
+
+
+# Function to get the active collector, None when metrics are not being collected
+def active_metrics():
+    return _active
+
+
+# Function to time a tagged block for the active collector
+def measure(phase, table='', column='', check=''):
+    if _active is None:
+        return nullcontext({})
+    return _active.measure(phase, table, column, check)
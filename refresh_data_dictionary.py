@@ -1,24 +1,230 @@
-from init_data_dictionary import *
+import argparse
+import json
+import os
+import sys
 from datetime import datetime
-from db_conn import get_conn, fetch_tables, fetch_columns
+from fnmatch import fnmatch
+from db_conn import (DB_NAME, pooled_conn, fetch_tables, fetch_columns, fetch_schema_fingerprint,
+                     filter_columnar)
+from init_data_dictionary import (build_data_dictionary_from_schema, load_data_dictionary,
+                                  open_data_dictionary_store, save_data_dictionary, update_column_metadata)
+from query_metrics import measure, start_metrics
+
+
+# Function to get the schema fingerprint file stored next to the data dictionary
+def get_fingerprint_file(json_file='data_dictionary.json'):
+    return os.path.splitext(json_file)[0] + '.fingerprint.json'
+
+
+# Function to load the schema fingerprint of the last refresh
+def load_schema_fingerprint(fingerprint_file):
+    try:
+        with open(fingerprint_file, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+# Function to save the schema fingerprint
+def save_schema_fingerprint(fingerprint, fingerprint_file):
+    with open(fingerprint_file, 'w') as f:
+        json.dump(fingerprint, f, indent=4)
+
+
+# Function to get the tables that were added, removed or altered between two fingerprints
+def diff_schema_fingerprints(stored_fingerprint, current_fingerprint):
+    stored_tables = stored_fingerprint.get('tables', {})
+    current_tables = current_fingerprint['tables']
+    return {
+        table for table in set(stored_tables) | set(current_tables)
+        if stored_tables.get(table) != current_tables.get(table)
+    }
+
+
+# Function to get the tables whose schema changed since the last refresh, None when no fingerprint was stored
+def get_changed_tables(conn, json_file='data_dictionary.json'):
+    stored_fingerprint = load_schema_fingerprint(get_fingerprint_file(json_file))
+    if stored_fingerprint is None:
+        return None
+    return diff_schema_fingerprints(stored_fingerprint, fetch_schema_fingerprint(conn))
+
+
+# Schema changes a refresh policy decides on
+REFRESH_ACTIONS = ('remove_tables', 'add_tables', 'remove_columns', 'add_columns')
+
+# Refresh policy, every action is 'yes', 'no' or 'prompt'. Tables matching a 'deny' pattern (or
+# no 'allow' pattern) are never changed, 'tables' maps a table pattern to per-table overrides,
+# e.g. {'staging_*': {'add_columns': 'no'}}
+REFRESH_POLICY = {
+    'remove_tables': 'prompt',
+    'add_tables': 'prompt',
+    'remove_columns': 'prompt',
+    'add_columns': 'prompt',
+    'allow': ['*'],
+    'deny': [],
+    'tables': {},
+}
+
+# Non-interactive policy for scheduled runs: add whatever is new, keep whatever was removed
+HEADLESS_POLICY = {
+    'remove_tables': 'no',
+    'add_tables': 'yes',
+    'remove_columns': 'no',
+    'add_columns': 'yes',
+}
+
+
+# Function to load a refresh policy from a dict or a JSON file, missing keys fall back to REFRESH_POLICY
+def load_refresh_policy(policy=None):
+    if isinstance(policy, str):
+        with open(policy, 'r') as f:
+            policy = json.load(f)
+    merged = {**REFRESH_POLICY, **(policy or {})}
+    for setting in [merged[action] for action in REFRESH_ACTIONS] + [
+            value for overrides in merged['tables'].values() for value in overrides.values()]:
+        if setting not in ('yes', 'no', 'prompt'):
+            raise ValueError(f"Invalid refresh policy setting '{setting}', expected 'yes', 'no' or 'prompt'")
+    return merged
+
+
+# Function to get the policy setting of one action for one table
+def resolve_policy_action(policy, action, table_name):
+    if not any(fnmatch(table_name, pattern) for pattern in policy['allow']):
+        return 'no'
+    if any(fnmatch(table_name, pattern) for pattern in policy['deny']):
+        return 'no'
+    for pattern, overrides in policy['tables'].items():
+        if fnmatch(table_name, pattern) and action in overrides:
+            return overrides[action]
+    return policy[action]
+
+
+# Function to compute every table and column change between the existing and the new data dictionary
+def compute_schema_diff(existing_data_dictionary, new_data_dictionary, tables=None):
+    existing_tables = [table for table in existing_data_dictionary if tables is None or table in tables]
+    common_tables = [table for table in new_data_dictionary if table in existing_tables]
+    diff = {
+        'remove_tables': [table for table in existing_tables if table not in new_data_dictionary],
+        'add_tables': [table for table in new_data_dictionary if table not in existing_tables],
+        'remove_columns': [],
+        'add_columns': [],
+        'existing_columns': [],
+    }
+    for table in common_tables:
+        existing_columns = existing_data_dictionary[table]['columns']
+        current_columns = new_data_dictionary[table]['columns']
+        diff['remove_columns'].extend((table, column) for column in existing_columns if column not in current_columns)
+        diff['add_columns'].extend((table, column) for column in current_columns if column not in existing_columns)
+        diff['existing_columns'].extend((table, column) for column in current_columns if column in existing_columns)
+    return diff
+
+
+# Function to decide which changes of a schema diff are applied, prompting only where the policy says so
+def decide_schema_changes(diff, policy):
+    questions = {
+        'remove_tables': ("Table '{0}' has been removed from the database.",
+                          "Do you want to remove '{0}' from the data dictionary? (yes/no): "),
+        'add_tables': ("New table detected: '{0}'",
+                       "Do you want to add '{0}' to the data dictionary? (yes/no): "),
+        'remove_columns': ("Column '{1}' in table '{0}' has been removed from the database.",
+                           "Do you want to remove column '{1}' from the data dictionary? (yes/no): "),
+        'add_columns': ("New column detected in table '{0}': '{1}'",
+                        "Do you want to add column '{1}' to the data dictionary? (yes/no): "),
+    }
+    accepted = {}
+    for action in REFRESH_ACTIONS:
+        accepted[action] = []
+        for change in diff[action]:
+            names = (change,) if isinstance(change, str) else change
+            setting = resolve_policy_action(policy, action, names[0])
+            if setting == 'prompt':
+                message, question = questions[action]
+                print("\n" + message.format(*names))
+                setting = 'yes' if input(question.format(*names)).strip().lower() in ['yes', 'y'] else 'no'
+            if setting == 'yes':
+                accepted[action].append(change)
+    return accepted
+
+
+# Function to apply the accepted schema changes in one batch
+def apply_schema_changes(existing_data_dictionary, new_data_dictionary, diff, accepted):
+    changes_log = []
+    columns_to_update = {}
+
+    # 1. Removed tables
+    for table_name in accepted['remove_tables']:
+        del existing_data_dictionary[table_name]
+        changes_log.append(f"Table removed: {table_name}")
+
+    # 2. New tables, all their columns are profiled
+    for table_name in accepted['add_tables']:
+        existing_data_dictionary[table_name] = new_data_dictionary[table_name]
+        changes_log.append(f"New table added: {table_name}")
+        columns_to_update[table_name] = list(new_data_dictionary[table_name]['columns'].keys())
+
+    # 3. Removed columns
+    for table_name, column_name in accepted['remove_columns']:
+        del existing_data_dictionary[table_name]['columns'][column_name]
+        changes_log.append(f"Column removed from {table_name}: {column_name}")
+
+    # 4. New columns, profiled together with the new tables in one pass
+    for table_name, column_name in accepted['add_columns']:
+        existing_data_dictionary[table_name]['columns'][column_name] = \
+            new_data_dictionary[table_name]['columns'][column_name]
+        changes_log.append(f"New column added in {table_name}: {column_name}")
+        columns_to_update.setdefault(table_name, []).append(column_name)
+
+    # 5. Existing columns take the current schema but keep their description and user-added metadata
+    for table_name, column_name in diff['existing_columns']:
+        existing_column = existing_data_dictionary[table_name]['columns'][column_name]
+        new_column = new_data_dictionary[table_name]['columns'][column_name]
+        new_column['description'] = existing_column.get('description', '')
+        for key, value in existing_column.items():
+            if key not in new_column:
+                new_column[key] = value
+        existing_data_dictionary[table_name]['columns'][column_name] = new_column
+
+    return changes_log, columns_to_update
+
 
 # Function to refresh data dictionary
 def refresh_data_dictionary(conn, json_file='data_dictionary.json', log_file='data_dictionary_changes.log',
-                            update_all_columns=False):
-    # Load existing data dictionary
-    existing_data_dictionary = load_data_dictionary(json_file)
+                            update_all_columns=False, policy=None):
+    # policy decides which schema changes are applied (see REFRESH_POLICY), None prompts for each one
+    # Compare the schema with the fingerprint of the last refresh, so unchanged schemas return
+    # straight away and changed schemas only re-diff the affected tables
+    fingerprint_file = get_fingerprint_file(json_file)
+    with measure('fingerprint'):
+        current_fingerprint = fetch_schema_fingerprint(conn)
+    stored_fingerprint = load_schema_fingerprint(fingerprint_file)
+    affected_tables = None
+    if stored_fingerprint is not None and not update_all_columns and os.path.exists(json_file):
+        affected_tables = diff_schema_fingerprints(stored_fingerprint, current_fingerprint)
+        if not affected_tables:
+            print("\nSchema unchanged since the last refresh, no changes to the data dictionary.")
+            return
+
+    # One store for the whole refresh, the JSON store then parses the file only once
+    store = open_data_dictionary_store(json_file)
 
     # Check if it's the initial run (data dictionary is empty)
-    initial_run = not bool(existing_data_dictionary)
+    initial_run = not store.table_names()
+
+    # Load existing data dictionary, only the affected tables when the fingerprint narrowed them down
+    existing_data_dictionary = load_data_dictionary(json_file, None if initial_run else affected_tables, store)
 
     # Fetch current schema
-    tables_df = fetch_tables(conn)
-    columns_df = fetch_columns(conn)
+    with measure('schema'):
+        tables_df = fetch_tables(conn)
+        columns_df = fetch_columns(conn)
+    if affected_tables is not None and not initial_run:
+        tables_df = filter_columnar(tables_df, 'table_name', affected_tables)
+        columns_df = filter_columnar(columns_df, 'table_name', affected_tables)
 
     # Build new data dictionary from current schema
     new_data_dictionary = build_data_dictionary_from_schema(tables_df, columns_df)
 
-    # Initialize logs
+    # Compute the full schema diff up front, then decide every change before applying any
     changes_log = []
     columns_to_update = {}  # Dictionary to keep track of columns that need metadata updates
 
@@ -30,90 +236,14 @@ def refresh_data_dictionary(conn, json_file='data_dictionary.json', log_file='da
             columns = list(table_data['columns'].keys())
             columns_to_update[table_name] = columns
     else:
-        # Subsequent runs: Handle changes interactively
-        existing_tables = set(existing_data_dictionary.keys())
-        current_tables = set(new_data_dictionary.keys())
-
-        # Process each table individually
-        # 1. Handle Removed Tables
-        for table_name in existing_tables - current_tables:
-            print(f"\nTable '{table_name}' has been removed from the database.")
-            response = input(
-                f"Do you want to remove '{table_name}' from the data dictionary? (yes/no): ").strip().lower()
-            if response in ['yes', 'y']:
-                del existing_data_dictionary[table_name]
-                changes_log.append(f"Table removed: {table_name}")
-                print(f"'{table_name}' has been removed from the data dictionary.")
-            else:
-                print(f"'{table_name}' has been kept in the data dictionary.")
-
-        # 2. Handle New Tables
-        for table_name in current_tables - existing_tables:
-            print(f"\nNew table detected: '{table_name}'")
-            response = input(f"Do you want to add '{table_name}' to the data dictionary? (yes/no): ").strip().lower()
-            if response in ['yes', 'y']:
-                existing_data_dictionary[table_name] = new_data_dictionary[table_name]
-                changes_log.append(f"New table added: {table_name}")
-                print(f"'{table_name}' has been added to the data dictionary.")
-                # Add all columns of the new table to columns_to_update
-                columns_to_update[table_name] = list(new_data_dictionary[table_name]['columns'].keys())
-            else:
-                print(f"'{table_name}' has not been added to the data dictionary.")
-
-        # 3. Handle Existing Tables
-        for table_name in existing_tables & current_tables:
-            existing_table = existing_data_dictionary[table_name]
-            new_table = new_data_dictionary[table_name]
-
-            # Preserve existing table-level metadata
-            new_table['description'] = existing_table.get('description', '')
-
-            # Identify existing and current columns
-            existing_columns = set(existing_table['columns'].keys())
-            current_columns = set(new_table['columns'].keys())
-
-            # a. Handle Removed Columns
-            for column_name in existing_columns - current_columns:
-                print(f"\nColumn '{column_name}' in table '{table_name}' has been removed from the database.")
-                response = input(
-                    f"Do you want to remove column '{column_name}' from the data dictionary? (yes/no): ").strip().lower()
-                if response in ['yes', 'y']:
-                    del existing_table['columns'][column_name]
-                    changes_log.append(f"Column removed from {table_name}: {column_name}")
-                    print(f"Column '{column_name}' has been removed from the data dictionary.")
-                else:
-                    print(f"Column '{column_name}' has been kept in the data dictionary.")
-
-            # b. Handle New Columns
-            for column_name in current_columns - existing_columns:
-                print(f"\nNew column detected in table '{table_name}': '{column_name}'")
-                response = input(
-                    f"Do you want to add column '{column_name}' to the data dictionary? (yes/no): ").strip().lower()
-                if response in ['yes', 'y']:
-                    # Copy column metadata from new_table to existing_table
-                    existing_table['columns'][column_name] = new_table['columns'][column_name]
-                    changes_log.append(f"New column added in {table_name}: {column_name}")
-                    print(f"Column '{column_name}' has been added to the data dictionary.")
-                    # Add the new column to columns_to_update
-                    if table_name not in columns_to_update:
-                        columns_to_update[table_name] = []
-                    columns_to_update[table_name].append(column_name)
-                else:
-                    print(f"Column '{column_name}' has not been added to the data dictionary.")
-
-            # c. Handle Existing Columns
-            for column_name in existing_columns & current_columns:
-                existing_column = existing_table['columns'][column_name]
-                new_column = new_table['columns'][column_name]
-                # Preserve existing column-level metadata
-                new_column['description'] = existing_column.get('description', '')
-                # Preserve any other user-added metadata
-                for key, value in existing_column.items():
-                    if key not in new_column:
-                        new_column[key] = value
-                # Update column metadata in existing data dictionary
-                existing_table['columns'][column_name] = new_column
-                # Do not add existing columns to columns_to_update; their metadata will remain untouched
+        policy = load_refresh_policy(policy)
+        diff = compute_schema_diff(existing_data_dictionary, new_data_dictionary, affected_tables)
+        accepted = decide_schema_changes(diff, policy)
+        changes_log, columns_to_update = apply_schema_changes(
+            existing_data_dictionary, new_data_dictionary, diff, accepted)
+        skipped = sum(len(diff[action]) - len(accepted[action]) for action in REFRESH_ACTIONS)
+        if skipped:
+            print(f"\n{skipped} schema change(s) were not applied to the data dictionary.")
 
     # Update column metadata
     if columns_to_update:
@@ -122,7 +252,9 @@ def refresh_data_dictionary(conn, json_file='data_dictionary.json', log_file='da
         print("\nNo columns to update metadata for.")
 
     # Save the updated data dictionary
-    save_data_dictionary(existing_data_dictionary, json_file)
+    save_data_dictionary(existing_data_dictionary, json_file,
+                         None if initial_run or update_all_columns else affected_tables, store)
+    save_schema_fingerprint(current_fingerprint, fingerprint_file)
 
     # Output changes log
     if changes_log:
@@ -147,12 +279,40 @@ def refresh_data_dictionary(conn, json_file='data_dictionary.json', log_file='da
     else:
         print("\nNo changes were made to the data dictionary.")
 
+# Function to run the refresh from parsed command line options (see datadict.add_refresh_arguments), returns the exit status
+def main(args, db_name=DB_NAME, json_file='data_dictionary.json'):
+    # Refresh only reads the database, so it borrows a read-only connection from the shared pool
+    if args.check:
+        with pooled_conn(db_name) as conn:
+            changed_tables = get_changed_tables(conn, json_file)
+        if changed_tables is None:
+            print("No schema fingerprint stored yet, run a refresh first.")
+            return 1
+        if changed_tables:
+            print(f"Schema changed since the last refresh: {', '.join(sorted(changed_tables))}")
+            return 1
+        print("Schema unchanged since the last refresh.")
+        return 0
+
+    # --yes starts from the headless policy, settings in the policy file take precedence
+    policy = dict(HEADLESS_POLICY) if args.yes else {}
+    if args.policy:
+        with open(args.policy, 'r') as f:
+            policy.update(json.load(f))
+    metrics = start_metrics('refresh')
+    with pooled_conn(db_name) as conn:
+        if metrics is not None:
+            metrics.instrument(conn)
+        refresh_data_dictionary(conn, json_file=json_file, update_all_columns=args.update_all, policy=policy)
+    if metrics is not None:
+        metrics.finish()
+        print(metrics.format_summary())
+    return 0
+
+
 # %%
 # Initiate the data dictionary
 if __name__ == '__main__':
-    conn = get_conn()
-    refresh_data_dictionary(conn)
-
-    #%%
-    # Close the database connection
-    conn.close()
\ No newline at end of file
+    from datadict import add_refresh_arguments
+    parser = argparse.ArgumentParser(description='Refresh the data dictionary from the database schema.')
+    sys.exit(main(add_refresh_arguments(parser).parse_args()))
@@ -0,0 +1,192 @@
+"""
+Structured sinks for data quality results.
+
+run_checks hands every check result to its sinks as soon as the table it belongs to is
+done, so results can be written out while the run goes on and nothing has to be kept in
+memory. The file sinks write one typed record per check:
+
+    run_id            str      id shared by every record of a run
+    shard             str      database the check ran on, null outside fleet runs (fleet.py)
+    checked_at        str      ISO timestamp the table was checked
+    table             str
+    column            str      null for table level errors
+    rule              str      null_values, duplicates, allowable_values, foreign_key, ...
+    status            str      passed, failed, skipped (time budget) or error
+    observed          str      JSON of the observed value (count, min/max, PSI)
+    threshold         str      JSON of the expected value, long value lists as their size
+    violation_count   int      offending rows for count based rules, else null
+    message           str
+    sample_keys       str      JSON list of the key columns of the sample records
+    duration_seconds  float    time spent on the table, its checks share one scan
+
+JSONLinesSink
+    Appends one JSON object per line and flushes after every table, so the file can be
+    tailed or loaded while the run is still going.
+
+ParquetSink
+    Writes a row group every PARQUET_BATCH_ROWS records through pyarrow (optional
+    dependency, only imported when a .parquet path is used).
+
+open_results_sink(path)
+    Picks the sink from the file extension (.parquet -> Parquet, else JSON Lines).
+
+Dependencies:
+------------
+- json
+- pyarrow (optional, Parquet output)
+"""
+
+# Import Libraries
+import json
+import os
+import uuid
+from datetime import datetime
+
+# Records buffered per Parquet row group, memory stays bounded by this many records
+PARQUET_BATCH_ROWS = 10000
+
+# Expected value lists longer than this are recorded as their size
+THRESHOLD_VALUES_LIMIT = 20
+
+# Rules whose observed value is the number of offending rows
+COUNT_RULES = ('null_values', 'zero_values', 'duplicates', 'allowable_values', 'foreign_key')
+
+RESULT_FIELDS = ('run_id', 'shard', 'checked_at', 'table', 'column', 'rule', 'status', 'observed', 'threshold',
+                 'violation_count', 'message', 'sample_keys', 'duration_seconds')
+
+
+# Function to get the status of a check result
+def result_status(result):
+    if result['rule'] == 'error':
+        return 'error'
+    if result['passed'] is None:
+        return 'skipped'
+    return 'passed' if result['passed'] else 'failed'
+
+
+# Function to turn a result dict of run_checks into a flat, typed record
+def build_result_record(result, run_id, checked_at, duration_seconds=None, key_columns=None):
+    expected = result['expected']
+    if isinstance(expected, (list, tuple)) and len(expected) > THRESHOLD_VALUES_LIMIT:
+        expected = {'values': len(expected)}
+    # Samples are identified by the table's key columns, or by the offending value without a key
+    keys = [key for key in (key_columns or ()) if result['samples'] and key in result['samples'][0]]
+    if not keys and result['column'] is not None:
+        keys = [result['column']]
+    sample_keys = [{key: sample.get(key) for key in keys} for sample in result['samples']]
+    violation_count = None
+    if result['rule'] in COUNT_RULES and isinstance(result['observed'], int):
+        violation_count = result['observed']
+    return {
+        'run_id': run_id,
+        'shard': result.get('shard'),
+        'checked_at': checked_at,
+        'table': result['table'],
+        'column': result['column'],
+        'rule': result['rule'],
+        'status': result_status(result),
+        'observed': json.dumps(result['observed'], default=str),
+        'threshold': json.dumps(expected, default=str),
+        'violation_count': violation_count,
+        'message': result['message'],
+        'sample_keys': json.dumps(sample_keys, default=str),
+        'duration_seconds': None if duration_seconds is None else round(duration_seconds, 6),
+    }
+
+
+class ResultSink:
+    """Base sink: run_checks calls write_result per check, flush per table and close at the end."""
+
+    def __init__(self, run_id=None):
+        self.run_id = run_id or f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+
+    def write_result(self, result, duration_seconds=None, key_columns=None):
+        checked_at = datetime.now().isoformat(timespec='seconds')
+        self.write(build_result_record(result, self.run_id, checked_at, duration_seconds, key_columns))
+
+    def write(self, record):
+        raise NotImplementedError
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class JSONLinesSink(ResultSink):
+    """One JSON object per line, appended to the file."""
+
+    def __init__(self, path, run_id=None):
+        super().__init__(run_id)
+        self.path = path
+        self.file = open(path, 'a', encoding='utf-8')
+
+    def write(self, record):
+        self.file.write(json.dumps(record, default=str) + '\n')
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+
+class ParquetSink(ResultSink):
+    """Parquet file written in row groups of batch_rows records."""
+
+    def __init__(self, path, run_id=None, batch_rows=PARQUET_BATCH_ROWS):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("Parquet results need pyarrow (pip install pyarrow), "
+                              "or use a .jsonl results file") from e
+        super().__init__(run_id)
+        self.path = path
+        self.batch_rows = batch_rows
+        self.pa = pa
+        self.schema = pa.schema([
+            ('run_id', pa.string()), ('shard', pa.string()), ('checked_at', pa.string()), ('table', pa.string()),
+            ('column', pa.string()), ('rule', pa.string()), ('status', pa.string()),
+            ('observed', pa.string()), ('threshold', pa.string()), ('violation_count', pa.int64()),
+            ('message', pa.string()), ('sample_keys', pa.string()), ('duration_seconds', pa.float64()),
+        ])
+        # Written to a temp file and moved into place on close, readers never see a file without its footer
+        self.temp_path = f"{path}.tmp"
+        self.writer = pq.ParquetWriter(self.temp_path, self.schema)
+        self.buffer = []
+
+    def write(self, record):
+        self.buffer.append(record)
+        if len(self.buffer) >= self.batch_rows:
+            self._write_batch()
+
+    def _write_batch(self):
+        if not self.buffer:
+            return
+        columns = {field: [record[field] for record in self.buffer] for field in RESULT_FIELDS}
+        self.writer.write_table(self.pa.Table.from_pydict(columns, schema=self.schema))
+        self.buffer = []
+
+    def close(self):
+        if self.writer is None:
+            return
+        self._write_batch()
+        self.writer.close()
+        self.writer = None
+        os.replace(self.temp_path, self.path)
+
+
+# Function to open the results sink for a path, .parquet writes Parquet and anything else JSON Lines
+def open_results_sink(path, run_id=None):
+    if os.path.splitext(path)[1].lower() == '.parquet':
+        return ParquetSink(path, run_id)
+    return JSONLinesSink(path, run_id)
@@ -0,0 +1,461 @@
+"""
+Mergeable sketches used for approximate profiling and data quality checks.
+
+HyperLogLog
+    Approximate distinct counting in a fixed amount of memory (2^precision registers),
+    exact for small sets.
+    Sketches built on different chunks, runs or databases can be merged with merge() and
+    serialized with to_bytes()/from_bytes() so they can be stored and combined later.
+
+KLLSketch
+    Mergeable quantile sketch (Karnin, Lang and Liberty) over numeric values. It keeps a
+    few hundred items regardless of the number of rows, with a rank error of about 1.7/k,
+    and answers quantiles, ranks and equi-width histograms. Compactions alternate between
+    keeping the odd and the even items, so the same input always gives the same sketch.
+
+MisraGries
+    Heavy-hitters sketch keeping at most k counters. Every value that makes up more than
+    1/(k+1) of the rows is kept, and its count is under-estimated by at most 'error'.
+
+register_sketch_functions(conn)
+    Registers the SQL aggregates HLL_SKETCH(col), KLL_SKETCH(col[, weight]) and
+    TOPK_SKETCH(col) on a sqlite3 connection. They return the serialized sketch of the column, so a single scan can be
+    turned into a distinct estimate without building the temporary b-tree COUNT(DISTINCT)
+    needs, or into quantiles and histograms in the same pass that gets MIN/MAX.
+
+Dependencies:
+------------
+- hashlib
+- math
+- struct
+- sqlite3
+"""
+
+# Import Libraries
+import hashlib
+import json
+import math
+import struct
+from collections import Counter
+
+HLL_PRECISION = 12
+KLL_K = 200
+HEAVY_HITTERS_K = 256
+
+
+# Function to get the relative standard error of a HyperLogLog with the given precision
+def hll_error(precision=HLL_PRECISION):
+    return 1.04 / math.sqrt(1 << precision)
+
+
+# Function to hash a SQLite value to a stable 64 bit integer
+def hash_value(value):
+    # Integral floats compare equal to ints in SQLite, so hash them the same way
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    if isinstance(value, bytes):
+        data = b'b' + value
+    elif isinstance(value, str):
+        data = b's' + value.encode('utf-8')
+    else:
+        data = b'n' + repr(value).encode('utf-8')
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'big')
+
+
+class HyperLogLog:
+    """
+    Mergeable HyperLogLog distinct counter.
+    Small sets are kept as exact 64 bit hashes (sparse mode) and only switch to registers
+    once they would take more space than the registers, so low cardinalities are exact.
+    """
+
+    __slots__ = ('precision', 'm', 'registers', 'hashes')
+
+    def __init__(self, precision=HLL_PRECISION, registers=None, hashes=None):
+        if not 4 <= precision <= 16:
+            raise ValueError("HyperLogLog precision must be between 4 and 16")
+        self.precision = precision
+        self.m = 1 << precision
+        self.registers = None
+        self.hashes = None
+        if registers is not None:
+            self.registers = bytearray(registers)
+        else:
+            self.hashes = set(hashes or ())
+
+    # Sparse mode switches to registers once the hashes outgrow them (8 bytes per hash)
+    @property
+    def sparse_limit(self):
+        return self.m // 8
+
+    def _add_hash(self, h):
+        index = h >> (64 - self.precision)
+        remaining = (h << self.precision) & 0xFFFFFFFFFFFFFFFF
+        rank = min(64 - remaining.bit_length() + 1, 64 - self.precision + 1)
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def _densify(self):
+        if self.registers is None:
+            self.registers = bytearray(self.m)
+            for h in self.hashes:
+                self._add_hash(h)
+            self.hashes = None
+
+    def add(self, value):
+        if value is None:
+            return
+        h = hash_value(value)
+        if self.hashes is not None:
+            self.hashes.add(h)
+            if len(self.hashes) > self.sparse_limit:
+                self._densify()
+        else:
+            self._add_hash(h)
+
+    def update(self, values):
+        for value in values:
+            self.add(value)
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge HyperLogLog sketches with different precision")
+        if self.hashes is not None and other.hashes is not None:
+            self.hashes |= other.hashes
+            if len(self.hashes) > self.sparse_limit:
+                self._densify()
+            return self
+        self._densify()
+        if other.hashes is not None:
+            for h in other.hashes:
+                self._add_hash(h)
+        else:
+            self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+        return self
+
+    # Relative standard error of the estimate, sparse sketches are exact
+    @property
+    def error(self):
+        if self.hashes is not None:
+            return 0.0
+        return hll_error(self.precision)
+
+    def count(self):
+        if self.hashes is not None:
+            return len(self.hashes)
+        m = self.m
+        if m == 16:
+            alpha = 0.673
+        elif m == 32:
+            alpha = 0.697
+        elif m == 64:
+            alpha = 0.709
+        else:
+            alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        # Small range correction, linear counting is more accurate for low cardinalities
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    # Serialized as precision, mode (0 dense, 1 sparse) and the registers or sorted hashes
+    def to_bytes(self):
+        if self.hashes is not None:
+            return bytes([self.precision, 1]) + b''.join(h.to_bytes(8, 'big') for h in sorted(self.hashes))
+        return bytes([self.precision, 0]) + bytes(self.registers)
+
+    @classmethod
+    def from_bytes(cls, data):
+        precision, mode, payload = data[0], data[1], data[2:]
+        if mode == 1:
+            hashes = (int.from_bytes(payload[i:i + 8], 'big') for i in range(0, len(payload), 8))
+            return cls(precision, hashes=hashes)
+        return cls(precision, registers=payload)
+
+
+class KLLSketch:
+    """
+    Mergeable KLL quantile sketch. Level h holds items that stand for 2^h input values each;
+    a full level is sorted and every other item is promoted to the next level.
+    Only int and float values are added, everything else (nulls, text) is skipped.
+    """
+
+    __slots__ = ('k', 'levels', 'n', 'size', 'max_size', 'compactions')
+
+    def __init__(self, k=KLL_K):
+        if k < 8:
+            raise ValueError("KLL k must be at least 8")
+        self.k = k
+        self.levels = [[]]
+        self.n = 0
+        self.size = 0
+        self.compactions = 0
+        self.max_size = self._max_size()
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return int(math.ceil(self.k * (2 / 3) ** depth)) + 1
+
+    def _max_size(self):
+        return sum(self._capacity(level) for level in range(len(self.levels)))
+
+    def _compress(self):
+        while self.size >= self.max_size:
+            for level, items in enumerate(self.levels):
+                if len(items) >= self._capacity(level):
+                    if level + 1 == len(self.levels):
+                        self.levels.append([])
+                        self.max_size = self._max_size()
+                    items.sort()
+                    # An odd item out stays at its level, pairs only so the total weight is kept
+                    leftover = items[:len(items) & 1]
+                    # Alternate the kept half instead of flipping a coin, keeps profiles reproducible
+                    offset = self.compactions & 1
+                    self.compactions += 1
+                    promoted = items[len(leftover) + offset::2]
+                    self.levels[level + 1].extend(promoted)
+                    self.levels[level] = leftover
+                    self.size += len(leftover) + len(promoted) - len(items)
+                    break
+
+    # A weighted value goes in by the binary decomposition of its weight, one item per set bit
+    def add(self, value, weight=1):
+        if type(value) not in (int, float) or value != value:
+            return
+        self.n += weight
+        if weight.bit_length() > len(self.levels):
+            self.levels.extend([] for _ in range(weight.bit_length() - len(self.levels)))
+            self.max_size = self._max_size()
+        level = 0
+        while weight:
+            if weight & 1:
+                self.levels[level].append(value)
+                self.size += 1
+            weight >>= 1
+            level += 1
+        if self.size >= self.max_size:
+            self._compress()
+
+    def update(self, values):
+        for value in values:
+            self.add(value)
+
+    # Adds a batch of int/float values (no NaN) with a single compaction pass
+    def extend(self, values):
+        self.levels[0].extend(values)
+        self.n += len(values)
+        self.size += len(values)
+        if self.size >= self.max_size:
+            self._compress()
+
+    def merge(self, other):
+        while len(self.levels) < len(other.levels):
+            self.levels.append([])
+        for level, items in enumerate(other.levels):
+            self.levels[level].extend(items)
+        self.n += other.n
+        self.size = sum(len(items) for items in self.levels)
+        self.compactions += other.compactions
+        self.max_size = self._max_size()
+        self._compress()
+        return self
+
+    # Sorted (value, weight) pairs, the weights add up to n
+    def weighted_items(self):
+        return sorted((value, 1 << level) for level, items in enumerate(self.levels) for value in items)
+
+    def count(self):
+        return self.n
+
+    # Relative rank error of quantile answers
+    @property
+    def error(self):
+        return 1.7 / self.k
+
+    def quantiles(self, fractions):
+        items = self.weighted_items()
+        if not items:
+            return [None for _ in fractions]
+        results = []
+        for fraction in fractions:
+            target = fraction * self.n
+            cumulative = 0
+            answer = items[-1][0]
+            for value, weight in items:
+                cumulative += weight
+                if cumulative >= target:
+                    answer = value
+                    break
+            results.append(answer)
+        return results
+
+    def quantile(self, fraction):
+        return self.quantiles([fraction])[0]
+
+    # Estimated number of values below value
+    def rank(self, value):
+        return sum(weight for item, weight in self.weighted_items() if item < value)
+
+    # Estimated counts of bins equal-width bins between low and high, values outside fall in the end bins
+    def histogram(self, low, high, bins):
+        counts = [0] * bins
+        width = (high - low) / bins if high > low else 0
+        for value, weight in self.weighted_items():
+            index = int((value - low) / width) if width else 0
+            counts[min(max(index, 0), bins - 1)] += weight
+        return counts
+
+    # Serialized as k, n, compactions and per level the item count and the items as doubles
+    def to_bytes(self):
+        parts = [struct.pack('<IQQI', self.k, self.n, self.compactions, len(self.levels))]
+        for items in self.levels:
+            parts.append(struct.pack(f'<I{len(items)}d', len(items), *items))
+        return b''.join(parts)
+
+    @classmethod
+    def from_bytes(cls, data):
+        k, n, compactions, level_count = struct.unpack_from('<IQQI', data)
+        offset = struct.calcsize('<IQQI')
+        sketch = cls(k)
+        sketch.levels = []
+        for _ in range(level_count):
+            (length,) = struct.unpack_from('<I', data, offset)
+            offset += 4
+            sketch.levels.append(list(struct.unpack_from(f'<{length}d', data, offset)))
+            offset += 8 * length
+        sketch.n = n
+        sketch.compactions = compactions
+        sketch.size = sum(len(items) for items in sketch.levels)
+        sketch.max_size = sketch._max_size()
+        return sketch
+
+
+class MisraGries:
+    """
+    Mergeable Misra-Gries heavy-hitters sketch with k counters over hashable values.
+    Nulls are skipped. Counts are lower bounds, the true count of a kept value is at most
+    count + error, and a value that is not kept occurs at most error times.
+    """
+
+    __slots__ = ('k', 'counts', 'n', 'error')
+
+    def __init__(self, k=HEAVY_HITTERS_K, counts=None, n=0, error=0):
+        self.k = k
+        self.counts = dict(counts or {})
+        self.n = n
+        self.error = error
+
+    # Keeps the k largest counters, lowering every count by the (k+1)-th largest one
+    def _reduce(self):
+        if len(self.counts) <= self.k:
+            return
+        cut = sorted(self.counts.values(), reverse=True)[self.k]
+        self.error += cut
+        self.counts = {value: count - cut for value, count in self.counts.items() if count > cut}
+
+    def add(self, value, count=1):
+        if value is None:
+            return
+        self.counts[value] = self.counts.get(value, 0) + count
+        self.n += count
+        if len(self.counts) > self.k:
+            self._reduce()
+
+    # Adds a batch of values with a single reduction
+    def update(self, values):
+        batch = Counter(value for value in values if value is not None)
+        for value, count in batch.items():
+            self.counts[value] = self.counts.get(value, 0) + count
+            self.n += count
+        self._reduce()
+
+    def merge(self, other):
+        for value, count in other.counts.items():
+            self.counts[value] = self.counts.get(value, 0) + count
+        self.n += other.n
+        self.error += other.error
+        self._reduce()
+        return self
+
+    def count(self):
+        return self.n
+
+    # The top most frequent values as (value, count) pairs, ties ordered by value
+    def top(self, top=10):
+        return sorted(self.counts.items(), key=lambda item: (-item[1], str(item[0])))[:top]
+
+    # Serialized as JSON, bytes values are not supported
+    def to_bytes(self):
+        return json.dumps({'k': self.k, 'n': self.n, 'error': self.error,
+                           'counts': list(self.counts.items())}).encode('utf-8')
+
+    @classmethod
+    def from_bytes(cls, data):
+        state = json.loads(data)
+        return cls(state['k'], {value: count for value, count in state['counts']}, state['n'], state['error'])
+
+
+# SQLite aggregate wrapper around HyperLogLog
+class HLLAggregate:
+    def __init__(self):
+        self.sketch = HyperLogLog()
+
+    def step(self, value):
+        self.sketch.add(value)
+
+    def finalize(self):
+        return self.sketch.to_bytes()
+
+
+# SQLite aggregate wrapper around KLLSketch, the optional second argument is the weight of the value
+class KLLAggregate:
+    # Values are buffered and compacted in batches, step() runs once per row
+    BATCH_SIZE = 4096
+
+    def __init__(self):
+        self.sketch = KLLSketch()
+        self.buffer = []
+
+    def step(self, value, weight=1):
+        if weight == 1 and type(value) in (int, float):
+            self.buffer.append(value)
+            if len(self.buffer) >= self.BATCH_SIZE:
+                self.sketch.extend(self.buffer)
+                self.buffer = []
+        else:
+            self.sketch.add(value, weight)
+
+    def finalize(self):
+        self.sketch.extend(self.buffer)
+        return self.sketch.to_bytes()
+
+
+# SQLite aggregate wrapper around MisraGries
+class TopKAggregate:
+    # Values are buffered and counted in batches, step() runs once per row
+    BATCH_SIZE = 4096
+
+    def __init__(self):
+        self.sketch = MisraGries()
+        self.buffer = []
+
+    def step(self, value):
+        if isinstance(value, bytes):
+            value = value.hex()
+        self.buffer.append(value)
+        if len(self.buffer) >= self.BATCH_SIZE:
+            self.sketch.update(self.buffer)
+            self.buffer = []
+
+    def finalize(self):
+        self.sketch.update(self.buffer)
+        return self.sketch.to_bytes()
+
+
+# Function to register the sketch aggregates on a connection
+def register_sketch_functions(conn):
+    conn.create_aggregate('HLL_SKETCH', 1, HLLAggregate)
+    conn.create_aggregate('KLL_SKETCH', 1, KLLAggregate)
+    conn.create_aggregate('KLL_SKETCH', 2, KLLAggregate)
+    conn.create_aggregate('TOPK_SKETCH', 1, TopKAggregate)
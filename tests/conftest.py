@@ -0,0 +1,21 @@
+import os
+import sqlite3
+import sys
+
+import pytest
+
+# The modules are flat scripts in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def make_db(tmp_path):
+    """Creates a SQLite database file from an SQL script and returns its path."""
+    def make(script, name='test.db'):
+        path = str(tmp_path / name)
+        conn = sqlite3.connect(path)
+        conn.executescript(script)
+        conn.commit()
+        conn.close()
+        return path
+    return make
@@ -0,0 +1,87 @@
+import pytest
+
+from data_quality_checks import compile_check_plan, get_type_affinity, load_allowed_value_sets, run_checks
+from db_conn import fetch_columns, fetch_indexes, get_conn
+
+SCHEMA = """
+CREATE TABLE items (
+    id INTEGER PRIMARY KEY,
+    code TEXT,
+    quantity INTEGER,
+    ratio REAL,
+    label VARCHAR(10),
+    raw
+);
+INSERT INTO items (code, quantity, ratio, label, raw) VALUES
+    ('1', 1, 1.0, 'a', '1'),
+    ('2', '2', 2.0, 'b', 2),
+    ('x', 3, 2.5, '1', 'x');
+"""
+
+# Mixed-type lists: numbers for text columns, strings for numeric columns
+ALLOWABLE_VALUES = {
+    'code': [1, 2],
+    'quantity': ['1', 2],
+    'ratio': [1, '2'],
+    'label': ['a', 'b', 1],
+    'raw': [1, 2],
+}
+
+
+def build_dictionary(conn):
+    columns = fetch_columns(conn)
+    types = dict(zip(columns['column_name'], columns['data_type']))
+    return {'items': {'columns': {
+        column: {'data_type': types[column], 'allowable_values': values}
+        for column, values in ALLOWABLE_VALUES.items()
+    }}}
+
+
+def literal_violations(conn, column, values):
+    # The NOT IN (...) literal list the temp-table anti-join replaced
+    literals = ', '.join(f"'{value}'" if isinstance(value, str) else str(value) for value in values)
+    return conn.execute(
+        f"SELECT COUNT(*) FROM items WHERE {column} IS NOT NULL AND {column} NOT IN ({literals})"
+    ).fetchone()[0]
+
+
+@pytest.mark.parametrize('incremental', [False, True])
+def test_anti_join_matches_literal_not_in(make_db, incremental):
+    conn = get_conn(make_db(SCHEMA))
+    dictionary = build_dictionary(conn)
+    plan = compile_check_plan(dictionary, fetch_columns(conn), fetch_indexes(conn))
+    results = run_checks(conn, dictionary, plan=plan, state={} if incremental else None)
+    observed = {result['column']: result['observed'] for result in results if result['rule'] == 'allowable_values'}
+    expected = {column: literal_violations(conn, column, values) for column, values in ALLOWABLE_VALUES.items()}
+    assert observed == expected
+    # The text column value '1' is allowed by the value 1, 'x' is not
+    assert observed['code'] == 1
+
+
+def test_count_query_matches_literal_not_in(make_db):
+    conn = get_conn(make_db(SCHEMA))
+    dictionary = build_dictionary(conn)
+    plan = compile_check_plan(dictionary)
+    load_allowed_value_sets(conn, plan['items']['allowed_sets'])
+    for check in plan['items']['checks']:
+        assert conn.execute(check['count_query']).fetchone()[0] == literal_violations(
+            conn, check['column'], ALLOWABLE_VALUES[check['column']])
+
+
+def test_columns_with_equal_sets_share_a_table_per_affinity():
+    dictionary = {'t': {'columns': {
+        'a': {'data_type': 'TEXT', 'allowable_values': [1, 2]},
+        'b': {'data_type': 'VARCHAR(5)', 'allowable_values': [1, 2]},
+        'c': {'data_type': 'INTEGER', 'allowable_values': [1, 2]},
+    }}}
+    allowed_sets = compile_check_plan(dictionary)['t']['allowed_sets']
+    assert sorted(allowed_set['affinity'] for allowed_set in allowed_sets.values()) == ['INTEGER', 'TEXT']
+
+
+@pytest.mark.parametrize('data_type, affinity', [
+    ('INTEGER', 'INTEGER'), ('BIGINT', 'INTEGER'), ('VARCHAR(20)', 'TEXT'), ('CLOB', 'TEXT'),
+    ('BLOB', ''), ('', ''), (None, ''), ('DOUBLE PRECISION', 'REAL'), ('FLOAT', 'REAL'),
+    ('DECIMAL(10,2)', 'NUMERIC'), ('DATE', 'NUMERIC'), ('TIMESTAMP', 'NUMERIC'),
+])
+def test_type_affinity(data_type, affinity):
+    assert get_type_affinity(data_type) == affinity
@@ -0,0 +1,96 @@
+import init_data_dictionary
+from db_conn import get_conn
+from init_data_dictionary import (estimate_column_cardinality, plan_table_sample, profile_categorical_column,
+                                  summarize_value_counts)
+
+SCHEMA = """
+CREATE TABLE events (id INTEGER PRIMARY KEY, status TEXT, session TEXT);
+WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 3000)
+INSERT INTO events (status, session)
+SELECT CASE WHEN i % 10 = 0 THEN NULL WHEN i % 3 = 0 THEN 'closed' WHEN i % 7 = 0 THEN 'held' ELSE 'open' END,
+       CASE WHEN i % 5 = 0 THEN 'hot' ELSE 's' || i END
+FROM n;
+"""
+
+
+def traced(conn):
+    statements = []
+    conn.set_trace_callback(statements.append)
+    return statements
+
+
+def exact_top_values(conn, column, k=10):
+    return [list(row) for row in conn.execute(
+        f"SELECT {column}, COUNT(*) FROM events WHERE {column} IS NOT NULL "
+        f"GROUP BY {column} ORDER BY COUNT(*) DESC, {column} LIMIT {k}")]
+
+
+def test_summarize_value_counts_ties_nulls_and_value_limit():
+    rows = [(None, 4), ('a', 2), ('b', 5), ('c', 2), ('d', 1)]
+    summary = summarize_value_counts(iter(rows), top_values=3)
+    assert summary['top'] == [('b', 5), ('a', 2), ('c', 2)]
+    assert (summary['unique_count'], summary['row_count'], summary['singletons']) == (4, 10, 1)
+    # NULL is part of the value set like SELECT DISTINCT, but not of the counts
+    assert summary['values'] == [None, 'a', 'b', 'c', 'd']
+    assert summarize_value_counts(iter(rows), values_limit=3)['values'] is None
+
+
+def test_moderate_cardinality_is_exact_from_one_group_by(make_db):
+    conn = get_conn(make_db(SCHEMA))
+    statements = traced(conn)
+    updates = profile_categorical_column('events', 'status', conn)
+    assert updates['unique_count'] == 3
+    assert updates['top_values'] == exact_top_values(conn, 'status')
+    assert updates['top_values_rows'] == 2700
+    assert sorted(updates['allowable_values'], key=str) == sorted(['closed', 'held', 'open', None], key=str)
+    assert 'top_values_error' not in updates
+    # Allowable values come from the same GROUP BY, no second DISTINCT scan
+    assert not any('DISTINCT' in sql for sql in statements)
+
+
+def test_high_cardinality_uses_the_sketch(make_db, monkeypatch):
+    monkeypatch.setattr(init_data_dictionary, 'TOP_VALUES_EXACT_MAX_DISTINCT', 100)
+    conn = get_conn(make_db(SCHEMA))
+    statements = traced(conn)
+    updates = profile_categorical_column('events', 'session', conn)
+    assert any('TOPK_SKETCH' in sql for sql in statements)
+    assert not any('GROUP BY session' in sql for sql in statements)
+    # Exact distinct count without approximate, the heavy hitter is found by the sketch
+    assert updates['unique_count'] == 2401
+    value, count = updates['top_values'][0]
+    assert value == 'hot' and 600 - updates['top_values_error'] <= count <= 600
+    assert 'allowable_values' not in updates
+
+    approximate = profile_categorical_column('events', 'session', conn, approximate=True)
+    assert 'unique_count_error' in approximate
+    assert abs(approximate['unique_count'] - 2401) <= 0.05 * 2401
+
+
+def test_cardinality_probe(make_db):
+    conn = get_conn(make_db(SCHEMA))
+    # Columns that fit in the probe are counted exactly
+    assert estimate_column_cardinality('events', 'status', conn) == 3
+    assert estimate_column_cardinality('events', 'session', conn) == 2401
+    # From a 500 row prefix the mostly distinct column still comes out as high cardinality
+    assert estimate_column_cardinality('events', 'status', conn, probe_rows=500) <= 10
+    assert estimate_column_cardinality('events', 'session', conn, probe_rows=500) > 500
+
+
+def test_sampled_table_profiles_only_the_sample(make_db):
+    conn = get_conn(make_db(SCHEMA))
+    sample = plan_table_sample('events', conn, sample_rows=300, min_table_rows=100)
+    assert sample is not None
+    statements = traced(conn)
+    updates = profile_categorical_column('events', 'status', conn, sample=sample)
+    scans = [sql for sql in statements if 'FROM events' in sql]
+    assert scans and all(sample['where'] in sql for sql in scans)
+    assert updates['sample_size'] == sample['sample_size']
+    assert updates['unique_count_bounds'][0] <= updates['unique_count'] <= updates['unique_count_bounds'][1]
+    assert updates['top_values_rows'] < 3000
+    # Every sampled status repeats, so the sample is taken as the full set
+    assert set(updates['allowable_values']) == {'closed', 'held', 'open', None}
+
+    sessions = profile_categorical_column('events', 'session', conn, sample=sample)
+    # Mostly singletons: the set cannot be complete and the estimate scales up
+    assert 'allowable_values' not in sessions
+    assert sessions['unique_count'] > sessions['unique_count_bounds'][0]
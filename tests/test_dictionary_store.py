@@ -0,0 +1,27 @@
+import os
+
+import pytest
+
+from dictionary_store import open_dictionary_store
+
+DICTIONARY = {'orders': {'description': '', 'columns': {
+    'id': {'data_type': 'INTEGER'},
+    'status': {'data_type': 'TEXT', 'allowable_values': ['open', 'closed']},
+}}}
+
+
+@pytest.mark.parametrize('name', ['dd.json', 'dd.db'])
+def test_missing_dictionary_loads_empty_without_creating_it(tmp_path, name):
+    path = str(tmp_path / name)
+    store = open_dictionary_store(path)
+    assert store.load() == {}
+    assert store.table_names() == []
+    assert not os.path.exists(path)
+
+
+@pytest.mark.parametrize('name', ['dd.json', 'dd.db'])
+def test_saved_dictionary_loads_back(tmp_path, name):
+    store = open_dictionary_store(str(tmp_path / name))
+    store.save(DICTIONARY)
+    assert store.load() == DICTIONARY
+    assert store.table_names() == ['orders']
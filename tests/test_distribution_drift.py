@@ -0,0 +1,60 @@
+from data_quality_checks import compile_check_plan, run_checks
+from db_conn import fetch_columns, fetch_indexes, fetch_tables, get_conn
+from init_data_dictionary import build_data_dictionary_from_schema, get_all_tables_and_columns, update_column_metadata
+
+SCHEMA = """
+CREATE TABLE orders (order_id INTEGER PRIMARY KEY AUTOINCREMENT, sku INTEGER NOT NULL, quantity INTEGER);
+CREATE TABLE lines (order_id INTEGER, line INTEGER, quantity INTEGER, PRIMARY KEY (order_id, line)) WITHOUT ROWID;
+WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 1000)
+INSERT INTO orders (sku, quantity) SELECT i, i % 10 + 1 FROM n;
+WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 1000)
+INSERT INTO lines SELECT i, 1, i % 10 + 1 FROM n;
+"""
+
+# 30% more rows, the quantities keep their distribution while the keys grow
+APPEND = """
+WITH RECURSIVE n(i) AS (SELECT 1001 UNION ALL SELECT i + 1 FROM n WHERE i < 1300)
+INSERT INTO orders (sku, quantity) SELECT i, i % 10 + 1 FROM n;
+WITH RECURSIVE n(i) AS (SELECT 1001 UNION ALL SELECT i + 1 FROM n WHERE i < 1300)
+INSERT INTO lines SELECT i, 1, i % 10 + 1 FROM n;
+"""
+
+
+def profile(conn):
+    dd = build_data_dictionary_from_schema(fetch_tables(conn), fetch_columns(conn))
+    update_column_metadata(dd, get_all_tables_and_columns(dd), conn)
+    return dd.to_dict()
+
+
+def drift_results(conn, dictionary):
+    plan = compile_check_plan(dictionary, fetch_columns(conn), fetch_indexes(conn))
+    results = {(result['table'], result['column']): result for result in run_checks(conn, dictionary, plan=plan)
+               if result['rule'] == 'distribution_drift'}
+    return plan, results
+
+
+def test_primary_keys_get_no_histogram(make_db):
+    conn = get_conn(make_db(SCHEMA))
+    dictionary = profile(conn)
+    assert 'histogram' not in dictionary['orders']['columns']['order_id']
+    assert 'histogram' not in dictionary['lines']['columns']['order_id']
+    assert 'histogram' in dictionary['orders']['columns']['quantity']
+    assert 'histogram' in dictionary['orders']['columns']['sku']
+
+
+def test_append_only_table_does_not_drift_on_its_keys(make_db):
+    conn = get_conn(make_db(SCHEMA))
+    dictionary = profile(conn)
+    # A dictionary profiled before keys were left out still has their histograms
+    for table in ('orders', 'lines'):
+        dictionary[table]['columns']['order_id']['histogram'] = dictionary['orders']['columns']['sku']['histogram']
+    conn.executescript(APPEND)
+
+    plan, results = drift_results(conn, dictionary)
+    pruned = {(table, item['column']) for table in plan for item in plan[table]['pruned']
+              if item['rule'] == 'distribution_drift'}
+    assert pruned == {('orders', 'order_id'), ('lines', 'order_id')}
+    assert all(result['passed'] for key, result in results.items() if key[1] == 'quantity')
+    assert ('orders', 'order_id') not in results
+    # Without the schema guarantee an appended key range is exactly what drift flags
+    assert results[('orders', 'sku')]['passed'] is False
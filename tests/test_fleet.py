@@ -0,0 +1,42 @@
+from data_quality_checks import ReportLogSink
+from fleet import SHARD_ERROR_TABLE, check_shard
+
+SCHEMA = """
+CREATE TABLE orders (id INTEGER PRIMARY KEY, status TEXT);
+INSERT INTO orders (status) VALUES ('open'), (NULL);
+"""
+
+DICTIONARY = {'orders': {'columns': {
+    'id': {'data_type': 'INTEGER'},
+    'status': {'data_type': 'TEXT', 'null_values_allowed': False},
+}}}
+
+
+def report(entries):
+    sink = ReportLogSink()
+    for result, duration, key_columns in entries:
+        sink.write_result(result, duration, key_columns)
+    return sink
+
+
+def test_check_shard_tags_results_with_the_shard(make_db, capsys):
+    shard = make_db(SCHEMA, 'shard_1.db')
+    entries = check_shard(shard, DICTIONARY)
+    assert {result['shard'] for result, _, _ in entries} == {shard}
+    assert report(entries).failed == 1
+    assert f"Checking shard: {shard}\nChecking table: orders" in capsys.readouterr().out
+
+
+def test_unreadable_shard_is_one_error_result(tmp_path, capsys):
+    shard = str(tmp_path / 'broken.db')
+    with open(shard, 'w') as f:
+        f.write('not a database')
+    entries = check_shard(shard, DICTIONARY)
+    assert len(entries) == 1
+    result = entries[0][0]
+    assert (result['shard'], result['table'], result['rule']) == (shard, SHARD_ERROR_TABLE, 'error')
+    assert shard in result['message']
+    assert report(entries).failed == 1
+    output = capsys.readouterr().out
+    assert 'Checking table: None' not in output
+    assert f"Checking table: {SHARD_ERROR_TABLE}" in output
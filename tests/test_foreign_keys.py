@@ -0,0 +1,144 @@
+from data_quality_checks import (build_orphan_count_queries, compile_check_plan, fetch_orphan_counts,
+                                 fetch_table_samples, run_checks)
+from db_conn import fetch_columns, fetch_indexes, fetch_tables, get_conn
+from init_data_dictionary import build_data_dictionary_from_schema
+
+SCHEMA = """
+CREATE TABLE parent (code TEXT PRIMARY KEY, name TEXT);
+CREATE TABLE tags (tag TEXT);
+CREATE TABLE child (id INTEGER PRIMARY KEY, parent_code TEXT, tag TEXT);
+INSERT INTO parent VALUES ('a', 'A'), ('b', 'B'), (NULL, 'no key');
+INSERT INTO tags VALUES ('red'), ('blue'), (NULL);
+INSERT INTO child VALUES (1, 'a', 'red'), (2, 'b', 'blue'), (3, 'x', 'green'), (4, 'y', 'red'), (5, NULL, NULL);
+"""
+
+DICTIONARY = {
+    'child': {'columns': {
+        'id': {'data_type': 'INTEGER'},
+        'parent_code': {'data_type': 'TEXT', 'foreign_key': {'table': 'parent', 'column': 'code'}},
+        'tag': {'data_type': 'TEXT', 'foreign_key': {'table': 'tags', 'column': 'tag'}},
+    }},
+}
+
+
+def compile_plan(conn):
+    return compile_check_plan(DICTIONARY, fetch_columns(conn), fetch_indexes(conn))
+
+
+def test_orphans_counted_with_null_parent_keys(make_db):
+    conn = get_conn(make_db(SCHEMA))
+    plan = compile_plan(conn)
+    checks = {check['column']: check for check in plan['child']['checks']}
+    # parent.code has the primary key index, tags.tag is read into a CTE
+    assert checks['parent_code']['parent_indexed'] is True
+    assert checks['tag']['parent_indexed'] is False
+    assert any('WITH dq_parent_keys_0' in query for _, query, _ in build_orphan_count_queries(plan))
+
+    orphan_counts = fetch_orphan_counts(conn, plan)
+    assert orphan_counts[('child', 'parent_code')] == 2
+    assert orphan_counts[('child', 'tag')] == 1
+
+
+def test_orphan_check_fails_and_samples_the_orphans(make_db):
+    conn = get_conn(make_db(SCHEMA))
+    results = {result['column']: result for result in run_checks(conn, DICTIONARY, plan=compile_plan(conn))
+               if result['rule'] == 'foreign_key'}
+    assert results['parent_code']['passed'] is False
+    assert results['parent_code']['observed'] == 2
+    assert sorted(sample['parent_code'] for sample in results['parent_code']['samples']) == ['x', 'y']
+    assert [sample['tag'] for sample in results['tag']['samples']] == ['green']
+
+
+def test_fallback_count_query_ignores_null_parent_keys(make_db):
+    conn = get_conn(make_db(SCHEMA))
+    # Without the catalog the check uses its own count query and sample condition
+    check = next(check for check in compile_check_plan(DICTIONARY)['child']['checks']
+                 if check['column'] == 'parent_code')
+    assert conn.execute(check['count_query']).fetchone()[0] == 2
+    samples = fetch_table_samples(conn, 'child', [check])[0]
+    assert sorted(sample['parent_code'] for sample in samples) == ['x', 'y']
+
+
+def test_incremental_run_counts_orphans_past_the_watermark(make_db):
+    conn = get_conn(make_db(SCHEMA))
+    plan = compile_plan(conn)
+    state = {}
+
+    def orphans():
+        statements = []
+        conn.set_trace_callback(statements.append)
+        results = {result['column']: result['observed'] for result in run_checks(conn, DICTIONARY, plan=plan, state=state)
+                   if result['rule'] == 'foreign_key'}
+        conn.set_trace_callback(None)
+        # Counted in the table scan, there are no separate whole-table orphan queries
+        assert not any('orphan_count_' in sql for sql in statements)
+        return results, statements
+
+    assert orphans()[0] == {'parent_code': 2, 'tag': 1}
+    conn.execute("INSERT INTO child VALUES (6, 'z', 'red'), (7, 'a', 'pink')")
+    results, statements = orphans()
+    assert results == {'parent_code': 3, 'tag': 2}
+    assert state['child']['rows_scanned'] == 2
+    assert any('orphan_count' in sql and 'rowid > 5' in sql for sql in statements)
+
+
+COMPOSITE_SCHEMA = """
+CREATE TABLE plan (region TEXT, code INTEGER, name TEXT, PRIMARY KEY (region, code));
+CREATE TABLE price (region TEXT, code INTEGER);
+CREATE TABLE subscription (
+    id INTEGER PRIMARY KEY,
+    region TEXT,
+    plan_code INTEGER,
+    FOREIGN KEY (region, plan_code) REFERENCES plan
+);
+CREATE TABLE quote (
+    id INTEGER PRIMARY KEY,
+    region TEXT,
+    code INTEGER,
+    FOREIGN KEY (region, code) REFERENCES price (region, code)
+);
+INSERT INTO plan VALUES ('eu', 1, 'basic'), ('us', 2, 'pro');
+INSERT INTO price VALUES ('eu', 1), ('us', 2), (NULL, 3);
+-- ('eu', 2) and ('us', 1) match a parent value in every single column, but not the whole key
+INSERT INTO subscription VALUES (1, 'eu', 1), (2, 'eu', 2), (3, 'us', 1), (4, 'us', 2), (5, NULL, 9), (6, 'eu', 2);
+INSERT INTO quote VALUES (1, 'eu', 1), (2, 'eu', 2), (3, NULL, 3);
+"""
+
+
+def composite_setup(make_db):
+    conn = get_conn(make_db(COMPOSITE_SCHEMA))
+    columns = fetch_columns(conn)
+    dictionary = build_data_dictionary_from_schema(fetch_tables(conn), columns).to_dict()
+    return conn, dictionary, compile_check_plan(dictionary, columns, fetch_indexes(conn))
+
+
+def test_composite_foreign_key_from_the_schema(make_db):
+    _, dictionary, plan = composite_setup(make_db)
+    columns = dictionary['subscription']['columns']
+    # Declared once on the leading column, REFERENCES without columns points at the composite primary key
+    assert columns['region']['foreign_key'] == {'table': 'plan', 'columns': {'region': 'region', 'plan_code': 'code'}}
+    assert 'foreign_key' not in columns['plan_code']
+    assert dictionary['quote']['columns']['region']['foreign_key'] == \
+           {'table': 'price', 'columns': {'region': 'region', 'code': 'code'}}
+    checks = [check for check in plan['subscription']['checks'] if check['rule'] == 'foreign_key']
+    assert [(check['child_key'], check['parent_column']) for check in checks] == \
+           [(('region', 'plan_code'), ('region', 'code'))]
+
+
+def test_composite_foreign_key_matches_the_whole_key(make_db):
+    conn, dictionary, plan = composite_setup(make_db)
+    expected = {'subscription': 3, 'quote': 1}
+    # Batched (the unindexed price key goes through a CTE), incremental and the check's own count query
+    assert fetch_orphan_counts(conn, plan) == {('subscription', 'region'): 3, ('quote', 'region'): 1}
+    for state in (None, {}):
+        results = {result['table']: result for result in run_checks(conn, dictionary, plan=plan, state=state)
+                   if result['rule'] == 'foreign_key'}
+        assert {table: result['observed'] for table, result in results.items()} == expected
+    for table, count in expected.items():
+        check = next(check for check in compile_check_plan(dictionary)[table]['checks'] if check['rule'] == 'foreign_key')
+        assert conn.execute(check['count_query']).fetchone()[0] == count
+    # One sample record per orphaned key value
+    assert sorted((sample['region'], sample['plan_code']) for sample in results['subscription']['samples']) == \
+           [('eu', 2), ('us', 1)]
+    assert results['subscription']['message'] == \
+           "Key (region, plan_code) has 3 values missing from plan (region, code)"
@@ -0,0 +1,27 @@
+from data_quality_checks import compile_check_plan, update_table_state
+from db_conn import get_conn
+
+SCHEMA = """
+CREATE TABLE events (kind TEXT, created_at TEXT);
+INSERT INTO events VALUES ('a', '2024-01-01'), ('b', '2024-01-02');
+"""
+
+DICTIONARY = {'events': {'columns': {
+    'kind': {'data_type': 'TEXT'},
+    'created_at': {'data_type': 'DATE'},
+}}}
+
+
+def test_rowid_watermark_scans_rows_sharing_a_timestamp(make_db):
+    conn = get_conn(make_db(SCHEMA))
+    table_plan = compile_check_plan(DICTIONARY)['events']
+    # The delta query binds the stored watermark and nothing else
+    assert 'params' not in table_plan['incremental']
+    assert table_plan['incremental']['delta_query'].count('?') == 1
+    state = {}
+    update_table_state(conn, 'events', table_plan, state)
+    assert (state['watermark'], state['full_scan']) == (2, True)
+
+    conn.execute("INSERT INTO events VALUES ('c', '2024-01-02')")
+    update_table_state(conn, 'events', table_plan, state)
+    assert (state['rows_scanned'], state['total_count'], state['full_scan']) == (1, 3, False)
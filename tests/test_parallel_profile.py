@@ -0,0 +1,59 @@
+import threading
+
+import pytest
+
+import init_data_dictionary
+from db_conn import close_pools, get_conn, pooled_conn
+from dd_model import DataDictionary
+
+SCHEMA = "".join(f"CREATE TABLE t{i} (id INTEGER PRIMARY KEY, value INTEGER);"
+                 f"INSERT INTO t{i} (value) VALUES (1), (2), (3);" for i in range(4))
+
+
+def test_every_worker_gets_a_connection_while_the_caller_holds_one(make_db, monkeypatch):
+    db = make_db(SCHEMA)
+    workers = 4
+    # All workers have to be profiling at the same time to pass the barrier
+    barrier = threading.Barrier(workers, timeout=5)
+    profile_table = init_data_dictionary.profile_table
+
+    def profile_together(table, columns, conn, sampling=None):
+        barrier.wait()
+        return profile_table(table, columns, conn, sampling)
+
+    monkeypatch.setattr(init_data_dictionary, 'profile_table', profile_together)
+    try:
+        with pooled_conn(db) as conn:
+            dd = DataDictionary.from_dict({f"t{i}": {'columns': {'value': {'data_type': 'INTEGER'}}}
+                                           for i in range(workers)})
+            init_data_dictionary.update_column_metadata(dd, {f"t{i}": ['value'] for i in range(workers)}, conn,
+                                                        workers=workers, db_name=db)
+    finally:
+        close_pools()
+    assert all(dd[f"t{i}"]['columns']['value']['max_value'] == 3 for i in range(workers))
+
+
+def test_parallel_profile_uses_the_database_of_the_connection(make_db, tmp_path, monkeypatch):
+    db = make_db(SCHEMA)
+    # Run from a directory whose default database is a different one
+    monkeypatch.chdir(tmp_path)
+    make_db("CREATE TABLE t0 (id INTEGER PRIMARY KEY, value INTEGER); INSERT INTO t0 (value) VALUES (99);",
+            init_data_dictionary.DB_NAME)
+    serial, parallel = (DataDictionary.from_dict({'t0': {'columns': {'value': {'data_type': 'INTEGER'}}}})
+                        for _ in range(2))
+    conn = get_conn(db)
+    try:
+        init_data_dictionary.update_column_metadata(serial, {'t0': ['value']}, conn)
+        init_data_dictionary.update_column_metadata(parallel, {'t0': ['value']}, conn, workers=2)
+    finally:
+        conn.close()
+        close_pools()
+    assert parallel['t0']['columns']['value']['max_value'] == serial['t0']['columns']['value']['max_value'] == 3
+
+
+def test_parallel_profile_of_an_in_memory_database_needs_a_file():
+    conn = get_conn(':memory:')
+    conn.executescript("CREATE TABLE t (value INTEGER); INSERT INTO t VALUES (1);")
+    dd = DataDictionary.from_dict({'t': {'columns': {'value': {'data_type': 'INTEGER'}}}})
+    with pytest.raises(ValueError, match='db_name'):
+        init_data_dictionary.update_column_metadata(dd, {'t': ['value']}, conn, workers=2)
@@ -0,0 +1,33 @@
+import os
+
+from db_conn import get_conn
+from query_metrics import measure, start_metrics
+
+SCHEMA = "CREATE TABLE t (id INTEGER PRIMARY KEY); INSERT INTO t VALUES (1), (2);"
+
+
+def run_script(db):
+    metrics = start_metrics('test', enabled=True)
+    conn = get_conn(db)
+    with measure('scan', table='t'):
+        conn.execute("SELECT COUNT(*) FROM t").fetchone()
+    conn.close()
+    return metrics
+
+
+def test_no_metrics_files_without_a_directory(make_db, tmp_path, monkeypatch):
+    db = make_db(SCHEMA)
+    monkeypatch.chdir(tmp_path)
+    before = set(os.listdir(tmp_path))
+    metrics = run_script(db)
+    assert metrics.finish(None) is None
+    assert set(os.listdir(tmp_path)) == before
+    assert 'scan' in metrics.format_summary()
+
+
+def test_metrics_files_in_the_metrics_directory(make_db, tmp_path):
+    db = make_db(SCHEMA)
+    summary_file, metrics_file = run_script(db).finish(str(tmp_path / 'textfile'))
+    assert os.path.dirname(summary_file) == str(tmp_path / 'textfile')
+    with open(metrics_file) as f:
+        assert 'datadict_' in f.read()
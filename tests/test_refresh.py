@@ -0,0 +1,49 @@
+import builtins
+import json
+import os
+
+from db_conn import get_conn
+from refresh_data_dictionary import HEADLESS_POLICY, refresh_data_dictionary
+
+SCHEMA = """
+CREATE TABLE accounts (id INTEGER PRIMARY KEY, name TEXT);
+CREATE TABLE payments (id INTEGER PRIMARY KEY, amount REAL);
+INSERT INTO accounts (name) VALUES ('a'), ('b');
+INSERT INTO payments (amount) VALUES (1.5), (2.5);
+"""
+
+
+def test_refresh_parses_the_json_dictionary_once(make_db, tmp_path, monkeypatch):
+    db = make_db(SCHEMA)
+    json_file = str(tmp_path / 'dd.json')
+    log_file = str(tmp_path / 'changes.log')
+    conn = get_conn(db)
+    refresh_data_dictionary(conn, json_file=json_file, log_file=log_file, policy=HEADLESS_POLICY)
+    conn.close()
+
+    writer = get_conn(db)
+    writer.execute("ALTER TABLE accounts ADD COLUMN email TEXT")
+    writer.commit()
+    writer.close()
+
+    reads = []
+    real_open = builtins.open
+
+    def counting_open(file, mode='r', *args, **kwargs):
+        if os.fspath(file) == json_file and 'r' in mode:
+            reads.append(file)
+        return real_open(file, mode, *args, **kwargs)
+
+    monkeypatch.setattr(builtins, 'open', counting_open)
+    conn = get_conn(db)
+    refresh_data_dictionary(conn, json_file=json_file, log_file=log_file, policy=HEADLESS_POLICY)
+    conn.close()
+    monkeypatch.undo()
+
+    # table_names, the partial load and the partial save share one parse
+    assert len(reads) == 1
+    with open(json_file) as f:
+        dd = json.load(f)
+    assert set(dd) == {'accounts', 'payments'}
+    assert set(dd['accounts']['columns']) == {'id', 'name', 'email'}
+    assert dd['payments']['columns']['amount']['max_value'] == 2.5
@@ -0,0 +1,78 @@
+import json
+import os
+
+import pytest
+
+from data_quality_checks import compile_check_plan, run_checks
+from db_conn import fetch_columns, fetch_indexes, get_conn
+from result_sinks import RESULT_FIELDS, JSONLinesSink, open_results_sink
+
+SCHEMA = """
+CREATE TABLE orders (id INTEGER PRIMARY KEY, status TEXT, quantity INTEGER);
+INSERT INTO orders (status, quantity) VALUES ('open', 1), ('lost', 0), (NULL, 5), ('done', 2);
+"""
+
+DICTIONARY = {'orders': {'columns': {
+    'id': {'data_type': 'INTEGER'},
+    'status': {'data_type': 'TEXT', 'allowable_values': ['open', 'done'], 'null_values_allowed': False},
+    'quantity': {'data_type': 'INTEGER', 'min_value': 1, 'max_value': 10},
+}}}
+
+
+def check_into(db, sink):
+    conn = get_conn(db)
+    plan = compile_check_plan(DICTIONARY, fetch_columns(conn), fetch_indexes(conn))
+    with sink:
+        results = run_checks(conn, DICTIONARY, plan=plan, sinks=[sink])
+    conn.close()
+    return results
+
+
+def by_check(records):
+    return {(record['column'], record['rule']): record for record in records}
+
+
+def test_jsonl_records(make_db, tmp_path):
+    path = str(tmp_path / 'results.jsonl')
+    results = check_into(make_db(SCHEMA), JSONLinesSink(path, run_id='run-1'))
+    with open(path) as f:
+        records = [json.loads(line) for line in f]
+    assert len(records) == len(results)
+    assert all(tuple(record) == RESULT_FIELDS and record['run_id'] == 'run-1' for record in records)
+    records = by_check(records)
+    assert records[('status', 'null_values')]['status'] == 'failed'
+    assert records[('status', 'null_values')]['violation_count'] == 1
+    assert records[('status', 'allowable_values')]['violation_count'] == 1
+    assert json.loads(records[('status', 'allowable_values')]['sample_keys']) == [{'id': 2}]
+    # Bound checks observe a value, not a number of rows
+    assert records[('quantity', 'min_value')]['status'] == 'failed'
+    assert (records[('quantity', 'min_value')]['observed'], records[('quantity', 'min_value')]['violation_count']) == \
+           ('0', None)
+    assert records[('quantity', 'max_value')]['status'] == 'passed'
+
+
+def test_parquet_matches_jsonl(make_db, tmp_path):
+    pq = pytest.importorskip('pyarrow.parquet')
+    jsonl_path = str(tmp_path / 'results.jsonl')
+    parquet_path = str(tmp_path / 'results.parquet')
+    db = make_db(SCHEMA)
+    check_into(db, JSONLinesSink(jsonl_path, run_id='run-1'))
+    sink = open_results_sink(parquet_path, run_id='run-1')
+    # Several row groups from a small batch size
+    sink.batch_rows = 2
+    check_into(db, sink)
+    assert not os.path.exists(f"{parquet_path}.tmp")
+
+    parquet_file = pq.ParquetFile(parquet_path)
+    assert parquet_file.num_row_groups > 1
+    table = parquet_file.read()
+    assert tuple(table.schema.names) == RESULT_FIELDS
+    assert str(table.schema.field('violation_count').type) == 'int64'
+    with open(jsonl_path) as f:
+        expected = by_check(json.loads(line) for line in f)
+    records = by_check(table.to_pylist())
+    ignored = ('checked_at', 'duration_seconds')
+    assert {key: {field: value for field, value in record.items() if field not in ignored}
+            for key, record in records.items()} == \
+           {key: {field: value for field, value in record.items() if field not in ignored}
+            for key, record in expected.items()}
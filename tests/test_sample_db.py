@@ -0,0 +1,33 @@
+import importlib
+import sqlite3
+import sys
+
+import pytest
+
+
+def test_sample_database_builds_without_numpy(tmp_path, monkeypatch):
+    # A None entry makes any import of numpy raise ImportError
+    monkeypatch.setitem(sys.modules, 'numpy', None)
+    monkeypatch.delitem(sys.modules, 'create_sample_db', raising=False)
+    create_sample_db = importlib.import_module('create_sample_db')
+    path = str(tmp_path / 'sample.db')
+    create_sample_db.create_sample_database(path)
+    conn = sqlite3.connect(path)
+    tables = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    conn.close()
+    assert {'users', 'orders', 'products'} <= tables
+    with pytest.raises(ImportError):
+        create_sample_db.create_synthetic_database(str(tmp_path / 'synthetic.db'), tables=1, rows=10)
+
+
+def test_synthetic_database_rows(tmp_path):
+    pytest.importorskip('numpy')
+    from create_sample_db import create_synthetic_database
+    path = str(tmp_path / 'synthetic.db')
+    create_synthetic_database(path, tables=2, columns=4, rows=50, null_rate=0.1)
+    conn = sqlite3.connect(path)
+    counts = [conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in ('t000', 't001')]
+    dates = conn.execute("SELECT c003 FROM t000 WHERE c003 IS NOT NULL LIMIT 1").fetchone()
+    conn.close()
+    assert counts == [50, 50]
+    assert len(dates[0]) == 10
@@ -0,0 +1,92 @@
+import random
+
+import pytest
+
+from sketches import KLLSketch
+
+FRACTIONS = [0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99]
+
+
+def shuffled_values(n, seed=7):
+    values = [float(i) for i in range(n)]
+    random.Random(seed).shuffle(values)
+    return values
+
+
+def total_weight(sketch):
+    return sum(weight for _, weight in sketch.weighted_items())
+
+
+def assert_rank_error(sketch, values):
+    # Rank of each answer against the exact sorted data, within the sketch's error
+    ordered = sorted(values)
+    n = len(ordered)
+    for fraction, answer in zip(FRACTIONS, sketch.quantiles(FRACTIONS)):
+        exact_rank = ordered.index(answer) / n
+        assert abs(exact_rank - fraction) <= sketch.error, (fraction, answer)
+
+
+@pytest.mark.parametrize('n', [1, 7, 1000, 20000, 100001])
+def test_kll_conserves_weight(n):
+    values = shuffled_values(n)
+    added, extended = KLLSketch(), KLLSketch()
+    added.update(values)
+    extended.extend(values)
+    for sketch in (added, extended):
+        assert sketch.n == n
+        assert total_weight(sketch) == n
+        assert sum(sketch.histogram(0, n, 10)) == n
+
+
+@pytest.mark.parametrize('n', [20000, 100001])
+def test_kll_rank_error(n):
+    values = shuffled_values(n)
+    sketch = KLLSketch()
+    sketch.update(values)
+    assert sketch.size < 4 * sketch.k
+    assert_rank_error(sketch, values)
+
+
+def test_kll_weighted_add_matches_repeated_values():
+    rng = random.Random(3)
+    weights = {float(value): rng.randint(1, 5000) for value in range(2000)}
+    weighted, repeated = KLLSketch(), KLLSketch()
+    for value, weight in weights.items():
+        weighted.add(value, weight)
+        repeated.extend([value] * weight)
+    n = sum(weights.values())
+    assert weighted.n == repeated.n == n
+    assert total_weight(weighted) == n
+    # One item per set bit of the weight instead of weight items
+    assert weighted.size < 4 * weighted.k
+    values = [value for value, weight in weights.items() for _ in range(weight)]
+    assert_rank_error(weighted, values)
+    assert_rank_error(repeated, values)
+
+
+def test_kll_single_huge_weight():
+    sketch = KLLSketch()
+    sketch.add(1.0, 10 ** 9)
+    sketch.add(2.0, 3)
+    assert total_weight(sketch) == sketch.n == 10 ** 9 + 3
+    assert sketch.quantiles([0.5, 1.0]) == [1.0, 2.0]
+
+
+def test_kll_merge_is_associative():
+    values = shuffled_values(60000, seed=11)
+    parts = [values[:10000], values[10000:35000], values[35000:]]
+
+    def sketch_of(chunk):
+        sketch = KLLSketch()
+        sketch.update(chunk)
+        return sketch
+
+    a, b, c = (sketch_of(part) for part in parts)
+    left = KLLSketch.from_bytes(a.to_bytes()).merge(b).merge(c)
+    right = KLLSketch.from_bytes(a.to_bytes()).merge(KLLSketch.from_bytes(b.to_bytes()).merge(c))
+    for merged in (left, right):
+        assert merged.n == total_weight(merged) == len(values)
+        assert_rank_error(merged, values)
+    # Both groupings answer within the error of each other
+    for x, y in zip(left.quantiles(FRACTIONS), right.quantiles(FRACTIONS)):
+        assert abs(x - y) / len(values) <= 2 * left.error
@@ -0,0 +1,104 @@
+import data_quality_checks
+from data_quality_checks import TimeBudget, compile_check_plan, run_checks, schedule_tables
+from db_conn import fetch_columns, fetch_indexes, get_conn
+
+SCHEMA = """
+CREATE TABLE small (id INTEGER PRIMARY KEY, code TEXT);
+CREATE TABLE big (id INTEGER PRIMARY KEY, small_id INTEGER REFERENCES small (id), status TEXT);
+INSERT INTO small (code) VALUES ('a'), ('b'), ('c');
+WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 2000)
+INSERT INTO big (small_id, status) SELECT i % 4 + 1, CASE WHEN i % 2 THEN 'open' ELSE 'done' END FROM n;
+"""
+
+DICTIONARY = {
+    'small': {'columns': {
+        'id': {'data_type': 'INTEGER'},
+        'code': {'data_type': 'TEXT', 'duplicates_allowed': False, 'null_values_allowed': False},
+    }},
+    'big': {'columns': {
+        'id': {'data_type': 'INTEGER'},
+        'small_id': {'data_type': 'INTEGER', 'foreign_key': {'table': 'small', 'column': 'id'}},
+        'status': {'data_type': 'TEXT', 'allowable_values': ['open', 'done'], 'null_values_allowed': False},
+    }},
+}
+
+
+def setup(make_db):
+    conn = get_conn(make_db(SCHEMA))
+    plan = compile_check_plan(DICTIONARY, fetch_columns(conn), fetch_indexes(conn))
+    return conn, plan
+
+
+def by_check(results):
+    return {(result['table'], result['column'], result['rule']): result for result in results}
+
+
+def test_schedule_tables_cheapest_first_unknown_sizes_last():
+    plan = {'a': {'row_cost': 10}, 'b': {'row_cost': 1}, 'c': {'row_cost': 1}}
+    assert schedule_tables(plan, {'a': 100, 'b': 500, 'c': None}) == ['b', 'a', 'c']
+
+
+def test_budget_run_matches_unbudgeted_run(make_db):
+    conn, plan = setup(make_db)
+    expected = by_check(run_checks(conn, DICTIONARY, plan=plan))
+    results = by_check(run_checks(conn, DICTIONARY, plan=plan, budget=TimeBudget(run_seconds=600)))
+    assert {key: result['observed'] for key, result in results.items()} == \
+           {key: result['observed'] for key, result in expected.items()}
+    assert results[('big', 'small_id', 'foreign_key')]['observed'] == 500
+
+
+def test_orphan_counts_follow_the_cost_order(make_db):
+    conn, plan = setup(make_db)
+    statements = []
+    conn.set_trace_callback(statements.append)
+    run_checks(conn, DICTIONARY, plan=plan, budget=TimeBudget(run_seconds=600))
+    conn.set_trace_callback(None)
+    first = {
+        'small scan': next(i for i, sql in enumerate(statements) if 'FROM small' in sql and 'COUNT' in sql),
+        'orphans': next(i for i, sql in enumerate(statements) if 'orphan_count_' in sql),
+        'big scan': next(i for i, sql in enumerate(statements) if 'FROM big' in sql and 'orphan_count_' not in sql),
+    }
+    # The orphan anti-join of big runs in big's turn, after the cheaper table was scanned
+    assert first['small scan'] < first['orphans']
+    assert first['big scan'] < first['orphans']
+
+
+def test_expensive_checks_skipped_when_estimate_does_not_fit(make_db):
+    conn, plan = setup(make_db)
+    budget = TimeBudget(run_seconds=600)
+    # Calibrated at 1000s per cost unit, no table fits the remaining budget
+    budget.record(1, 1000.0)
+    results = by_check(run_checks(conn, DICTIONARY, plan=plan, budget=budget))
+    for key in [('small', 'code', 'duplicates'), ('big', 'small_id', 'foreign_key'), ('big', 'status', 'allowable_values')]:
+        assert results[key]['passed'] is None
+        assert 'does not fit' in results[key]['message']
+    assert results[('small', 'code', 'null_values')]['passed'] is True
+    assert results[('big', 'status', 'null_values')]['passed'] is True
+
+
+def test_cancel_before_calibration_reports_skipped_checks(make_db, monkeypatch):
+    conn, plan = setup(make_db)
+    budget = TimeBudget(run_seconds=600)
+    load_allowed_value_sets = data_quality_checks.load_allowed_value_sets
+
+    # Cancelled after run_checks' expired() check, before any scan calibrated the estimates
+    def cancel_then_load(conn, allowed_sets):
+        budget.cancel()
+        load_allowed_value_sets(conn, allowed_sets)
+
+    monkeypatch.setattr(data_quality_checks, 'load_allowed_value_sets', cancel_then_load)
+    results = by_check(run_checks(conn, DICTIONARY, plan=plan, budget=budget))
+    # Cheap scans short enough to finish before the progress handler fires still report
+    assert all(result['passed'] in (True, None) for result in results.values())
+    for key in [('small', 'code', 'duplicates'), ('big', 'small_id', 'foreign_key'), ('big', 'status', 'allowable_values')]:
+        assert results[key]['passed'] is None
+        assert 'run cancelled' in results[key]['message']
+
+
+def test_cancelled_run_skips_every_check(make_db):
+    conn, plan = setup(make_db)
+    budget = TimeBudget()
+    budget.cancel()
+    results = run_checks(conn, DICTIONARY, plan=plan, budget=budget)
+    assert len(results) == sum(len(table_plan['checks']) for table_plan in plan.values())
+    assert all(result['passed'] is None for result in results)